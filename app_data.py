@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from pa_cache import _is_temp, _load_frame, _save_frame
+
+
+# Everything streamlit_app.py shows, precomputed. Streamlit reruns the whole app on every
+# widget change, so the ELO+ columns, ranks, ELO Change, team summaries and top/bottom
+# tables are built here once, either at the end of elo_calculations.py or by running
+# this file (do that after bootstrap.py or batch_fit.py so their columns are picked up).
+# Each table is stored as one .npy per column under app_data/<season>/ (strings as
+# categoricals, integers downcast), so the app memory-maps them and only filters on a rerun.
+# The app loads one season at a time, and read_rows pulls one player's rows out of a
+# season without loading the rest of it. Without any seasons the app builds the same
+# tables from the results csvs in the working folder, as DEFAULT_SEASON. The statcast
+# files a season was rated from go into its meta.json too (see season_inputs), so the
+# app's what-if panel reruns that season and not whichever files are in the folder.
+
+APP_DATA_DIR = 'app_data'
+DEFAULT_SEASON = '2025'
+RESULTS = 'improved_{role}_elo_ratings_park_factored1.csv'
+INTERVALS = '{role}_elo_intervals.csv'
+BATCH = 'batch_{role}_elo_ratings.csv'
+# the only results columns the app needs
+RESULT_COLUMNS = ['player_id', 'Name', 'TEAM', 'elo+2', 'count', 'WRC+', 'ERA-', 'is_qualified',
+                  'elo+2_rd', 'avg_opp_elo', 'avg_park_factor']
+ROLES = ('batter', 'pitcher')
+
+
+def read_results(role, directory='.'):
+    path = os.path.join(directory, RESULTS.format(role=role))
+    return pd.read_csv(path, usecols=lambda c: c in RESULT_COLUMNS)
+
+
+def _read_optional(pattern, role, columns, directory='.'):
+    path = os.path.join(directory, pattern.format(role=role))
+    return pd.read_csv(path, usecols=columns) if os.path.exists(path) else None
+
+
+def _display_table(results, stat, intervals):
+    # the columns load_data used to build on every rerun
+    df = pd.DataFrame({'player_id': results['player_id'], 'Name': results['Name'], 'TEAM': results['TEAM'],
+                       'ELO+': results['elo+2'].round().astype(int)})
+    uncertainty_cols = []
+    # glicko-2 runs also carry a rating deviation, shown as +/- on the ELO+ scale
+    if 'elo+2_rd' in results.columns:
+        df['ELO+ RD'] = results['elo+2_rd'].round().astype(int)
+        uncertainty_cols.append('ELO+ RD')
+    # percentile intervals from bootstrap.py
+    if intervals is not None:
+        bounds = intervals.drop_duplicates('player_id').set_index('player_id').reindex(results['player_id'])
+        df['ELO+ low'] = bounds['elo+2_low'].round().astype('Int64').array
+        df['ELO+ high'] = bounds['elo+2_high'].round().astype('Int64').array
+        uncertainty_cols += ['ELO+ low', 'ELO+ high']
+    df[stat] = results[stat]
+    df['PAs'] = results['count']
+    # strength of schedule, when the rating loop tracked it
+    sos_cols = []
+    if 'avg_opp_elo' in results.columns:
+        df['Avg Opp ELO'] = results['avg_opp_elo'].round().astype(int)
+        df['Avg Park Factor'] = results['avg_park_factor'].round(3)
+        sos_cols = ['Avg Opp ELO', 'Avg Park Factor']
+    df['is_qualified'] = results['is_qualified'].astype(bool)
+    return df, uncertainty_cols, sos_cols
+
+
+def _add_ranks(df):
+    # rank by ELO+ and by ERA- (lower is better), and how far apart the two ranks are
+    df = df.sort_values('ELO+', ascending=False).reset_index(drop=True)
+    df['ELO rank'] = df.index + 1
+    df = df.sort_values('ERA-', ascending=True).reset_index(drop=True)
+    df['ERA rank'] = df.index + 1
+    df['ELO Ranking Change'] = df['ELO rank'] - df['ERA rank']
+    return df
+
+
+def team_schedule(df, sos_cols):
+    # PA-weighted average opponent ELO and park factor of each team's players
+    df = df.drop_duplicates()
+    weighted = df[sos_cols].multiply(df['PAs'], axis=0).assign(TEAM=df['TEAM'], PAs=df['PAs'])
+    totals = weighted.groupby('TEAM').sum()
+    summary = totals[sos_cols].divide(totals['PAs'], axis=0)
+    summary['Avg Opp ELO'] = summary['Avg Opp ELO'].round(1)
+    summary['Avg Park Factor'] = summary['Avg Park Factor'].round(3)
+    return summary.reset_index()
+
+
+def _batch_comparison(results, batch):
+    # sequential vs batch (order-independent, see batch_fit.py) ELO+
+    df = results[['player_id', 'Name', 'TEAM', 'elo+2', 'is_qualified']].merge(
+        batch.drop_duplicates('player_id'), on='player_id', suffixes=('', '_batch'))
+    return pd.DataFrame({'Name': df['Name'], 'TEAM': df['TEAM'], 'ELO+': df['elo+2'].round().astype(int),
+                         'Batch ELO+': df['elo+2_batch'].round().astype(int), 'is_qualified': df['is_qualified'].astype(bool)})
+
+
+def build_app_tables(batter_results, pitcher_results, batter_intervals=None, pitcher_intervals=None,
+                     batter_batch=None, pitcher_batch=None):
+    # returns (tables, info): tables maps name -> DataFrame, info has the optional column lists
+    batters, uncertainty_cols, sos_cols = _display_table(batter_results, 'WRC+', batter_intervals)
+    pitchers, _, _ = _display_table(pitcher_results, 'ERA-', pitcher_intervals)
+    batter_cols = ['Name', 'TEAM', 'ELO+'] + uncertainty_cols + ['WRC+', 'PAs'] + sos_cols + ['is_qualified']
+    pitcher_cols = ['Name', 'TEAM', 'ELO+'] + uncertainty_cols + ['ERA-', 'PAs'] + sos_cols + ['is_qualified']
+
+    # Results tab: everybody, best ELO+ first
+    batters['ELO Change'] = batters['ELO+'] - batters['WRC+']
+    batters = batters.sort_values('ELO+', ascending=False).reset_index(drop=True)
+    pitchers = _add_ranks(pitchers).sort_values('ELO+', ascending=False).reset_index(drop=True)
+
+    # Summary tab: qualified players, ELO+ vs wRC+ and ELO rank vs ERA- rank
+    batter_changes = batters.loc[batters['is_qualified'], batter_cols].drop(columns='is_qualified')
+    batter_changes['ELO Change'] = batter_changes['ELO+'] - batter_changes['WRC+']
+    batter_changes = batter_changes.drop_duplicates()
+    pitcher_changes = _add_ranks(pitchers.loc[pitchers['is_qualified'], pitcher_cols]).drop(columns='is_qualified')
+    pitcher_changes = pitcher_changes.drop_duplicates()
+
+    batter_teams = batter_changes.groupby('TEAM')['ELO Change'].mean().reset_index() \
+        .sort_values('ELO Change', ascending=False)
+    pitcher_teams = pitcher_changes.groupby('TEAM')['ELO Ranking Change'].mean().reset_index() \
+        .sort_values('ELO Ranking Change', ascending=False)
+    # the opponents each team's players actually faced, measured in the rating loop
+    if sos_cols:
+        batter_teams = batter_teams.merge(team_schedule(batters[batter_cols], sos_cols), on='TEAM', how='left')
+        pitcher_teams = pitcher_teams.merge(team_schedule(pitchers[pitcher_cols], sos_cols), on='TEAM', how='left')
+
+    pirates = batters[batters['TEAM'] == 'PIT']
+    tables = {
+        'batters': batters,
+        'pitchers': pitchers,
+        'batter_changes_top': batter_changes.sort_values('ELO Change', ascending=False).head(10),
+        'batter_changes_bottom': batter_changes.sort_values('ELO Change', ascending=True).head(10),
+        'pitcher_changes_top': pitcher_changes.sort_values('ELO Ranking Change', ascending=False).head(10),
+        'pitcher_changes_bottom': pitcher_changes.sort_values('ELO Ranking Change', ascending=True).head(10),
+        'batter_teams': batter_teams,
+        'pitcher_teams': pitcher_teams,
+        'pirates_batters': pirates.sort_values('PAs', ascending=False),
+    }
+    if batter_batch is not None and pitcher_batch is not None:
+        tables['batch_batters'] = _batch_comparison(batter_results, batter_batch)
+        tables['batch_pitchers'] = _batch_comparison(pitcher_results, pitcher_batch)
+    tables = {name: compact(df.reset_index(drop=True)) for name, df in tables.items()}
+    return tables, {'uncertainty_cols': uncertainty_cols, 'sos_cols': sos_cols}
+
+
+def build_from_files(batter_results=None, pitcher_results=None, directory='.'):
+    # the results csvs in directory (or frames already in memory) plus whichever optional csvs exist
+    results = {'batter': batter_results, 'pitcher': pitcher_results}
+    for role in ROLES:
+        if results[role] is None:
+            results[role] = read_results(role, directory)
+        else:
+            results[role] = results[role][[c for c in results[role].columns if c in RESULT_COLUMNS]]
+    intervals = {role: _read_optional(INTERVALS, role, ['player_id', 'elo+2_low', 'elo+2_high'], directory)
+                 for role in ROLES}
+    batch = {role: _read_optional(BATCH, role, ['player_id', 'elo+2'], directory) for role in ROLES}
+    if any(v is None for v in intervals.values()):
+        intervals = dict.fromkeys(ROLES)
+    return build_app_tables(results['batter'], results['pitcher'], intervals['batter'], intervals['pitcher'],
+                            batch['batter'], batch['pitcher'])
+
+
+def compact(df):
+    # strings -> categoricals, integers -> the smallest dtype that holds them
+    df = df.copy()
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_string_dtype(series.dtype) or series.dtype == object:
+            df[col] = series.astype('category')
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            df[col] = pd.to_numeric(series, downcast='integer')
+    return df
+
+
+def season_dir(season, root=APP_DATA_DIR):
+    return os.path.join(root, str(season))
+
+
+def list_seasons(root=APP_DATA_DIR):
+    # seasons with a finished artifact, newest first
+    if not os.path.isdir(root):
+        return []
+    return sorted((e.name for e in os.scandir(root)
+                   if e.is_dir() and not _is_temp(e.name) and os.path.exists(os.path.join(e.path, 'meta.json'))),
+                  reverse=True)
+
+
+def save_app_data(tables, info, directory):
+    tmp = f'{directory}.tmp{os.getpid()}'
+    shutil.rmtree(tmp, ignore_errors=True)
+    meta = dict(info, created=time.time(), tables={})
+    for name, df in tables.items():
+        os.makedirs(os.path.join(tmp, name))
+        meta['tables'][name] = _save_frame(df, os.path.join(tmp, name))
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    # rename last so the app never reads a half-written artifact
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+
+
+def _read_meta(directory):
+    meta_path = os.path.join(directory, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def load_app_data(directory):
+    # (tables, info) from the artifact, or None if there isn't one
+    meta = _read_meta(directory)
+    if meta is None:
+        return None
+    tables = {name: _load_frame(columns, os.path.join(directory, name)) for name, columns in meta['tables'].items()}
+    return tables, {'uncertainty_cols': meta['uncertainty_cols'], 'sos_cols': meta['sos_cols']}
+
+
+def season_inputs(directory):
+    # the statcast csvs the artifact's season was rated from, None if it didn't record them
+    meta = _read_meta(directory)
+    return None if meta is None else meta.get('statcast_paths')
+
+
+def read_rows(directory, table, player_id, columns):
+    # the rows of one player in one table of an artifact, reading only the player_id
+    # column in full and then just those rows of the other columns (all memory-mapped)
+    meta = _read_meta(directory)
+    if meta is None or table not in meta['tables']:
+        return None
+    entries = {entry['name']: entry for entry in meta['tables'][table]}
+    base = os.path.join(directory, table)
+    ids = np.load(os.path.join(base, entries['player_id']['file']), mmap_mode='r')
+    rows = np.flatnonzero(ids == player_id)
+    wanted = [entries[c] for c in columns if c in entries]
+    return _load_frame(wanted, base, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the precomputed tables streamlit_app.py loads")
+    parser.add_argument('--season', default=DEFAULT_SEASON)
+    parser.add_argument('--results-dir', default='.', help="folder with that season's results csvs")
+    parser.add_argument('--root', default=APP_DATA_DIR)
+    args = parser.parse_args()
+    tables, info = build_from_files(directory=args.results_dir)
+    save_app_data(tables, info, season_dir(args.season, args.root))
+    print(f"Wrote {len(tables)} tables to {season_dir(args.season, args.root)}/")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import argparse
+import math
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import minimize
+from scipy.sparse.linalg import lsqr
+from scipy.special import expit, log_expit
+
+from elo_engine import DEFAULT_PARAMS, EloParams, EloState, elo_plus, elo_plus2
+from pa_cache import load_plate_appearances
+
+
+# Order-independent "batch" ratings. Sequential ELO depends on the order of the season:
+# a home run off a great pitcher in week one counts for less because his rating has
+# not caught up yet. Here every rating is solved for at once from the whole season.
+# Each plate appearance is one row of a sparse design matrix (+1 in the batter's
+# column, -1 in the pitcher's), so the fit is a handful of sparse mat-vecs per iteration.
+#
+#   'logistic' - Bradley-Terry: woba_norm ~ sigmoid(batter - pitcher + log(park factor)),
+#                fit by L-BFGS on the penalized cross-entropy. The park factor is an
+#                offset on the logit instead of multiplying the probability as in ELO
+#   'lsqr'     - regularized least squares on woba_norm - mean * park factor, solved with
+#                LSQR and mapped to the logit scale through the slope at the mean
+#
+# prior_weight is an L2 penalty pulling every player toward start_elo, roughly worth
+# prior_weight / (mean * (1 - mean)) plate appearances of league-average results.
+# Ratings come back on the usual 1500-centered scale in an EloState, so the elo+/elo+2
+# code downstream works the same as for the sequential loop.
+
+METHODS = ('logistic', 'lsqr')
+# logit units -> elo points, same curve as the 10 ** (diff / 400) expectation
+SCALE = 400 / math.log(10)
+
+
+def design_matrix(pas):
+    # (n_pa x (n_batters + n_pitchers)) csr matrix, batter columns first
+    n = len(pas)
+    n_batters, n_pitchers = len(pas.batter_ids), len(pas.pitcher_ids)
+    rows = np.arange(n)
+    return sparse.csr_matrix(
+        (np.concatenate([np.ones(n), -np.ones(n)]),
+         (np.concatenate([rows, rows]), np.concatenate([np.asarray(pas.batter), n_batters + np.asarray(pas.pitcher)]))),
+        shape=(n, n_batters + n_pitchers))
+
+
+def _fit_logistic(X, y, offset, prior_weight, tolerance, max_iter):
+    def objective(theta):
+        z = X @ theta + offset
+        loss = -(y * log_expit(z) + (1 - y) * log_expit(-z)).sum() + 0.5 * prior_weight * theta @ theta
+        gradient = X.T @ (expit(z) - y) + prior_weight * theta
+        return loss, gradient
+
+    result = minimize(objective, np.zeros(X.shape[1]), jac=True, method='L-BFGS-B',
+                      options={'maxiter': max_iter, 'gtol': tolerance})
+    return result.x, result.success, result.nit
+
+
+def _fit_lsqr(X, y, park_factor, prior_weight, tolerance, max_iter):
+    mean = y.mean()
+    slope = mean * (1 - mean)
+    # same penalty as the logistic fit once theta is moved to the logit scale
+    result = lsqr(X, y - mean * park_factor, damp=math.sqrt(prior_weight / slope),
+                  atol=tolerance, btol=tolerance, iter_lim=max_iter)
+    return result[0] / slope, result[1] in (1, 2), result[2]
+
+
+def fit_batch(pas, params=DEFAULT_PARAMS, method='logistic', prior_weight=5.0, woba_norm=None,
+              tolerance=1e-6, max_iter=1000):
+    # returns an EloState with every rating fit at once (counts are plain PA counts)
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    y = np.asarray(pas.woba_norm if woba_norm is None else woba_norm, dtype=np.float64)
+    park_factor = pas.park_factor if params.use_park_factor else np.ones(len(pas))
+    X = design_matrix(pas)
+
+    if method == 'logistic':
+        theta, converged, iterations = _fit_logistic(X, y, np.log(park_factor), prior_weight, tolerance, max_iter)
+    else:
+        theta, converged, iterations = _fit_lsqr(X, y, park_factor, prior_weight, tolerance, max_iter)
+    if not converged:
+        print(f"WARNING: {method} fit stopped after {iterations} iterations without converging")
+
+    n_batters = len(pas.batter_ids)
+    elo = params.start_elo + theta * SCALE
+    return EloState(
+        batter_ids=pas.batter_ids,
+        batter_elo=elo[:n_batters],
+        batter_count=np.bincount(pas.batter, minlength=n_batters).astype(np.int64),
+        pitcher_ids=pas.pitcher_ids,
+        # the pitcher columns enter with a minus sign, so a higher theta is a better pitcher
+        pitcher_elo=elo[n_batters:],
+        pitcher_count=np.bincount(pas.pitcher, minlength=len(pas.pitcher_ids)).astype(np.int64),
+    )
+
+
+def scaled_ratings(state, role, player_ids):
+    # elo, count, elo+ and elo+2 for player_ids, scaled over exactly those players
+    # (pass the players of the results csv to line up with elo_calculations.py)
+    frame = getattr(state, f'{role}_frame')()
+    frame = frame[frame['player_id'].isin(player_ids)].reset_index(drop=True)
+    frame['elo+'] = elo_plus(frame['elo'].to_numpy(), frame['count'].to_numpy())
+    frame['elo+2'] = elo_plus2(frame['elo'].to_numpy(), frame['count'].to_numpy())
+    return frame.sort_values('elo', ascending=False).reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Order-independent batch rating fit")
+    parser.add_argument('--method', choices=METHODS, default='logistic')
+    parser.add_argument('--prior-weight', type=float, default=5.0)
+    args = parser.parse_args()
+
+    params = EloParams()
+    _, pas = load_plate_appearances(strikeout_value=params.strikeout_value)
+    state = fit_batch(pas, params, args.method, args.prior_weight)
+    for role in ('batter', 'pitcher'):
+        results = pd.read_csv(f'improved_{role}_elo_ratings_park_factored1.csv', usecols=['player_id'])
+        scaled_ratings(state, role, results['player_id']).to_csv(f'batch_{role}_elo_ratings.csv', index=False)
+    print(f"Wrote batch_batter_elo_ratings.csv and batch_pitcher_elo_ratings.csv ({args.method})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from app_data import build_from_files, load_app_data, save_app_data, season_dir
+from chained import run_chain
+from elo_calculations import enrich, normalize, read_leaderboards
+from elo_engine import DEFAULT_PARAMS, encode_plate_appearances, preprocess_plate_appearances
+from ingest import ingest_statcast, read_park_factors, statcast_paths
+from player_index import load_player_index
+from synthetic_statcast import generate
+
+
+# Stage timings of the whole pipeline on synthetic statcast data (see synthetic_statcast.py),
+# written as json so a regression shows up as a diff between two commits' results:
+#
+#   python benchmark.py --scale 1 5 20 --output bench/$(git rev-parse --short HEAD).json
+#
+# scale 1 is one season of plate appearances, scale 20 is twenty seasons run as one chain
+# (see chained.py). The stages call the same functions elo_calculations.py and the app do,
+# one after the other, each timed on its own:
+#
+#   ingest      - ingest_statcast over every season's monthly csvs
+#   preprocess  - preprocess_plate_appearances + encode_plate_appearances
+#   rating      - run_chain (sequential run_elo with strength of schedule) over all seasons
+#   merges      - elo_calculations.enrich: player index, wRC+/ERA- name resolution and joins
+#   normalize   - elo_calculations.normalize: elo+, elo+2 and the wRC+/ERA- scaled columns
+#   app_build   - build_from_files + save_app_data, what elo_calculations.py does last
+#   app_load    - load_app_data, the app's load_data on a cold cache
+#
+# The pa_cache is bypassed on purpose, the point is to time the work it would skip.
+# Generated data is kept in --data-dir per (scale, seed), so a rerun only pays for the
+# generation once. Run from the repo folder: it reads park_factors.csv, playerid_map.csv,
+# wrc_plus.csv and era_minus.csv like elo_calculations.py does.
+
+STAGES = ['ingest', 'preprocess', 'rating', 'merges', 'normalize', 'app_build', 'app_load']
+DATA_DIR = '.benchmark_data'
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def synthetic_data(scale, seed, data_dir=DATA_DIR):
+    # {season: folder} of generated statcast csvs, generated on the first call only.
+    # returns (directories, seconds spent generating, 0 when reused)
+    directory = os.path.join(data_dir, f'scale{scale:g}_seed{seed}')
+    done = os.path.join(directory, 'done.json')
+    seconds = 0.0
+    if not os.path.exists(done):
+        shutil.rmtree(directory, ignore_errors=True)
+        start = time.perf_counter()
+        written = generate(directory, scale, seed)
+        seconds = time.perf_counter() - start
+        with open(done, 'w') as f:
+            json.dump({'seasons': [str(year) for year in written]}, f)
+    with open(done) as f:
+        seasons = json.load(f)['seasons']
+    return {season: os.path.join(directory, season) for season in seasons}, seconds
+
+
+class StageTimer:
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+
+    def time(self, stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.seconds[stage] += time.perf_counter() - start
+        return result
+
+
+def run_pipeline(directories, work_dir, params=DEFAULT_PARAMS):
+    # one timed pass over every stage; returns (seconds per stage, counts)
+    timer = StageTimer()
+    park_factors_df = read_park_factors()
+    seasons = {}
+    counts = {'seasons': len(directories), 'files': 0, 'csv_bytes': 0, 'plate_appearances': 0}
+    for season, directory in directories.items():
+        paths = [p for p in statcast_paths(directory) if os.path.exists(p)]
+        counts['files'] += len(paths)
+        counts['csv_bytes'] += sum(os.path.getsize(p) for p in paths)
+        combined_df, _ = timer.time('ingest', ingest_statcast, paths)
+        combined_df = timer.time('preprocess', preprocess_plate_appearances, combined_df, params.strikeout_value)
+        seasons[season] = timer.time('preprocess', encode_plate_appearances, combined_df, park_factors_df)
+        counts['plate_appearances'] += len(combined_df)
+
+    results, career = timer.time('rating', run_chain, seasons.items(), params)
+    counts['batters'] = len(career.batter_ids)
+    counts['pitchers'] = len(career.pitcher_ids)
+
+    wrc_df, era_df = read_leaderboards()
+    # the first season pays for loading the player index, like a fresh elo_calculations.py run
+    load_player_index.cache_clear()
+    for season, result in results.items():
+        batter_df, pitcher_df, _ = timer.time('merges', enrich, result.state, wrc_df, era_df)
+        batter_df, pitcher_df = timer.time('normalize', normalize, batter_df, pitcher_df)
+        app_dir = season_dir(season, os.path.join(work_dir, 'app_data'))
+        timer.time('app_build', lambda: save_app_data(*build_from_files(batter_df, pitcher_df, work_dir), app_dir))
+        timer.time('app_load', load_app_data, app_dir)
+    return timer.seconds, counts
+
+
+def benchmark(scale, seed=0, repeat=1, data_dir=DATA_DIR):
+    # best-of-repeat seconds per stage (every run is kept too) for one scale
+    if repeat < 1:
+        raise ValueError("repeat must be at least 1")
+    directories, generate_seconds = synthetic_data(scale, seed, data_dir)
+    runs = []
+    for _ in range(repeat):
+        work_dir = tempfile.mkdtemp(prefix='elo_benchmark_')
+        try:
+            seconds, counts = run_pipeline(directories, work_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        runs.append(seconds)
+    stages = {stage: min(run[stage] for run in runs) for stage in STAGES}
+    return {
+        'scale': scale,
+        'seed': seed,
+        'counts': counts,
+        'generate_seconds': round(generate_seconds, 4),
+        # rounded here only, every rate below comes from the unrounded seconds; the fast
+        # stages are well under 10 ms at small scales
+        'stages': {stage: round(s, 6) for stage, s in stages.items()},
+        'total_seconds': round(sum(stages.values()), 6),
+        'pa_per_second': {stage: round(counts['plate_appearances'] / s) for stage, s in stages.items()
+                          if stage in ('ingest', 'preprocess', 'rating') and s > 0},
+        'runs': [{stage: round(s, 6) for stage, s in run.items()} for run in runs],
+    }
+
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {value}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every pipeline stage on synthetic statcast data")
+    parser.add_argument('--scale', type=float, nargs='+', default=[1.0],
+                        help="seasons of plate appearances, e.g. 1 5 20 (0.25 = a quarter season)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=_positive_int, default=1, help="runs per scale, the fastest one is reported")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="where the generated csvs are kept between runs")
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    report = {
+        'commit': git_commit(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': [],
+    }
+    for scale in args.scale:
+        result = benchmark(scale, args.seed, args.repeat, args.data_dir)
+        report['results'].append(result)
+        stages = ', '.join(f"{stage} {s * 1000:.1f}ms" if s < 1 else f"{stage} {s:.2f}s"
+                           for stage, s in result['stages'].items())
+        print(f"scale {scale:g} ({result['counts']['plate_appearances']} PAs): {stages}")
+        # written after every scale, so a long run that gets killed still leaves results
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
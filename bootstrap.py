@@ -0,0 +1,199 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from elo_engine import EloParams, PlateAppearances, elo_plus2, run_elo
+from pa_cache import load_plate_appearances
+from shared_arrays import attach_arrays, release, share_arrays
+
+
+# Uncertainty of the sequential ratings. The engine is rerun over N perturbed versions
+# of the plate-appearance stream, spread across a process pool:
+#   'resample' - bootstrap: draw N plate appearances with replacement, keep them in date order
+#   'permute'  - same plate appearances, shuffled within each game_date (ordering sensitivity)
+# Workers keep per-player histograms of elo, elo+2 and rank for their replicates and
+# send back only those counts, so memory is fixed by players x bins no matter how big
+# N gets. Percentile intervals are read off the merged histograms. A player a resample
+# happened to draw no plate appearance of is left out of that replicate (and out of its
+# elo+2 scale and ranks) instead of counting the starting elo he was never moved off.
+
+MODES = ('resample', 'permute')
+
+# (low edge, high edge, bin width). elo edges are relative to the starting elo
+ELO_BINS = (-800.0, 800.0, 1.0)
+ELO_PLUS_BINS = (0.0, 600.0, 0.5)
+
+
+class StreamingHistogram:
+    # fixed-bin histogram per player; mergeable, values outside the range land in the edge bins.
+    # discrete=True reports the bin center instead of interpolating (for integer values like ranks)
+
+    def __init__(self, n_players, low, high, width, discrete=False):
+        self.low, self.width, self.discrete = low, width, discrete
+        self.n_bins = int(round((high - low) / width))
+        self.counts = np.zeros((n_players, self.n_bins), dtype=np.int32)
+
+    def add(self, values):
+        # one value per player (NaN = no value this time), so the flat indices never repeat
+        # and a plain += is safe
+        rows = np.flatnonzero(~np.isnan(values))
+        bins = np.clip(((values[rows] - self.low) / self.width).astype(np.int64), 0, self.n_bins - 1)
+        self.counts.reshape(-1)[rows * self.n_bins + bins] += 1
+
+    def merge(self, counts):
+        self.counts += counts
+
+    def quantile(self, q):
+        # per-player quantile, interpolated linearly inside the bin
+        cumulative = np.cumsum(self.counts, axis=1)
+        total = cumulative[:, -1]
+        target = q * total
+        bins = (cumulative < target[:, None]).sum(axis=1).clip(0, self.n_bins - 1)
+        rows = np.arange(len(bins))
+        before = np.where(bins > 0, cumulative[rows, np.maximum(bins - 1, 0)], 0)
+        in_bin = np.maximum(self.counts[rows, bins], 1)
+        position = 0.5 if self.discrete else (target - before) / in_bin
+        result = self.low + (bins + position) * self.width
+        return np.where(total > 0, result, np.nan)
+
+
+def _histograms(n_players, start_elo):
+    return {
+        'elo': StreamingHistogram(n_players, start_elo + ELO_BINS[0], start_elo + ELO_BINS[1], ELO_BINS[2]),
+        'elo+2': StreamingHistogram(n_players, *ELO_PLUS_BINS),
+        # rank bins are exact: one per possible rank
+        'rank': StreamingHistogram(n_players, 0.5, n_players + 0.5, 1.0, discrete=True),
+    }
+
+
+def replicate_order(mode, game_date, rng):
+    # plate appearance indices for one replicate, always in chronological order
+    n = len(game_date)
+    if mode == 'resample':
+        return np.sort(rng.integers(0, n, n))
+    return np.lexsort((rng.random(n), game_date))
+
+
+def _summaries(state, masks):
+    # elo, elo+2 and rank (1 = best) for the players in each role's mask, NaN for the ones
+    # without a plate appearance; elo+2 and ranks are taken over the players who have one
+    out = {}
+    for role in ('batter', 'pitcher'):
+        mask = masks[role]
+        elo = getattr(state, f'{role}_elo')[mask]
+        count = getattr(state, f'{role}_count')[mask]
+        played = count > 0
+        summary = {metric: np.full(len(elo), np.nan) for metric in ('elo', 'elo+2', 'rank')}
+        summary['elo'][played] = elo[played]
+        summary['elo+2'][played] = elo_plus2(elo[played], count[played])
+        rank = np.empty(played.sum())
+        rank[np.argsort(-elo[played], kind='stable')] = np.arange(1, len(rank) + 1)
+        summary['rank'][played] = rank
+        out[role] = summary
+    return out
+
+
+# per-worker globals, filled in by _init_worker
+_worker = {}
+
+
+def _init_worker(specs, small):
+    _worker.update(attach_arrays(specs))
+    _worker.update(small)
+
+
+def _run_replicates(mode, seed, n_replicates):
+    rng = np.random.default_rng(seed)
+    params, masks = _worker['params'], _worker['masks']
+    hists = {role: _histograms(int(masks[role].sum()), params.start_elo) for role in ('batter', 'pitcher')}
+    for _ in range(n_replicates):
+        order = replicate_order(mode, _worker['game_date'], rng)
+        pas = PlateAppearances(
+            batter=_worker['batter'][order], pitcher=_worker['pitcher'][order], home=_worker['home'][order],
+            woba_norm=_worker['woba_norm'][order], game_date=None, at_bat_number=None,
+            batter_ids=_worker['batter_ids'], pitcher_ids=_worker['pitcher_ids'],
+            teams=_worker['teams'], team_park_factor=_worker['team_park_factor'],
+        )
+        for role, metrics in _summaries(run_elo(pas, params), masks).items():
+            for metric, values in metrics.items():
+                hists[role][metric].add(values)
+    return n_replicates, {role: {m: h.counts for m, h in metrics.items()} for role, metrics in hists.items()}
+
+
+def bootstrap_intervals(pas, params=EloParams(), mode='resample', n_replicates=200, levels=(0.025, 0.975),
+                        batter_ids=None, pitcher_ids=None, workers=None, seed=0):
+    # returns one DataFrame per role (dict) with the point estimates and percentile intervals.
+    # batter_ids/pitcher_ids limit elo+2 and rank to those players (e.g. the ones in the results csv)
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    masks = {
+        'batter': np.ones(len(pas.batter_ids), bool) if batter_ids is None else np.isin(pas.batter_ids, batter_ids),
+        'pitcher': np.ones(len(pas.pitcher_ids), bool) if pitcher_ids is None else np.isin(pas.pitcher_ids, pitcher_ids),
+    }
+    point = _summaries(run_elo(pas, params), masks)
+    hists = {role: _histograms(int(masks[role].sum()), params.start_elo) for role in ('batter', 'pitcher')}
+
+    blocks, specs = share_arrays({'batter': pas.batter, 'pitcher': pas.pitcher, 'home': pas.home,
+                                  'woba_norm': pas.woba_norm, 'game_date': np.asarray(pas.game_date)})
+    small = {'batter_ids': pas.batter_ids, 'pitcher_ids': pas.pitcher_ids, 'teams': pas.teams,
+             'team_park_factor': pas.team_park_factor, 'params': params, 'masks': masks}
+    workers = workers or os.cpu_count()
+    # a few tasks per worker keeps the pool busy; each task returns one set of histograms
+    per_task = max(1, n_replicates // (workers * 4))
+    tasks = [min(per_task, n_replicates - i) for i in range(0, n_replicates, per_task)]
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+    done = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(specs, small)) as pool:
+            futures = [pool.submit(_run_replicates, mode, s, n) for s, n in zip(seeds, tasks)]
+            for future in as_completed(futures):
+                n, counts = future.result()
+                for role, metrics in counts.items():
+                    for metric, c in metrics.items():
+                        hists[role][metric].merge(c)
+                done += n
+    finally:
+        release(blocks)
+
+    results = {}
+    for role in ('batter', 'pitcher'):
+        ids = getattr(pas, f'{role}_ids')[masks[role]]
+        df = pd.DataFrame({'player_id': ids})
+        for metric in ('elo', 'elo+2', 'rank'):
+            df[metric] = point[role][metric]
+            df[f'{metric}_low'] = hists[role][metric].quantile(levels[0])
+            df[f'{metric}_median'] = hists[role][metric].quantile(0.5)
+            df[f'{metric}_high'] = hists[role][metric].quantile(levels[1])
+        df['replicates'] = done
+        # replicates the player was in, the intervals come from those
+        df['replicates_played'] = hists[role]['elo'].counts.sum(axis=1)
+        df['mode'] = mode
+        results[role] = df.sort_values('elo', ascending=False).reset_index(drop=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap / ordering-sensitivity intervals for ELO")
+    parser.add_argument('--mode', choices=MODES, default='resample')
+    parser.add_argument('--replicates', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    params = EloParams()
+    _, pas = load_plate_appearances(strikeout_value=params.strikeout_value)
+    # same players (and so the same elo+2 scale) as the results the app shows
+    batter_ids = pd.read_csv('improved_batter_elo_ratings_park_factored1.csv', usecols=['player_id'])['player_id']
+    pitcher_ids = pd.read_csv('improved_pitcher_elo_ratings_park_factored1.csv', usecols=['player_id'])['player_id']
+    results = bootstrap_intervals(pas, params, args.mode, args.replicates, batter_ids=batter_ids,
+                                  pitcher_ids=pitcher_ids, workers=args.workers, seed=args.seed)
+    results['batter'].to_csv('batter_elo_intervals.csv', index=False)
+    results['pitcher'].to_csv('pitcher_elo_intervals.csv', index=False)
+    print(f"Wrote intervals from {args.replicates} '{args.mode}' replicates")
+
+
+if __name__ == '__main__':
+    main()
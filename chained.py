@@ -0,0 +1,137 @@
+import argparse
+import dataclasses
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from elo_engine import DEFAULT_PARAMS, NEVER_SEEN, SOS_FIELDS, EloParams, EloState, merge_states, run_elo, state_for
+from ingest import statcast_paths
+from pa_cache import load_plate_appearances
+from player_index import attach_metadata, load_player_index
+
+
+# Several seasons in one chain of ratings, instead of everybody restarting at 1500 each
+# year. A player's end-of-season elo and count carry into the next season, after the
+# elo is regressed part of the way back toward the mean over the offseason; players the
+# chain has never seen start from new_player_elo. The carried state stays in memory as
+# an EloState (state_for lays it out in the next season's player codes, merge_states
+# folds each season back in), so every season costs one pass over its own plate
+# appearances plus a hash join over its players: a ten-season chain is linear in PAs.
+#
+# The count carries too, so veterans start the season on k_low. The per-season results
+# report that season's PAs only (and its own strength of schedule); the carried count
+# is in career_count. The regression is the whole offseason: with decay_half_life set,
+# inactivity decay restarts from the new season's first day instead of also counting
+# the months between seasons.
+
+
+@dataclass(frozen=True)
+class ChainParams:
+    # share of the distance to the target a rating gives back over the offseason
+    regression: float = 0.3
+    # None = params.start_elo
+    regression_target: float = None
+    # elo of players new to the chain (rookies etc.), None = params.start_elo
+    new_player_elo: float = None
+
+
+DEFAULT_CHAIN = ChainParams()
+
+
+def season_inputs(directory):
+    # (statcast paths, park factors path) of a season folder laid out like this repo
+    park_factors = os.path.join(directory, 'park_factors.csv')
+    return statcast_paths(directory), park_factors if os.path.exists(park_factors) else 'park_factors.csv'
+
+
+def carry_over(state, params=DEFAULT_PARAMS, chain=DEFAULT_CHAIN, season_start=None):
+    # state after the offseason: elo regressed toward the target, counts kept, strength of
+    # schedule reset for the new season. last_seen moves to season_start (a datetime64 day,
+    # or never seen without one), so the decay doesn't regress the offseason a second time
+    target = params.start_elo if chain.regression_target is None else chain.regression_target
+    keep = 1 - chain.regression
+    regressed = {f'{role}_elo': target + keep * (getattr(state, f'{role}_elo') - target) for role in ('batter', 'pitcher')}
+    cleared = {f'{role}_{field}': None for role in ('batter', 'pitcher') for field in SOS_FIELDS}
+    start_day = NEVER_SEEN if season_start is None else np.datetime64(season_start, 'D').astype(np.int64)
+    seen = {f'{role}_last_seen': np.full(len(getattr(state, f'{role}_ids')), start_day, dtype=np.int64)
+            for role in ('batter', 'pitcher')}
+    return dataclasses.replace(state, clipped=0, **regressed, **cleared, **seen)
+
+
+def start_season(pas, career=None, params=DEFAULT_PARAMS, chain=DEFAULT_CHAIN):
+    # the state to run pas from: carried-over players plus new ones at new_player_elo.
+    # the first season of a chain (career None) starts everybody at start_elo
+    if career is None:
+        return state_for(pas, None, params)
+    prior = params.start_elo if chain.new_player_elo is None else chain.new_player_elo
+    season_start = None if pas.game_date is None or not len(pas) else np.min(pas.game_date)
+    return state_for(pas, carry_over(career, params, chain, season_start), dataclasses.replace(params, start_elo=prior))
+
+
+@dataclass
+class SeasonResult:
+    state: EloState                  # counts (and clips) of this season alone
+    batter_career_count: np.ndarray  # counts including the carried ones, same order
+    pitcher_career_count: np.ndarray
+
+    def frame(self, role):
+        # player_id, elo, count, career_count (plus the strength of schedule columns)
+        frame = getattr(self.state, f'{role}_frame')()
+        frame.insert(frame.columns.get_loc('count') + 1, 'career_count', getattr(self, f'{role}_career_count'))
+        return frame
+
+
+def season_only(final, start):
+    # final run of a season -> SeasonResult, taking the carried counts back out
+    state = dataclasses.replace(final, clipped=final.clipped - start.clipped, **{
+        f'{role}_count': getattr(final, f'{role}_count') - getattr(start, f'{role}_count') for role in ('batter', 'pitcher')})
+    return SeasonResult(state, final.batter_count, final.pitcher_count)
+
+
+def run_chain(seasons, params=DEFAULT_PARAMS, chain=DEFAULT_CHAIN, strength_of_schedule=True, progress=False):
+    # seasons: (season, plate_appearances) pairs, oldest first; a generator keeps just one
+    # season's plate appearances in memory at a time. returns ({season: SeasonResult}, career):
+    # the per-season results and the carried state after the last season
+    results = {}
+    career = None
+    for season, pas in seasons:
+        start = start_season(pas, career, params, chain)
+        final = run_elo(pas, params, start, progress=progress, strength_of_schedule=strength_of_schedule)
+        results[season] = season_only(final, start)
+        career = final if career is None else merge_states(career, final)
+    return results, career
+
+
+def load_seasons(directories, strikeout_value=DEFAULT_PARAMS.strikeout_value):
+    # generator of (season, plate_appearances) for {season: folder}, loaded on demand
+    for season, directory in directories.items():
+        paths, park_factors = season_inputs(directory)
+        _, pas = load_plate_appearances(paths, park_factors, strikeout_value=strikeout_value)
+        yield season, pas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chain several seasons of ratings, oldest first")
+    parser.add_argument('seasons', nargs='+', help="season=folder pairs, e.g. 2024=data/2024 2025=.")
+    parser.add_argument('--regression', type=float, default=DEFAULT_CHAIN.regression)
+    parser.add_argument('--new-player-elo', type=float, default=None)
+    args = parser.parse_args()
+
+    directories = dict(pair.split('=', 1) for pair in args.seasons)
+    params = EloParams()
+    chain = ChainParams(regression=args.regression, new_player_elo=args.new_player_elo)
+    results, career = run_chain(load_seasons(directories, params.strikeout_value), params, chain)
+    player_index = load_player_index()
+    for season, result in results.items():
+        if result.state.clipped:
+            print(f"{season}: HAD TO CLIP {result.state.clipped} EXPECTATIONS")
+        for role in ('batter', 'pitcher'):
+            frame = attach_metadata(result.frame(role), player_index, ['MLBID', 'MLBNAME', 'TEAM']).drop(columns='MLBID')
+            frame.sort_values('elo', ascending=False).to_csv(f'chained_{role}_elo_ratings_{season}.csv', index=False)
+    print(f"Wrote chained_batter/pitcher_elo_ratings_<season>.csv for {', '.join(results)} "
+          f"({len(career.batter_ids)} batters, {len(career.pitcher_ids)} pitchers in the chain)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,50 +1,91 @@
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import plotly.express as px
-
-
-# Read in all CSV files and combine into a single DataFrame
-months = ['march','april','may','june','july','aug','sep']
-numbers = ['1','2','3','4','5','6']
-combined_df = pd.DataFrame()
-counter = 0 #should end up at 34
-for month in months: 
-    for number in numbers:
-        try: 
-            current_df = pd.read_csv(f'{month}{number}.csv')
-
-            # remove any rows where 'events' column is null 
-            current_df = current_df[current_df['events'].notnull()] 
-
-            combined_df = pd.concat([combined_df, current_df], ignore_index=True)
-            counter += 1
-        except: 
-            continue 
-
-#read in park factors df
-park_factors_df = pd.read_csv('park_factors.csv')
-park_factors_df['Park Factor'] = park_factors_df['Park Factor'] / 100
-
-#read in wRC+ and era+ df 
-
-# read in 2025 zips projections df
-
-# drop duplicates from combined_df
-combined_df = combined_df.drop_duplicates() 
+import argparse
+import os
+from dataclasses import dataclass, field
 
-# remove unnecessary columns from combined_df 
-cols = ['game_date', 'batter','pitcher','events','estimated_ba_using_speedangle',
-        'estimated_woba_using_speedangle','woba_value','woba_denom','at_bat_number',
-        'estimated_slg_using_speedangle', 'home_team']
-
-#combined_df_big = combined_df.copy()
-combined_df = combined_df[cols]
-
-# order combined_df chronologically (date, at_bat_number) 
-combined_df = combined_df.sort_values(by=['game_date','at_bat_number'], ascending=[True, True]).reset_index(drop=True)
+import pandas as pd
 
-# read in marels data 
+from app_data import DEFAULT_SEASON, build_from_files, save_app_data, season_dir
+from chained import DEFAULT_CHAIN, ChainParams, load_seasons, run_chain, season_only, start_season
+from elo_engine import DEFAULT_PARAMS, EloParams, decay_ratings, encode_plate_appearances, preprocess_plate_appearances, \
+    run_elo
+from ingest import ingest_statcast, print_ingest_report, read_park_factors, statcast_paths
+from instrumentation import PROFILE_MODES, RunReport
+from pa_cache import load_plate_appearances
+from player_index import BATTERS_PER_INNING, DIAGNOSTICS_FILE, attach_metadata, load_player_index, print_match_summary, \
+    resolve_names
+from rating_history import RatingHistory, remove_history, save_history
+
+
+# The season pipeline, as functions: ingest -> preprocess -> rate -> enrich -> normalize ->
+# (plot) -> export, and run() doing all of them in order with a RunReport (see
+# instrumentation.py). Importing this module runs nothing, so the app, a scheduler or a
+# notebook can call any step on its own, e.g.
+#
+#   from elo_calculations import PipelineConfig, run
+#   batter_df, pitcher_df = run(PipelineConfig(rating_mode='daily', charts=False))
+#
+# or from the command line: python elo_calculations.py [--headless] [--mode daily] ...
+#
+# matplotlib and plotly are imported inside plot() only, and scipy (batch mode) inside
+# rate(), so a headless run (charts=False / --headless) never loads them and never blocks
+# on plt.show() or needs kaleido for write_image.
+
+RATING_MODES = ('sequential', 'daily', 'glicko2', 'batch')
+
+
+@dataclass
+class PipelineConfig:
+    # EloParams(decay_half_life=...) regresses players toward the mean while they are inactive
+    params: EloParams = DEFAULT_PARAMS
+    # 'sequential' updates after every plate appearance, 'daily' freezes ratings for each
+    # game_date and applies the whole day at once (see rating_periods.py), 'glicko2' uses
+    # glicko-2 with daily rating periods and adds rd/volatility columns (see glicko2.py),
+    # 'batch' fits every rating at once from the whole season, independent of order (see batch_fit.py)
+    rating_mode: str = 'sequential'
+    # keep every player's rating before/after each PA in elo_history/<season>/ (sequential mode only),
+    # the app's trajectory charts read from there (see rating_history.py)
+    save_rating_history: bool = True
+    # the app keeps one set of precomputed tables per season, in app_data/<season>/ (see app_data.py)
+    season: str = DEFAULT_SEASON
+    # earlier seasons to chain in before this one, oldest first, as {season: folder with that
+    # season's statcast csvs}, e.g. {'2023': 'data/2023', '2024': 'data/2024'}. ratings and counts
+    # carry into the next season, regressed toward the mean, and players new to the chain start
+    # at chain_params.new_player_elo (see chained.py). sequential and daily mode only
+    prior_seasons: dict = field(default_factory=dict)
+    chain_params: ChainParams = DEFAULT_CHAIN
+    # False = headless: no plotting library gets imported and nothing is rendered
+    charts: bool = True
+    # open the chart windows (plt.show / fig.show) after saving the pngs
+    show_charts: bool = True
+    # the time and peak memory of every stage and the rating loop's counters go to report_path.
+    # profile = 'cprofile' or 'sample' also profiles profile_stages
+    report_path: str = 'run_report.json'
+    profile: str = None
+    profile_stages: tuple = ('rating',)
+
+
+def ingest(paths=None, verbose=True):
+    # every monthly statcast csv combined into one table of plate appearances (see ingest.py)
+    combined_df, report = ingest_statcast(statcast_paths() if paths is None else paths)
+    if verbose:
+        print_ingest_report(report)
+    return combined_df
+
+
+def preprocess(combined_df, params=DEFAULT_PARAMS, park_factors_path='park_factors.csv'):
+    # if events = strikeout, make the woba_value -0.7 (worse than normal out), then min/max
+    # scale woba, and encode the players and park factors for the loop.
+    # returns (combined_df, plate_appearances)
+    combined_df = preprocess_plate_appearances(combined_df, strikeout_value=params.strikeout_value)
+    return combined_df, encode_plate_appearances(combined_df, read_park_factors(park_factors_path))
+
+
+def load_inputs(params=DEFAULT_PARAMS, paths=None):
+    # ingest + preprocess, loaded from the .elo_cache folder on warm runs (see pa_cache.py)
+    return load_plate_appearances(paths, strikeout_value=params.strikeout_value)
+
+
+# read in marels data
 #marcels_pitchers = pd.read_csv('pitchers_marcels_pre_2025.csv')
 #marcels_batters = pd.read_csv('batters_marcels_pre_2025.csv')
 
@@ -55,289 +96,323 @@ combined_df = combined_df.sort_values(by=['game_date','at_bat_number'], ascendin
 #marcels_pitchers['era-'] = (average_era - marcels_pitchers['ERA']) * (marcels_pitchers['IP'] / marcels_pitchers['IP'].sum())
 #marcels_batters['ops+'] = (marcels_batters['OPS'] - average_ops) * (marcels_batters['PA'] / marcels_batters['PA'].sum())
 
-# future idea: benchmark by using these instead of just assuming 1500 
-
-# create pitcher_df and hitter_df with all unique player_ids, and standard starting ELOs
-pitcher_df = pd.DataFrame({'player_id': combined_df['pitcher'].unique(), 'elo': 1500.00, 'count': 0})
-batter_df = pd.DataFrame({'player_id': combined_df['batter'].unique(), 'elo': 1500.00, 'count': 0})
-
-# Loop through all events, applying the ELO rating adjustments to the pitchers and the hitters
-#Version 1: hit is a win, out is a loss (for the hitter) (like chess)
-combined_df['woba_value'] = combined_df['woba_value'].fillna(0)
-combined_df['binary_outcome'] = np.where(combined_df['woba_value'] > 0, 1, 0)
-
-# if events = strikeout, make the woba_value -0.5 (worse than normal out)
-combined_df.loc[combined_df['events'] == 'strikeout', 'woba_value'] = -0.7
-
-# min/max scale woba by adding 0.5, then doing proper scaling 
-combined_df['woba_add_0.5'] = combined_df['woba_value'] + 0.7
-woba_min = combined_df['woba_add_0.5'].min()
-woba_max = combined_df['woba_add_0.5'].max()
-combined_df['woba_norm'] = (combined_df['woba_add_0.5'] - woba_min) / (woba_max - woba_min)
-
-examples = combined_df[['events','woba_norm']].drop_duplicates().reset_index(drop=True).sort_values(by='woba_norm', ascending=False)
-examples2 = combined_df[['events','woba_value']].drop_duplicates().reset_index(drop=True).sort_values(by='woba_value', ascending=False)
-
-examples3 = examples.copy()
-examples3['value'] = examples3['woba_norm'].round(2)
-
-_progress_thresholds = [i/10 for i in range(1, 11)]
-_progress_printed = set()
-print("Starting loop!")
-for index, row in combined_df.iterrows():
-
-    #print statement (just once!) whenever we eclipse 10%, 20%, etc. 
-    progress = (index + 1) / len(combined_df)
-
-    # print once when crossing each threshold (10%, 20%, ..., 100%)
-    for t in _progress_thresholds:
-        if progress >= t and t not in _progress_printed:
-            print(f"Progress: {int(t*100)}% reached ({index+1}/{len(combined_df)})")
-            _progress_printed.add(t)
-            break
-
-    #Get home team 
-    home_team = row['home_team']
-
-    #get park factor from park_factors_df
-    park_factor = park_factors_df.loc[park_factors_df['Team'] == home_team, 'Park Factor'].values[0]
-
-    # Get the current batter and pitcher
-    batter = row['batter']
-    batter_elo = batter_df.loc[batter_df['player_id'] == batter, 'elo'].values[0]
-    batter_count = batter_df.loc[batter_df['player_id'] == batter, 'count'].values[0]
-    batter_k_factor = 0 
-
-    # k factor based on sample size (consider adjusting!)
-    # 30 games is considered the chess sample size, so 30*4 = 120 at bats
-    # if a player has played 30 games, we just keep the k factor at 20 
-    if batter_count <= 120:
-        batter_k_factor = 40
-    #elif batter_elo <= 2400:
-    #    batter_k_factor = 20
+# future idea: benchmark by using these instead of just assuming 1500
+
+
+def rate(plate_appearances, config=None, stats=None):
+    # Loop through all events, applying the ELO rating adjustments to the pitchers and the hitters
+    # (see elo_engine.py: ids get encoded to integer codes once and the loop runs over plain arrays).
+    # returns the final EloState of this season; stats gets the loop counters in sequential mode
+    config = config or PipelineConfig()
+    params, mode = config.params, config.rating_mode
+    start_state = None
+    if config.prior_seasons and mode in ('sequential', 'daily'):
+        prior_results, career_state = run_chain(load_seasons(config.prior_seasons, params.strikeout_value), params,
+                                                config.chain_params)
+        start_state = start_season(plate_appearances, career_state, params, config.chain_params)
+        print(f"Chained in {', '.join(prior_results)}: {(start_state.batter_count > 0).sum()} batters and "
+              f"{(start_state.pitcher_count > 0).sum()} pitchers start from a carried-over rating")
+    elif config.prior_seasons:
+        print(f"WARNING: prior_seasons is ignored in {mode} mode")
+
+    print("Starting loop!")
+    if mode == 'daily':
+        from rating_periods import run_elo_periods
+        elo_state = run_elo_periods(plate_appearances, params, start_state, strength_of_schedule=True)
+    elif mode == 'glicko2':
+        from glicko2 import Glicko2Params, run_glicko2
+        elo_state = run_glicko2(plate_appearances, Glicko2Params(use_park_factor=params.use_park_factor))
+    elif mode == 'batch':
+        from batch_fit import fit_batch
+        elo_state = fit_batch(plate_appearances, params)
     else:
-        batter_k_factor = 20
-
-    pitcher = row['pitcher']
-    pitcher_elo = pitcher_df.loc[pitcher_df['player_id'] == pitcher, 'elo'].values[0]
-    pitcher_count = pitcher_df.loc[pitcher_df['player_id'] == pitcher, 'count'].values[0]
-    pitcher_k_factor = 0
-
-    # k factor based on sample size (consider adjusting!)
-    # 30 games is considered the chess sample size, so 30*4 = 120 at bats
-    # we do 4 as well here for pitchers, even though this is not accurate for SP
-    # if a player has played 30 games, we just keep the k factor at 20
-    if pitcher_count <= 120:
-        pitcher_k_factor = 40
-    #elif pitcher_elo <= 2400:
-    #    pitcher_k_factor = 20
+        rating_history = RatingHistory.allocate(len(plate_appearances)) if config.save_rating_history else None
+        elo_state = run_elo(plate_appearances, params, start_state, progress=True, history=rating_history,
+                            strength_of_schedule=True, stats=stats)
+        if config.save_rating_history:
+            save_history(rating_history, plate_appearances, config.season)
+    # the app would show a history from an earlier run next to these ratings, so drop it
+    if (mode != 'sequential' or not config.save_rating_history) and remove_history(config.season):
+        print(f"Removed the {config.season} elo_history from an earlier run, this run doesn't write one")
+    # the counts (and PAs in the output) are this season's, the carried ones only set the k factor
+    if start_state is not None:
+        elo_state = season_only(elo_state, start_state).state
+    if elo_state.clipped:
+        print(f"HAD TO CLIP {elo_state.clipped} EXPECTATIONS")
+    # decay is applied lazily, so bring everybody's rating up to the last day of the data
+    if mode in ('sequential', 'daily'):
+        elo_state = decay_ratings(elo_state, plate_appearances.game_date.max(), params)
+    return elo_state
+
+
+def read_leaderboards():
+    # the fangraphs wRC+ and ERA- leaderboards, with the qualified flag
+    wrc_df = pd.read_csv('wrc_plus.csv')
+    wrc_df = wrc_df.dropna()
+    wrc_df['is_qualified'] = wrc_df['PA'] >= 502
+    era_df = pd.read_csv('era_minus.csv')
+    era_df = era_df.dropna()
+    era_df['is_qualified'] = era_df['IP'] >= 162
+    return wrc_df, era_df
+
+
+def enrich(elo_state, wrc_df=None, era_df=None):
+    # ratings -> (batter_df, pitcher_df, diagnostics): names and teams from the player index,
+    # wRC+ / ERA- from the leaderboards. diagnostics has the leaderboard rows that matched
+    # nobody or several players
+    if wrc_df is None or era_df is None:
+        wrc_df, era_df = read_leaderboards()
+
+    # pitcher_df and batter_df with all unique player_ids, their final ELOs and PA counts, plus
+    # avg_opp_elo / opp_elo_sd / avg_park_factor (strength of schedule) in sequential and daily mode
+    batter_df = elo_state.batter_frame()
+    pitcher_df = elo_state.pitcher_frame()
+
+    # player names from the slim MLBID-keyed index (see player_index.py), joined on the integer id
+    player_index = load_player_index()
+    batter_df = attach_metadata(batter_df, player_index)
+    pitcher_df = attach_metadata(pitcher_df, player_index)
+
+    # the fangraphs leaderboards only have names: resolve each row to an MLBID once, then join on it
+    # namesakes are told apart by PA (IP for pitchers) against the rated PA counts
+    wrc_resolved, wrc_diagnostics = resolve_names(wrc_df, player_index, batter_df['player_id'], source='wrc_plus.csv',
+                                                  counts=batter_df['count'], volume_col='PA')
+    print_match_summary('wrc_plus.csv', wrc_df, wrc_resolved, wrc_diagnostics)
+    batter_df = pd.merge(batter_df, wrc_resolved, on='player_id', how='inner')
+
+    era_resolved, era_diagnostics = resolve_names(era_df, player_index, pitcher_df['player_id'], source='era_minus.csv',
+                                                  counts=pitcher_df['count'], volume_col='IP',
+                                                  volume_scale=BATTERS_PER_INNING)
+    print_match_summary('era_minus.csv', era_df, era_resolved, era_diagnostics)
+    pitcher_df = pd.merge(pitcher_df, era_resolved, on='player_id', how='inner')
+    return batter_df, pitcher_df, pd.concat([wrc_diagnostics, era_diagnostics])
+
+
+def normalize(batter_df, pitcher_df):
+    # adds the elo+ columns below and returns both frames sorted best to worst
+    #ELO plus column explanations
+    # elo is standard, based at 1500 like chess
+    # elo_adjusted is used to bump negatives to zero (if necessary)
+    # elo+ standardizes elo using league averages
+    # elo_adjusted2 sets the minimums to zero (ASSUMING NO NEGATIVES)
+    # elo+2 standardizes using league averages after setting minimums to zero
+    # elo+_wrc makes the necessary adjustments to set the qualified elo+_wrc min and max at the wrc+ min and max for comparision
+    batter_df = batter_df.copy()
+    pitcher_df = pitcher_df.copy()
+
+    # first, get the mins
+    batter_elo_min = batter_df['elo'].min()
+    pitcher_elo_min = pitcher_df['elo'].min()
+
+    if batter_elo_min >= 0:
+        batter_elo_min = 0
     else:
-        pitcher_k_factor = 20
-
-    # Get the outcome of the event
-    outcome_binary = row['binary_outcome']
-    outcome_woba = row['woba_value']
-    outcome_woba_norm = row['woba_norm']
-
-    # Apply ELO adjustments based on the outcome and based on the ELO difference
-    difference = pitcher_elo - batter_elo
-    value1 = difference / 400
-    value2 = (10**value1)+1
-    expected_batter = 1 / value2
-    expected_batter = expected_batter * park_factor  # adjust expectation by park factor
-    if expected_batter > 1: 
-        expected_batter = 1 
-        print("HAD TO CLIP AN EXPECTATION")
-    expected_pitcher = 1 - expected_batter
-
-    batter_change = batter_k_factor * (outcome_woba_norm - expected_batter)
-    pitcher_change = pitcher_k_factor * ((1-outcome_woba_norm)-expected_pitcher)
-
-    batter_df.loc[batter_df['player_id'] == batter, 'elo'] += batter_change
-    pitcher_df.loc[pitcher_df['player_id'] == pitcher, 'elo'] += pitcher_change
-
-    batter_df.loc[batter_df['player_id'] == batter, 'count'] += 1
-    pitcher_df.loc[pitcher_df['player_id'] == pitcher, 'count'] += 1
-
-    # I think negative ELO is technically ok...
-    #print warning if either ELO goes into the negative
-    #if batter_df.loc[batter_df['player_id'] == batter, 'elo'].values[0] < 0:
-        #print(f"Warning: Batter ELO for {batter} is negative!")
-    #if pitcher_df.loc[pitcher_df['player_id'] == pitcher, 'elo'].values[0] < 0:
-        #print(f"Warning: Pitcher ELO for {pitcher} is negative!")
-
-# read in player names
-id_map = pd.read_csv('playerid_map.csv')
-id_map = id_map[['MLBID', 'MLBNAME', 'TEAM', 'FANGRAPHSNAME']]
-
-
-# merge player names
-batter_df = pd.merge(batter_df, id_map, left_on='player_id', right_on='MLBID', how='left')
-pitcher_df = pd.merge(pitcher_df, id_map, left_on='player_id', right_on='MLBID', how='left')
-
-wrc_df = pd.read_csv('wrc_plus.csv')
-wrc_df = wrc_df.dropna()
-wrc_df['is_qualified'] = wrc_df['PA'] >= 502
-
-batter_df = pd.merge(batter_df, wrc_df, left_on='FANGRAPHSNAME', right_on='Name', how='inner')
-
-era_df = pd.read_csv('era_minus.csv')
-era_df = era_df.dropna()
-era_df['is_qualified'] = era_df['IP'] >= 162
-
-pitcher_df = pd.merge(pitcher_df, era_df, left_on='FANGRAPHSNAME', right_on='Name', how='inner')
-
-#ELO plus column explanations
-# elo is standard, based at 1500 like chess 
-# elo_adjusted is used to bump negatives to zero (if necessary)
-# elo+ standardizes elo using league averages
-# elo_adjusted2 sets the minimums to zero (ASSUMING NO NEGATIVES)
-# elo+2 standardizes using league averages after setting minimums to zero 
-# elo+_wrc makes the necessary adjustments to set the qualified elo+_wrc min and max at the wrc+ min and max for comparision 
-
-
-# first, get the mins 
-batter_elo_min = batter_df['elo'].min()
-pitcher_elo_min = pitcher_df['elo'].min()
-
-if batter_elo_min >= 0: 
-    batter_elo_min = 0 
-else: 
-    print("WARNING, NEGATIVE BATTER ELO")
-if pitcher_elo_min >= 0: 
-    pitcher_elo_min = 0 
-else: 
-    print("WARNING, NEGATIVE PITCHER ELO")
-
-#elo_adjusted column to eliminate negatives
-batter_df['elo_adjusted'] = batter_df['elo'] + abs(batter_elo_min)
-pitcher_df['elo_adjusted'] = pitcher_df['elo'] + abs(pitcher_elo_min)
-
-#weighted averages for batter and pitcher elos: 
-average_batter_elo = (batter_df['elo_adjusted'] * batter_df['count']).sum() / batter_df['count'].sum()
-average_pitcher_elo = (pitcher_df['elo_adjusted'] * pitcher_df['count']).sum() / pitcher_df['count'].sum()
-
-batter_df['elo+'] = (batter_df['elo_adjusted'] / average_batter_elo) * 100
-pitcher_df['elo+'] = (pitcher_df['elo_adjusted'] / average_pitcher_elo) * 100
-
-#make the worst zero 
-batter_df['elo_adjusted2'] = batter_df['elo'] - batter_df['elo'].min()
-pitcher_df['elo_adjusted2'] = pitcher_df['elo'] - pitcher_df['elo'].min()
-
-#now calculate the weighted averages 
-batter_adjusted2_mean = (batter_df['elo_adjusted2'] * batter_df['count']).sum() / batter_df['count'].sum()
-pitcher_adjusted2_mean = (pitcher_df['elo_adjusted2'] * pitcher_df['count']).sum() / pitcher_df['count'].sum()
-
-#elo+2
-batter_df['elo+2'] = (batter_df['elo_adjusted2'] / batter_adjusted2_mean) * 100
-pitcher_df['elo+2'] = (pitcher_df['elo_adjusted2'] / pitcher_adjusted2_mean) * 100
-
-# elo+_wrc makes the necessary adjustments to set the qualified elo+_wrc min and max at the wrc+ min and max for comparision 
-qualified_batters = batter_df[batter_df['is_qualified'] == True]
-min_wrc_plus = qualified_batters['WRC+'].min()
-max_wrc_plus = qualified_batters['WRC+'].max()
-min_elo = qualified_batters['elo'].min()
-max_elo = qualified_batters['elo'].max()
-
-batter_df['elo+_wrc'] = ((batter_df['elo'] - min_elo) / (max_elo - min_elo)) * (max_wrc_plus - min_wrc_plus) + min_wrc_plus
-
-#do the same with pitchers and era-
-qualified_pitchers = pitcher_df[pitcher_df['is_qualified'] == True]
-min_era = qualified_pitchers['ERA-'].min()
-max_era = qualified_pitchers['ERA-'].max()
-min_elo = qualified_pitchers['elo'].min()
-max_elo = qualified_pitchers['elo'].max()
-
-pitcher_df['elo+_era'] = ((pitcher_df['elo'] - min_elo) / (max_elo - min_elo)) * (max_era - min_era) + min_era
-
-#sort best to worst 
-batter_df_sorted = batter_df.sort_values(by='elo', ascending=False).reset_index(drop=True)
-pitcher_df_sorted = pitcher_df.sort_values(by='elo', ascending=False).reset_index(drop=True)
-
-# check out how this stat treats tommy pham 
-tommy_pham = batter_df_sorted[batter_df_sorted['MLBNAME'] == 'Tommy Pham']
-print(f"Tommy Pham's ELO+ from 2025 is: {tommy_pham['elo+'].values[0]} or {tommy_pham['elo+2'].values[0]} or {tommy_pham['elo+_wrc'].values[0]}, compared to an OPS+ of 95, and a wRC+ of 94")
-
-# plot wrc+ by elo+_wrc+ for qualified hitters
-#make the plots so that if you hover over the point the name pops up 
-qualified_batters = batter_df_sorted[batter_df_sorted['is_qualified'] == True]
-
-try: 
-    plt.scatter(qualified_batters['elo+_wrc'], qualified_batters['WRC+'])
-    plt.xlabel("ELO+_WRC+")
-    plt.ylabel("WRC+")
-    plt.title("WRC+ by ELO+_WRC+ for Qualified Hitters")
-    plt.show()
-
-    # save figure
-    plt.savefig("wrc_plus_by_elo_plus_wrc_plus.png")
-except: 
-    print("Couldn't plot hitters")
-
-# do the same for pitchers 
-qualified_pitchers = pitcher_df_sorted[pitcher_df_sorted['is_qualified'] == True]
-try: 
-    plt.scatter(qualified_pitchers['elo+_era'], qualified_pitchers['ERA-'])
-    plt.xlabel("ELO+_ERA-")
-    plt.ylabel("ERA-")
-    plt.title("ERA- by ELO+_ERA- for Qualified Pitchers")
-    plt.show()
-
-    # save figure
-    plt.savefig("era_minus_by_elo_plus_era_minus.png")
-except: 
-    print("Couldn't plot pitchers")
-
-#plot where I can scroll over names
-try: 
-    fig = px.scatter(
-        qualified_batters,
-        x='elo+_wrc',
-        y='WRC+',
-        hover_name='MLBNAME',
-        hover_data=['player_id','elo','elo+','TEAM'],
-        title='WRC+ by ELO+_WRC+ for Qualified Hitters',
-        labels={'elo+_wrc':'ELO+_WRC+','WRC+':'WRC+'}
-    )
-    fig.update_traces(marker=dict(size=8, opacity=0.85))
-    fig.show()
-
-    # save figure
-    fig.write_image("wrc_plus_by_elo_plus_wrc_plus.png")
-except: 
-    print("Couldn't plot hitters scrollable")
-
-try: 
-    fig = px.scatter(
-        qualified_pitchers,
-        x='elo+_era',
-        y='ERA-',
-        hover_name='MLBNAME',
-        hover_data=['player_id','elo','elo+','TEAM'],
-        title='ERA- by ELO+_ERA- for Qualified Pitchers',
-        labels={'elo+_era':'ELO+_ERA-','ERA-':'ERA-'}
-    )
-    fig.update_traces(marker=dict(size=8, opacity=0.85))
-    fig.show()
-
-    # save figure
-    fig.write_image("era_minus_by_elo_plus_era_minus.png")
-except: 
-    print("Couldn't plot pitchers scrollable")
-
-# write.csv 
-batter_df_sorted.to_csv('improved_batter_elo_ratings_park_factored.csv', index=False)
-pitcher_df_sorted.to_csv('improved_pitcher_elo_ratings_park_factored.csv', index=False)
-# NEXT THINGS TO TRY: 
+        print("WARNING, NEGATIVE BATTER ELO")
+    if pitcher_elo_min >= 0:
+        pitcher_elo_min = 0
+    else:
+        print("WARNING, NEGATIVE PITCHER ELO")
+
+    #elo_adjusted column to eliminate negatives
+    batter_df['elo_adjusted'] = batter_df['elo'] + abs(batter_elo_min)
+    pitcher_df['elo_adjusted'] = pitcher_df['elo'] + abs(pitcher_elo_min)
+
+    #weighted averages for batter and pitcher elos:
+    average_batter_elo = (batter_df['elo_adjusted'] * batter_df['count']).sum() / batter_df['count'].sum()
+    average_pitcher_elo = (pitcher_df['elo_adjusted'] * pitcher_df['count']).sum() / pitcher_df['count'].sum()
+
+    batter_df['elo+'] = (batter_df['elo_adjusted'] / average_batter_elo) * 100
+    pitcher_df['elo+'] = (pitcher_df['elo_adjusted'] / average_pitcher_elo) * 100
+
+    #make the worst zero
+    batter_df['elo_adjusted2'] = batter_df['elo'] - batter_df['elo'].min()
+    pitcher_df['elo_adjusted2'] = pitcher_df['elo'] - pitcher_df['elo'].min()
+
+    #now calculate the weighted averages
+    batter_adjusted2_mean = (batter_df['elo_adjusted2'] * batter_df['count']).sum() / batter_df['count'].sum()
+    pitcher_adjusted2_mean = (pitcher_df['elo_adjusted2'] * pitcher_df['count']).sum() / pitcher_df['count'].sum()
+
+    #elo+2
+    batter_df['elo+2'] = (batter_df['elo_adjusted2'] / batter_adjusted2_mean) * 100
+    pitcher_df['elo+2'] = (pitcher_df['elo_adjusted2'] / pitcher_adjusted2_mean) * 100
+
+    # glicko-2 rating deviation on the elo+2 scale (same scaling as above, without the shift)
+    if 'rd' in batter_df.columns:
+        batter_df['elo+2_rd'] = (batter_df['rd'] / batter_adjusted2_mean) * 100
+        pitcher_df['elo+2_rd'] = (pitcher_df['rd'] / pitcher_adjusted2_mean) * 100
+
+    # elo+_wrc: the qualified elo+_wrc min and max at the wrc+ min and max
+    qualified_batters = batter_df[batter_df['is_qualified'] == True]
+    min_wrc_plus = qualified_batters['WRC+'].min()
+    max_wrc_plus = qualified_batters['WRC+'].max()
+    min_elo = qualified_batters['elo'].min()
+    max_elo = qualified_batters['elo'].max()
+
+    batter_df['elo+_wrc'] = ((batter_df['elo'] - min_elo) / (max_elo - min_elo)) * (max_wrc_plus - min_wrc_plus) + min_wrc_plus
+
+    #do the same with pitchers and era-
+    qualified_pitchers = pitcher_df[pitcher_df['is_qualified'] == True]
+    min_era = qualified_pitchers['ERA-'].min()
+    max_era = qualified_pitchers['ERA-'].max()
+    min_elo = qualified_pitchers['elo'].min()
+    max_elo = qualified_pitchers['elo'].max()
+
+    pitcher_df['elo+_era'] = ((pitcher_df['elo'] - min_elo) / (max_elo - min_elo)) * (max_era - min_era) + min_era
+
+    #sort best to worst
+    batter_df_sorted = batter_df.sort_values(by='elo', ascending=False).reset_index(drop=True)
+    pitcher_df_sorted = pitcher_df.sort_values(by='elo', ascending=False).reset_index(drop=True)
+    return batter_df_sorted, pitcher_df_sorted
+
+
+def plot(batter_df_sorted, pitcher_df_sorted, show=True):
+    # wrc+ by elo+_wrc and era- by elo+_era for qualified players, as pngs and (show=True)
+    # in windows; the plotly versions show names on hover. the libraries load here only
+    qualified_batters = batter_df_sorted[batter_df_sorted['is_qualified'] == True]
+    qualified_pitchers = pitcher_df_sorted[pitcher_df_sorted['is_qualified'] == True]
+    charts = [
+        (qualified_batters, 'elo+_wrc', 'WRC+', "ELO+_WRC+", "WRC+ by ELO+_WRC+ for Qualified Hitters",
+         "wrc_plus_by_elo_plus_wrc_plus.png"),
+        (qualified_pitchers, 'elo+_era', 'ERA-', "ELO+_ERA-", "ERA- by ELO+_ERA- for Qualified Pitchers",
+         "era_minus_by_elo_plus_era_minus.png"),
+    ]
+
+    try:
+        import matplotlib.pyplot as plt
+        for qualified, x, y, xlabel, title, path in charts:
+            plt.figure()
+            plt.scatter(qualified[x], qualified[y])
+            plt.xlabel(xlabel)
+            plt.ylabel(y)
+            plt.title(title)
+            # save before show, show() leaves an empty figure behind
+            plt.savefig(path)
+            if show:
+                plt.show()
+            plt.close()
+    except Exception as e:
+        print(f"Couldn't plot with matplotlib: {e}")
+
+    #plot where I can scroll over names
+    try:
+        import plotly.express as px
+        for qualified, x, y, xlabel, title, path in charts:
+            fig = px.scatter(
+                qualified,
+                x=x,
+                y=y,
+                hover_name='MLBNAME',
+                hover_data=['player_id', 'elo', 'elo+', 'TEAM'],
+                title=title,
+                labels={x: xlabel, y: y}
+            )
+            fig.update_traces(marker=dict(size=8, opacity=0.85))
+            if show:
+                fig.show()
+            # needs kaleido
+            fig.write_image(path)
+    except Exception as e:
+        print(f"Couldn't plot scrollable: {e}")
+
+
+def export(batter_df_sorted, pitcher_df_sorted, diagnostics=None, season=DEFAULT_SEASON, paths=None):
+    # the results csvs, the name match diagnostics and the app's tables for season.
+    # paths are the statcast csvs the season was rated from, kept for the app's what-if panel
+    batter_df_sorted.to_csv('improved_batter_elo_ratings_park_factored.csv', index=False)
+    pitcher_df_sorted.to_csv('improved_pitcher_elo_ratings_park_factored.csv', index=False)
+    if diagnostics is not None:
+        diagnostics.to_csv(DIAGNOSTICS_FILE, index=False)
+    # precomputed tables for streamlit_app.py (see app_data.py), so the app does no work per rerun
+    tables, info = build_from_files(batter_df_sorted, pitcher_df_sorted)
+    if paths is not None:
+        info = dict(info, statcast_paths=[os.path.abspath(p) for p in paths if os.path.exists(p)])
+    save_app_data(tables, info, season_dir(season))
+
+
+def run(config=None):
+    # every step in order; returns (batter_df_sorted, pitcher_df_sorted)
+    config = config or PipelineConfig()
+    report = RunReport('elo_calculations', profile=config.profile, profile_stages=config.profile_stages)
+    report.info.update(rating_mode=config.rating_mode, season=config.season, params=dict(vars(config.params)),
+                       charts=config.charts)
+
+    report.start('ingest')
+    paths = statcast_paths()
+    combined_df, plate_appearances = load_inputs(config.params, paths)
+
+    report.start('rating')
+    loop_stats = {}
+    elo_state = rate(plate_appearances, config, loop_stats)
+    report.add_counters(loop_stats)
+
+    report.start('merge')
+    batter_df, pitcher_df, diagnostics = enrich(elo_state)
+
+    report.start('normalize')
+    batter_df_sorted, pitcher_df_sorted = normalize(batter_df, pitcher_df)
+
+    # check out how this stat treats tommy pham
+    tommy_pham = batter_df_sorted[batter_df_sorted['MLBNAME'] == 'Tommy Pham']
+    if len(tommy_pham):
+        print(f"Tommy Pham's ELO+ from 2025 is: {tommy_pham['elo+'].values[0]} or {tommy_pham['elo+2'].values[0]} or {tommy_pham['elo+_wrc'].values[0]}, compared to an OPS+ of 95, and a wRC+ of 94")
+
+    if config.charts:
+        report.start('plots')
+        plot(batter_df_sorted, pitcher_df_sorted, show=config.show_charts)
+
+    report.start('export')
+    export(batter_df_sorted, pitcher_df_sorted, diagnostics, config.season, paths)
+    report.stop()
+    report.add_counters({'batters': len(batter_df_sorted), 'pitchers': len(pitcher_df_sorted)})
+    if config.report_path:
+        report.write(config.report_path)
+    print(f"Stages: {report.summary()}" + (f" ({config.report_path})" if config.report_path else ""))
+    return batter_df_sorted, pitcher_df_sorted
+
+
+# NEXT THINGS TO TRY:
 # add park factor (multiple expectation by factor/100)
 # scale ELO+ better (with wRC+) by making the best qualified and worst qualified the same as wRC+
-# download wrc+, era- merge, and plot 
+# download wrc+, era- merge, and plot
 # adjust initial conditions (k-values, starting point, dynamic starting point?
-# do one for xwoba
+# do one for xwoba (done in multi_metric.py, with binary and xslg too)
 # start initial ELO lower? higher?
 # consider glicko or glicko-2 algorithm
-# benchmark starting ELOs with career ERA, or projected ERA+ and wRC+ (Fangraphs/ZIPS) 
-
+# benchmark starting ELOs with career ERA, or projected ERA+ and wRC+ (Fangraphs/ZIPS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rate every batter and pitcher of the season and write the results")
+    parser.add_argument('--mode', choices=RATING_MODES, default='sequential')
+    parser.add_argument('--season', default=DEFAULT_SEASON, help="app_data/<season>/ gets the app's tables")
+    parser.add_argument('--prior', nargs='*', default=[], metavar='SEASON=FOLDER',
+                        help="earlier seasons to chain in, oldest first, e.g. 2023=data/2023 2024=data/2024")
+    parser.add_argument('--regression', type=float, default=DEFAULT_CHAIN.regression)
+    parser.add_argument('--decay-half-life', type=float, default=None, help="days, off by default")
+    parser.add_argument('--no-history', action='store_true', help="don't write elo_history/<season>/")
+    parser.add_argument('--headless', action='store_true', help="no charts: plotting libraries are never imported")
+    parser.add_argument('--no-show', action='store_true', help="save the chart pngs without opening windows")
+    parser.add_argument('--report', default='run_report.json')
+    parser.add_argument('--profile', choices=[m for m in PROFILE_MODES if m])
+    parser.add_argument('--profile-stage', action='append', default=None,
+                        help="stage to profile (repeatable), default rating")
+    args = parser.parse_args()
+
+    config = PipelineConfig(
+        params=EloParams(decay_half_life=args.decay_half_life),
+        rating_mode=args.mode,
+        save_rating_history=not args.no_history,
+        season=args.season,
+        prior_seasons=dict(pair.split('=', 1) for pair in args.prior),
+        chain_params=ChainParams(regression=args.regression),
+        charts=not args.headless,
+        show_charts=not args.no_show,
+        report_path=args.report,
+        profile=args.profile,
+        profile_stages=tuple(args.profile_stage or ('rating',)),
+    )
+    run(config)
 
-#adjusted elo v2
 
+if __name__ == '__main__':
+    main()
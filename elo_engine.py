@@ -0,0 +1,503 @@
+import time
+
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, replace
+
+
+# Array-backed version of the rating loop from elo_calculations.py.
+# Batters, pitchers and home teams get encoded to dense integer codes once, and the
+# sequential update then runs over plain arrays instead of doing boolean-mask .loc
+# scans over batter_df / pitcher_df / park_factors_df for every plate appearance.
+# The arithmetic is kept in exactly the same order as the original loop, so the
+# elo/count output is bit-for-bit identical.
+
+
+@dataclass(frozen=True)
+class EloParams:
+    start_elo: float = 1500.00
+    # k factor based on sample size: 30 games is considered the chess sample size,
+    # so 30*4 = 120 at bats. we do 4 for pitchers too, even though this is not accurate for SP
+    k_high: float = 40
+    k_low: float = 20
+    pa_threshold: int = 120
+    # strikeouts are worth less than a normal out
+    strikeout_value: float = -0.7
+    use_park_factor: bool = True
+    # inactivity decay: a player's distance from decay_target halves every decay_half_life
+    # days without a plate appearance (None = off). target defaults to start_elo
+    decay_half_life: float = None
+    decay_target: float = None
+
+
+DEFAULT_PARAMS = EloParams()
+
+# last_seen value of players with no plate appearance yet
+NEVER_SEEN = np.iinfo(np.int64).min
+
+# per-player strength-of-schedule sums, kept by run_elo(..., strength_of_schedule=True):
+# the opponent's pre-PA elo, its square, and the park factor of every plate appearance
+SOS_FIELDS = ('opp_elo_sum', 'opp_elo_sq_sum', 'park_factor_sum')
+
+
+def normalize_woba(woba_value, is_strikeout, strikeout_value=-0.7, bounds=None):
+    # min/max scale woba after giving strikeouts their own (negative) value.
+    # woba_value must already have its nulls filled with 0.
+    # returns (woba_norm, (woba_min, woba_max)) so the constants can be reused
+    woba = np.where(is_strikeout, strikeout_value, woba_value)
+    shifted = woba - strikeout_value
+    if bounds is None:
+        bounds = (shifted.min(), shifted.max())
+    woba_min, woba_max = bounds
+    return (shifted - woba_min) / (woba_max - woba_min), (woba_min, woba_max)
+
+
+def preprocess_plate_appearances(combined_df, strikeout_value=-0.7, bounds=None):
+    # adds binary_outcome, the strikeout-adjusted woba_value, woba_add_0.5 and woba_norm.
+    # bounds fixes the (woba_min, woba_max) scaling constants instead of using this table's
+    combined_df = combined_df.copy()
+    combined_df['woba_value'] = combined_df['woba_value'].fillna(0)
+
+    #Version 1: hit is a win, out is a loss (for the hitter) (like chess)
+    combined_df['binary_outcome'] = np.where(combined_df['woba_value'] > 0, 1, 0)
+
+    is_strikeout = (combined_df['events'] == 'strikeout').to_numpy()
+    woba_norm, _ = normalize_woba(combined_df['woba_value'].to_numpy(), is_strikeout, strikeout_value, bounds)
+    combined_df.loc[is_strikeout, 'woba_value'] = strikeout_value
+    combined_df['woba_add_0.5'] = combined_df['woba_value'] - strikeout_value
+    combined_df['woba_norm'] = woba_norm
+    return combined_df
+
+
+def expected_batter_score(batter_elo, pitcher_elo, park_factor=1.0):
+    # the expectation used by every rating path: the chess elo curve, multiplied by the
+    # park factor and clipped at 1. vectorized version of what run_elo does inline
+    # (numpy's pow can differ from python's in the last bit, so this matches to rounding)
+    expected = 1 / ((10 ** ((np.asarray(pitcher_elo) - np.asarray(batter_elo)) / 400)) + 1) * park_factor
+    return np.minimum(expected, 1)
+
+
+def elo_plus(elo, count):
+    # elo+ from elo_calculations.py: shift up only if some elo is negative, then scale
+    # so the PA-weighted average is 100
+    adjusted = elo + abs(min(elo.min(), 0))
+    return adjusted / ((adjusted * count).sum() / count.sum()) * 100
+
+
+def elo_plus2(elo, count):
+    # elo+2 from elo_calculations.py: shift so the worst player is at zero, then scale
+    # so the PA-weighted average is 100
+    adjusted = elo - elo.min()
+    return adjusted / ((adjusted * count).sum() / count.sum()) * 100
+
+
+@dataclass
+class PlateAppearances:
+    # chronologically sorted plate appearances, one array entry per PA
+    batter: np.ndarray            # int32 codes into batter_ids
+    pitcher: np.ndarray           # int32 codes into pitcher_ids
+    home: np.ndarray              # int32 codes into teams
+    woba_norm: np.ndarray
+    game_date: np.ndarray         # datetime64[D]
+    at_bat_number: np.ndarray
+    batter_ids: np.ndarray
+    pitcher_ids: np.ndarray
+    teams: np.ndarray
+    team_park_factor: np.ndarray  # park factor / 100, indexed by team code
+
+    def __len__(self):
+        return len(self.batter)
+
+    @property
+    def park_factor(self):
+        return self.team_park_factor[self.home]
+
+
+def encode_plate_appearances(combined_df, park_factors_df):
+    # combined_df must already be sorted and preprocessed (see preprocess_plate_appearances).
+    # park_factors_df['Park Factor'] is expected to be divided by 100 already.
+    # codes follow order of first appearance, same as .unique() in the original script
+    batter, batter_ids = pd.factorize(combined_df['batter'])
+    pitcher, pitcher_ids = pd.factorize(combined_df['pitcher'])
+    home, teams = pd.factorize(combined_df['home_team'])
+
+    park = park_factors_df.drop_duplicates('Team').set_index('Team')['Park Factor']
+    missing = sorted(set(teams) - set(park.index))
+    if missing:
+        raise KeyError(f"No park factor for home team(s): {missing}")
+
+    return PlateAppearances(
+        batter=batter.astype(np.int32),
+        pitcher=pitcher.astype(np.int32),
+        home=home.astype(np.int32),
+        woba_norm=combined_df['woba_norm'].to_numpy(dtype=np.float64),
+        game_date=pd.to_datetime(combined_df['game_date']).to_numpy().astype('datetime64[D]'),
+        at_bat_number=combined_df['at_bat_number'].to_numpy(dtype=np.int32),
+        batter_ids=np.asarray(batter_ids),
+        pitcher_ids=np.asarray(pitcher_ids),
+        teams=np.asarray(teams, dtype=object),
+        team_park_factor=park.reindex(teams).to_numpy(dtype=np.float64),
+    )
+
+
+@dataclass
+class EloState:
+    batter_ids: np.ndarray
+    batter_elo: np.ndarray
+    batter_count: np.ndarray
+    pitcher_ids: np.ndarray
+    pitcher_elo: np.ndarray
+    pitcher_count: np.ndarray
+    clipped: int = 0  # expectations that had to be clipped at 1
+    # day number (days since 1970-01-01) of each player's last PA, NEVER_SEEN if none.
+    # None when the plate appearances carried no dates
+    batter_last_seen: np.ndarray = None
+    pitcher_last_seen: np.ndarray = None
+    # strength-of-schedule sums (see SOS_FIELDS), None unless they were tracked
+    batter_opp_elo_sum: np.ndarray = None
+    batter_opp_elo_sq_sum: np.ndarray = None
+    batter_park_factor_sum: np.ndarray = None
+    pitcher_opp_elo_sum: np.ndarray = None
+    pitcher_opp_elo_sq_sum: np.ndarray = None
+    pitcher_park_factor_sum: np.ndarray = None
+    # split-context ratings and counts, (n_players, n_splits), None unless run_elo got splits
+    batter_split_elo: np.ndarray = None
+    batter_split_count: np.ndarray = None
+    pitcher_split_elo: np.ndarray = None
+    pitcher_split_count: np.ndarray = None
+
+    def _frame(self, role):
+        count = getattr(self, f'{role}_count')
+        df = pd.DataFrame({'player_id': getattr(self, f'{role}_ids'), 'elo': getattr(self, f'{role}_elo'), 'count': count})
+        if getattr(self, f'{role}_opp_elo_sum') is not None:
+            pas = np.maximum(count, 1)
+            avg_opp_elo = getattr(self, f'{role}_opp_elo_sum') / pas
+            df['avg_opp_elo'] = avg_opp_elo
+            df['opp_elo_sd'] = np.sqrt(np.maximum(getattr(self, f'{role}_opp_elo_sq_sum') / pas - avg_opp_elo ** 2, 0))
+            df['avg_park_factor'] = getattr(self, f'{role}_park_factor_sum') / pas
+        return df
+
+    # player_id, elo, count (plus avg_opp_elo, opp_elo_sd, avg_park_factor when tracked)
+    def batter_frame(self):
+        return self._frame('batter')
+
+    def pitcher_frame(self):
+        return self._frame('pitcher')
+
+
+def initial_state(pas, params=DEFAULT_PARAMS):
+    # everybody starts at the same elo, like chess
+    n_batters, n_pitchers = len(pas.batter_ids), len(pas.pitcher_ids)
+    return EloState(
+        batter_ids=pas.batter_ids.copy(),
+        batter_elo=np.full(n_batters, float(params.start_elo)),
+        batter_count=np.zeros(n_batters, dtype=np.int64),
+        pitcher_ids=pas.pitcher_ids.copy(),
+        pitcher_elo=np.full(n_pitchers, float(params.start_elo)),
+        pitcher_count=np.zeros(n_pitchers, dtype=np.int64),
+        batter_last_seen=np.full(n_batters, NEVER_SEEN, dtype=np.int64),
+        pitcher_last_seen=np.full(n_pitchers, NEVER_SEEN, dtype=np.int64),
+    )
+
+
+def state_for(pas, previous=None, params=DEFAULT_PARAMS):
+    # a state laid out in pas's player codes. players already in previous keep their
+    # elo/count, everybody else starts fresh
+    state = initial_state(pas, params)
+    if previous is None:
+        return state
+    for role in ('batter', 'pitcher'):
+        ids = getattr(state, f'{role}_ids')
+        rows = pd.Index(getattr(previous, f'{role}_ids')).get_indexer(ids)
+        known = rows >= 0
+        getattr(state, f'{role}_elo')[known] = getattr(previous, f'{role}_elo')[rows[known]]
+        getattr(state, f'{role}_count')[known] = getattr(previous, f'{role}_count')[rows[known]]
+        for field in ('last_seen',) + SOS_FIELDS:
+            old = getattr(previous, f'{role}_{field}')
+            if old is None:
+                continue
+            if getattr(state, f'{role}_{field}') is None:
+                setattr(state, f'{role}_{field}', np.zeros(len(ids), dtype=old.dtype))
+            getattr(state, f'{role}_{field}')[known] = old[rows[known]]
+    state.clipped = previous.clipped
+    return state
+
+
+def merge_states(previous, update):
+    # previous with update's players written over it; players new in update get appended
+    merged = {}
+    for role in ('batter', 'pitcher'):
+        old_ids = getattr(previous, f'{role}_ids')
+        new_ids = getattr(update, f'{role}_ids')
+        rows = pd.Index(old_ids).get_indexer(new_ids)
+        added = rows < 0
+        ids = np.concatenate([old_ids, new_ids[added]])
+        rows[added] = np.arange(len(old_ids), len(ids))
+        for field in ('elo', 'count', 'last_seen') + SOS_FIELDS:
+            old = getattr(previous, f'{role}_{field}')
+            new = getattr(update, f'{role}_{field}')
+            if old is None or new is None:
+                continue
+            values = np.concatenate([old, np.zeros(added.sum(), dtype=old.dtype)])
+            values[rows] = new
+            merged[f'{role}_{field}'] = values
+        merged[f'{role}_ids'] = ids
+    return EloState(clipped=update.clipped, **merged)
+
+
+def run_elo(pas, params=DEFAULT_PARAMS, state=None, woba_norm=None, progress=False, history=None,
+            strength_of_schedule=False, stats=None, splits=None):
+    # applies every plate appearance in order and returns the final EloState.
+    # state (if given) must use the same player codes as pas and is not modified.
+    # woba_norm overrides pas.woba_norm (e.g. a different strikeout penalty).
+    # history (a RatingHistory from rating_history.py, sized len(pas)) gets the
+    # pre- and post-PA rating of both players for every plate appearance.
+    # with params.decay_half_life set, ratings decay lazily (see decay_ratings).
+    # strength_of_schedule=True adds the SOS_FIELDS sums to the returned state.
+    # progress: True for a throttled progress bar, or a ProgressBar (see instrumentation.py).
+    # stats (a dict) gets the loop counters added to it, see _loop_stats
+    # splits=(batter_splits, pitcher_splits, n_splits) also rates every player per split
+    # context: the (n_pa x families) arrays give each PA's split column per family, -1 for
+    # none (see splits.split_codes). the state gets {role}_split_elo/_split_count
+    if state is None:
+        state = initial_state(pas, params)
+    if woba_norm is None:
+        woba_norm = pas.woba_norm
+
+    # python lists beat numpy scalar indexing by a wide margin inside a sequential loop
+    batter_elo = state.batter_elo.tolist()
+    batter_count = state.batter_count.tolist()
+    pitcher_elo = state.pitcher_elo.tolist()
+    pitcher_count = state.pitcher_count.tolist()
+
+    batters = pas.batter.tolist()
+    pitchers = pas.pitcher.tolist()
+    park_factors = pas.park_factor.tolist() if params.use_park_factor else [1.0] * len(pas)
+    outcomes = np.asarray(woba_norm, dtype=np.float64).tolist()
+
+    k_high, k_low, threshold = params.k_high, params.k_low, params.pa_threshold
+    clipped = state.clipped
+    n = len(pas)
+
+    # lazy inactivity decay: a player is only pulled toward the target when they show up
+    # again, by the days since their last PA, so the cost stays O(PAs) and not O(players x days)
+    decay = params.decay_half_life is not None
+    if decay:
+        if pas.game_date is None:
+            raise ValueError("decay_half_life needs plate appearances with game dates")
+        target, half_life = _decay_target(params), float(params.decay_half_life)
+        days = np.asarray(pas.game_date, dtype='datetime64[D]').astype(np.int64).tolist()
+        batter_seen = _last_seen(state, 'batter').tolist()
+        pitcher_seen = _last_seen(state, 'pitcher').tolist()
+
+    # opponent pre-PA elo sums, continuing from the state's if it has them
+    sos = strength_of_schedule
+    if sos:
+        batter_opp, batter_opp_sq, pitcher_opp, pitcher_opp_sq = (
+            _sos_sums(state, role, field).tolist() for role in ('batter', 'pitcher') for field in SOS_FIELDS[:2])
+
+    # a split rating is judged against the opponent's overall pre-PA rating, with the k
+    # factor of its own count. it continues from the state's split ratings if it has them
+    split = splits is not None
+    if split:
+        batter_splits, pitcher_splits, n_splits = splits
+        batter_columns = [[c for c in row if c >= 0] for row in np.asarray(batter_splits).tolist()]
+        pitcher_columns = [[c for c in row if c >= 0] for row in np.asarray(pitcher_splits).tolist()]
+        batter_split_elo, batter_split_count, pitcher_split_elo, pitcher_split_count = (
+            _split_ratings(state, role, field, n_splits, params).tolist()
+            for role in ('batter', 'pitcher') for field in ('elo', 'count'))
+
+    # memoryviews make the per-PA writes into the float32 history arrays cheap
+    record = history is not None
+    if record:
+        batter_pre, batter_post, pitcher_pre, pitcher_post = (
+            memoryview(a) for a in (history.batter_pre, history.batter_post, history.pitcher_pre, history.pitcher_post))
+
+    # progress gets drawn between segments so the hot loop stays free of checks
+    if progress:
+        if progress is True:
+            from instrumentation import ProgressBar
+            progress = ProgressBar(n, 'rating')
+        stops = sorted({-(-n * t // 100) for t in range(1, 101)} - {0})
+    else:
+        stops = [n]
+    loop_start = time.perf_counter()
+    start = 0
+    for stop in stops:
+        for i, batter, pitcher, park_factor, outcome in zip(range(start, stop), batters[start:stop], pitchers[start:stop],
+                                                           park_factors[start:stop], outcomes[start:stop]):
+            b_elo = batter_elo[batter]
+            p_elo = pitcher_elo[pitcher]
+            b_k = k_high if batter_count[batter] <= threshold else k_low
+            p_k = k_high if pitcher_count[pitcher] <= threshold else k_low
+
+            if decay:
+                day = days[i]
+                seen = batter_seen[batter]
+                if seen != NEVER_SEEN and day > seen:
+                    b_elo = target + (b_elo - target) * 0.5 ** ((day - seen) / half_life)
+                batter_seen[batter] = day
+                seen = pitcher_seen[pitcher]
+                if seen != NEVER_SEEN and day > seen:
+                    p_elo = target + (p_elo - target) * 0.5 ** ((day - seen) / half_life)
+                pitcher_seen[pitcher] = day
+
+            # adjust expectation by park factor, clipping at 1
+            expected_batter = 1 / ((10 ** ((p_elo - b_elo) / 400)) + 1) * park_factor
+            if expected_batter > 1:
+                expected_batter = 1
+                clipped += 1
+            expected_pitcher = 1 - expected_batter
+
+            batter_elo[batter] = b_elo + b_k * (outcome - expected_batter)
+            pitcher_elo[pitcher] = p_elo + p_k * ((1 - outcome) - expected_pitcher)
+            batter_count[batter] += 1
+            pitcher_count[pitcher] += 1
+
+            if split:
+                split_elo = batter_split_elo[batter]
+                split_count = batter_split_count[batter]
+                for c in batter_columns[i]:
+                    s_elo = split_elo[c]
+                    k = k_high if split_count[c] <= threshold else k_low
+                    expected = 1 / ((10 ** ((p_elo - s_elo) / 400)) + 1) * park_factor
+                    if expected > 1:
+                        expected = 1
+                    split_elo[c] = s_elo + k * (outcome - expected)
+                    split_count[c] += 1
+                split_elo = pitcher_split_elo[pitcher]
+                split_count = pitcher_split_count[pitcher]
+                for c in pitcher_columns[i]:
+                    s_elo = split_elo[c]
+                    k = k_high if split_count[c] <= threshold else k_low
+                    expected = 1 / ((10 ** ((s_elo - b_elo) / 400)) + 1) * park_factor
+                    if expected > 1:
+                        expected = 1
+                    split_elo[c] = s_elo + k * ((1 - outcome) - (1 - expected))
+                    split_count[c] += 1
+
+            if sos:
+                batter_opp[batter] += p_elo
+                batter_opp_sq[batter] += p_elo * p_elo
+                pitcher_opp[pitcher] += b_elo
+                pitcher_opp_sq[pitcher] += b_elo * b_elo
+
+            if record:
+                batter_pre[i] = b_elo
+                batter_post[i] = batter_elo[batter]
+                pitcher_pre[i] = p_elo
+                pitcher_post[i] = pitcher_elo[pitcher]
+        if progress:
+            progress.update(stop)
+        start = stop
+    loop_seconds = time.perf_counter() - loop_start
+    if progress:
+        progress.close()
+
+    if decay:
+        batter_seen = np.array(batter_seen, dtype=np.int64)
+        pitcher_seen = np.array(pitcher_seen, dtype=np.int64)
+    elif pas.game_date is not None:
+        days = np.asarray(pas.game_date, dtype='datetime64[D]').astype(np.int64)
+        batter_seen = _last_seen(state, 'batter')
+        pitcher_seen = _last_seen(state, 'pitcher')
+        np.maximum.at(batter_seen, np.asarray(pas.batter), days)
+        np.maximum.at(pitcher_seen, np.asarray(pas.pitcher), days)
+    else:
+        batter_seen = pitcher_seen = None
+
+    sums = {}
+    if sos:
+        # the park factor faced does not depend on the ratings, so it is summed outside the loop
+        park_factor = np.asarray(pas.park_factor, dtype=np.float64)
+        for role, codes, opp, opp_sq in (('batter', pas.batter, batter_opp, batter_opp_sq),
+                                         ('pitcher', pas.pitcher, pitcher_opp, pitcher_opp_sq)):
+            park_sum = _sos_sums(state, role, 'park_factor_sum')
+            park_sum += np.bincount(codes, weights=park_factor, minlength=len(park_sum))
+            sums[f'{role}_opp_elo_sum'] = np.array(opp, dtype=np.float64)
+            sums[f'{role}_opp_elo_sq_sum'] = np.array(opp_sq, dtype=np.float64)
+            sums[f'{role}_park_factor_sum'] = park_sum
+    if split:
+        for role, elo, count in (('batter', batter_split_elo, batter_split_count),
+                                 ('pitcher', pitcher_split_elo, pitcher_split_count)):
+            sums[f'{role}_split_elo'] = np.array(elo, dtype=np.float64).reshape(-1, n_splits)
+            sums[f'{role}_split_count'] = np.array(count, dtype=np.int64).reshape(-1, n_splits)
+
+    final = EloState(
+        batter_ids=state.batter_ids,
+        batter_elo=np.array(batter_elo, dtype=np.float64),
+        batter_count=np.array(batter_count, dtype=np.int64),
+        pitcher_ids=state.pitcher_ids,
+        pitcher_elo=np.array(pitcher_elo, dtype=np.float64),
+        pitcher_count=np.array(pitcher_count, dtype=np.int64),
+        clipped=clipped,
+        batter_last_seen=batter_seen,
+        pitcher_last_seen=pitcher_seen,
+        **sums,
+    )
+    if stats is not None:
+        for key, value in _loop_stats(state, final, params, n, loop_seconds).items():
+            stats[key] = stats.get(key, 0) + value
+    return final
+
+
+def _loop_stats(start, final, params, n, loop_seconds):
+    # counters of one run_elo call, worked out from the start and final counts instead of
+    # being counted in the loop: a player's PA number k (0-based) ran at k_high while
+    # k <= pa_threshold, and the player switched to k_low if they crossed it in this run
+    stats = {'plate_appearances': n, 'loop_seconds': loop_seconds, 'clipped': final.clipped - start.clipped}
+    threshold = params.pa_threshold
+    for role in ('batter', 'pitcher'):
+        before = getattr(start, f'{role}_count')
+        after = getattr(final, f'{role}_count')
+        stats[f'{role}_k_switches'] = int(((before <= threshold) & (after > threshold)).sum())
+        stats[f'{role}_k_high_pas'] = int(np.clip(np.minimum(after, threshold + 1) - before, 0, None).sum())
+    return stats
+
+
+def _sos_sums(state, role, field):
+    # copy of one of the state's strength-of-schedule sums, zeros if it has none
+    values = getattr(state, f'{role}_{field}')
+    if values is None:
+        return np.zeros(len(getattr(state, f'{role}_ids')))
+    return np.array(values, dtype=np.float64)
+
+
+def _split_ratings(state, role, field, n_splits, params):
+    # copy of the state's split elo or count, fresh (start_elo / 0) if it has none
+    values = getattr(state, f'{role}_split_{field}')
+    if values is None:
+        shape = (len(getattr(state, f'{role}_ids')), n_splits)
+        return np.full(shape, float(params.start_elo)) if field == 'elo' else np.zeros(shape, dtype=np.int64)
+    return np.array(values)
+
+
+def _decay_target(params):
+    return float(params.start_elo if params.decay_target is None else params.decay_target)
+
+
+def _last_seen(state, role):
+    # copy of the state's last_seen days, all NEVER_SEEN if it has none
+    last_seen = getattr(state, f'{role}_last_seen')
+    if last_seen is None:
+        return np.full(len(getattr(state, f'{role}_ids')), NEVER_SEEN, dtype=np.int64)
+    return np.array(last_seen, dtype=np.int64)
+
+
+def decay_ratings(state, as_of, params=DEFAULT_PARAMS):
+    # materializes the lazy decay: every player's rating as of the date as_of. last_seen
+    # moves up to as_of, so the returned state can keep being updated without decaying twice
+    if params.decay_half_life is None:
+        return state
+    day = np.datetime64(as_of, 'D').astype(np.int64)
+    target = _decay_target(params)
+    decayed = {}
+    for role in ('batter', 'pitcher'):
+        elo = getattr(state, f'{role}_elo').astype(np.float64)
+        last_seen = _last_seen(state, role)
+        idle = (last_seen != NEVER_SEEN) & (last_seen < day)
+        elo[idle] = target + (elo[idle] - target) * 0.5 ** ((day - last_seen[idle]) / params.decay_half_life)
+        last_seen[idle] = day
+        decayed[f'{role}_elo'] = elo
+        decayed[f'{role}_last_seen'] = last_seen
+    return replace(state, **decayed)
@@ -0,0 +1,166 @@
+import math
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from rating_periods import day_boundaries
+
+
+# Glicko-2 (http://www.glicko.net/glicko/glicko2.pdf) for batters and pitchers.
+# Every game_date is one rating period. All plate appearances of a day are scored
+# at once with NumPy, and the iterative volatility solve (Illinois algorithm) runs
+# vectorized across every player who appeared that day. Outcomes are the same
+# woba_norm values as the ELO path, and the batter's expectation is multiplied by
+# the park factor and clipped the same way. The rating deviation (RD) takes over
+# what the 40/20 K factor switch at 120 PAs was approximating: new and idle players
+# have a large RD and move quickly, established ones settle down.
+
+# converts between the 1500-centered rating scale and the Glicko-2 internal scale
+SCALE = 400 / math.log(10)
+# keep park-adjusted expectations strictly inside (0, 1), v would blow up otherwise
+EXPECTATION_EPS = 1e-6
+
+
+@dataclass(frozen=True)
+class Glicko2Params:
+    start_rating: float = 1500.0
+    start_rd: float = 350.0
+    start_volatility: float = 0.06
+    # system constant, smaller values keep volatility from moving much
+    tau: float = 0.5
+    use_park_factor: bool = True
+    tolerance: float = 1e-6
+
+
+@dataclass
+class Glicko2State:
+    batter_ids: np.ndarray
+    batter_rating: np.ndarray
+    batter_rd: np.ndarray
+    batter_volatility: np.ndarray
+    batter_count: np.ndarray
+    pitcher_ids: np.ndarray
+    pitcher_rating: np.ndarray
+    pitcher_rd: np.ndarray
+    pitcher_volatility: np.ndarray
+    pitcher_count: np.ndarray
+    clipped: int = 0
+
+    # same columns as EloState frames (rating goes in 'elo'), plus rd and volatility
+    def batter_frame(self):
+        return pd.DataFrame({'player_id': self.batter_ids, 'elo': self.batter_rating, 'count': self.batter_count,
+                             'rd': self.batter_rd, 'volatility': self.batter_volatility})
+
+    def pitcher_frame(self):
+        return pd.DataFrame({'player_id': self.pitcher_ids, 'elo': self.pitcher_rating, 'count': self.pitcher_count,
+                             'rd': self.pitcher_rd, 'volatility': self.pitcher_volatility})
+
+
+def _g(phi):
+    return 1 / np.sqrt(1 + 3 * phi ** 2 / math.pi ** 2)
+
+
+def _solve_volatility(sigma, phi, v, delta, tau, tolerance):
+    # step 5 of the glicko-2 paper for every active player at once
+    a = np.log(sigma ** 2)
+    phi2 = phi ** 2
+
+    def f(x):
+        ex = np.exp(x)
+        return ex * (delta ** 2 - phi2 - v - ex) / (2 * (phi2 + v + ex) ** 2) - (x - a) / tau ** 2
+
+    A = a.copy()
+    big = delta ** 2 > phi2 + v
+    B = np.where(big, np.log(np.where(big, delta ** 2 - phi2 - v, 1)), a - tau)
+    # bracket: step B down by tau until f(B) >= 0
+    need = ~big & (f(B) < 0)
+    while need.any():
+        B[need] -= tau
+        need[need] = f(B[need]) < 0
+
+    fA, fB = f(A), f(B)
+    active = np.abs(B - A) > tolerance
+    for _ in range(100):
+        if not active.any():
+            break
+        C = A + (A - B) * fA / (fB - fA)
+        fC = f(C)
+        swap = active & (fC * fB <= 0)
+        halve = active & ~swap
+        A = np.where(swap, B, A)
+        fA = np.where(swap, fB, np.where(halve, fA / 2, fA))
+        B = np.where(active, C, B)
+        fB = np.where(active, fC, fB)
+        active &= np.abs(B - A) > tolerance
+    return np.exp(A / 2)
+
+
+def _rate_side(players, n_players, mu, phi, sigma, g_opponent, expected, score, params):
+    # glicko-2 steps 3-7 for one side (batters or pitchers) over one rating period.
+    # mu/phi/sigma are updated in place; players idle in the period only gain deviation
+    v_inv = np.bincount(players, weights=g_opponent ** 2 * expected * (1 - expected), minlength=n_players)
+    improvement = np.bincount(players, weights=g_opponent * (score - expected), minlength=n_players)
+    active = v_inv > 0
+
+    v = 1 / v_inv[active]
+    delta = v * improvement[active]
+    new_sigma = _solve_volatility(sigma[active], phi[active], v, delta, params.tau, params.tolerance)
+    phi_star = np.sqrt(phi[active] ** 2 + new_sigma ** 2)
+    new_phi = 1 / np.sqrt(1 / phi_star ** 2 + 1 / v)
+
+    idle = ~active
+    phi[idle] = np.minimum(np.sqrt(phi[idle] ** 2 + sigma[idle] ** 2), params.start_rd / SCALE)
+    mu[active] += new_phi ** 2 * improvement[active]
+    phi[active] = new_phi
+    sigma[active] = new_sigma
+
+
+def run_glicko2(pas, params=Glicko2Params(), woba_norm=None):
+    # returns the final Glicko2State, one rating period per game_date
+    if woba_norm is None:
+        woba_norm = pas.woba_norm
+    woba_norm = np.asarray(woba_norm, dtype=np.float64)
+    batters = np.asarray(pas.batter)
+    pitchers = np.asarray(pas.pitcher)
+    park_factors = pas.park_factor if params.use_park_factor else np.ones(len(pas))
+    n_batters, n_pitchers = len(pas.batter_ids), len(pas.pitcher_ids)
+
+    # internal glicko-2 scale
+    b_mu = np.zeros(n_batters)
+    b_phi = np.full(n_batters, params.start_rd / SCALE)
+    b_sigma = np.full(n_batters, params.start_volatility)
+    p_mu = np.zeros(n_pitchers)
+    p_phi = np.full(n_pitchers, params.start_rd / SCALE)
+    p_sigma = np.full(n_pitchers, params.start_volatility)
+    clipped = 0
+
+    starts, stops = day_boundaries(np.asarray(pas.game_date))
+    for start, stop in zip(starts, stops):
+        b = batters[start:stop]
+        p = pitchers[start:stop]
+        score = woba_norm[start:stop]
+        park_factor = park_factors[start:stop]
+        diff = b_mu[b] - p_mu[p]
+
+        # each side's expectation uses the other side's deviation, park factor on the batter's side
+        g_pitcher = _g(p_phi[p])
+        expected_batter = park_factor / (1 + np.exp(-g_pitcher * diff))
+        g_batter = _g(b_phi[b])
+        expected_pitcher = 1 - park_factor / (1 + np.exp(-g_batter * diff))
+        clipped += int((expected_batter > 1).sum())
+        expected_batter = np.clip(expected_batter, EXPECTATION_EPS, 1 - EXPECTATION_EPS)
+        expected_pitcher = np.clip(expected_pitcher, EXPECTATION_EPS, 1 - EXPECTATION_EPS)
+
+        _rate_side(b, n_batters, b_mu, b_phi, b_sigma, g_pitcher, expected_batter, score, params)
+        _rate_side(p, n_pitchers, p_mu, p_phi, p_sigma, g_batter, expected_pitcher, 1 - score, params)
+
+    return Glicko2State(
+        batter_ids=pas.batter_ids, batter_rating=b_mu * SCALE + params.start_rating,
+        batter_rd=b_phi * SCALE, batter_volatility=b_sigma,
+        batter_count=np.bincount(batters, minlength=n_batters),
+        pitcher_ids=pas.pitcher_ids, pitcher_rating=p_mu * SCALE + params.start_rating,
+        pitcher_rd=p_phi * SCALE, pitcher_volatility=p_sigma,
+        pitcher_count=np.bincount(pitchers, minlength=n_pitchers),
+        clipped=clipped,
+    )
@@ -0,0 +1,239 @@
+import argparse
+import glob
+import json
+import os
+import time
+from dataclasses import asdict
+
+import numpy as np
+import pandas as pd
+
+from elo_engine import SOS_FIELDS, EloParams, EloState, encode_plate_appearances, merge_states, \
+    preprocess_plate_appearances, run_elo, state_for
+from ingest import PA_COLUMNS, ingest_statcast, print_ingest_report, read_park_factors, statcast_paths
+
+
+# Checkpointed in-season updates. A checkpoint holds the rating state (elo and count
+# for every batter and pitcher), the watermark, the woba min/max scaling constants and
+# the parameters. An update reads only the newly delivered statcast files, applies the
+# plate appearances after the watermark on top of the saved state and writes a new
+# checkpoint, so a day of data costs O(new PAs) instead of a full-season rerun.
+#
+# The watermark is the last game_date applied plus the (game_pk, at_bat_number) of every
+# PA applied on that date: at_bat_number restarts in every game, so a game of the same
+# day that shows up later still gets applied. Days before the watermark's are closed.
+
+CHECKPOINT = 'elo_checkpoint.npz'
+# game_pk is kept for the watermark's per-game keys
+COLUMNS = PA_COLUMNS + ['game_pk']
+# EloState arrays that are only saved when present
+OPTIONAL_ARRAYS = [f'{role}_{field}' for role in ('batter', 'pitcher') for field in ('last_seen',) + SOS_FIELDS]
+
+
+def save_checkpoint(path, state, watermark, woba_bounds, params, processed_files=(), failed_files=None):
+    # failed_files: {path: [size, mtime_ns]} of files that could not be read, see watch
+    meta = {
+        'watermark': watermark,
+        'woba_bounds': [float(b) for b in woba_bounds],
+        'params': asdict(params),
+        'processed_files': sorted(processed_files),
+        'failed_files': failed_files or {},
+        'clipped': int(state.clipped),
+        'saved': time.time(),
+    }
+    # write next to the target and rename, so a crash never leaves a half-written checkpoint
+    tmp = f'{path}.tmp.npz'
+    # last_seen days (for the inactivity decay) and strength-of-schedule sums, when the state has them
+    optional = {name: getattr(state, name) for name in OPTIONAL_ARRAYS if getattr(state, name) is not None}
+    np.savez(tmp, batter_ids=state.batter_ids, batter_elo=state.batter_elo, batter_count=state.batter_count,
+             pitcher_ids=state.pitcher_ids, pitcher_elo=state.pitcher_elo, pitcher_count=state.pitcher_count,
+             meta=np.array(json.dumps(meta)), **optional)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path):
+    # returns (state, meta); meta['params'] is turned back into EloParams
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data['meta']))
+        state = EloState(batter_ids=data['batter_ids'], batter_elo=data['batter_elo'],
+                         batter_count=data['batter_count'], pitcher_ids=data['pitcher_ids'],
+                         pitcher_elo=data['pitcher_elo'], pitcher_count=data['pitcher_count'],
+                         clipped=meta['clipped'],
+                         **{name: data[name] for name in OPTIONAL_ARRAYS if name in data.files})
+    meta['params'] = EloParams(**meta['params'])
+    meta.setdefault('failed_files', {})
+    # checkpoints from before the per-game keys held [game_date, at_bat_number]
+    if isinstance(meta['watermark'], list):
+        meta['watermark'] = {'date': meta['watermark'][0], 'at_bat_number': meta['watermark'][1]}
+    return state, meta
+
+
+def _pa_keys(combined_df):
+    # (game_pk, at_bat_number) per row, game_pk -1 where it is missing
+    game_pk = pd.to_numeric(combined_df['game_pk'], errors='coerce').fillna(-1).astype(np.int64)
+    return list(zip(game_pk.tolist(), combined_df['at_bat_number'].astype(np.int64).tolist()))
+
+
+def after_watermark(combined_df, watermark):
+    # plate appearances not applied yet: every day after the watermark's, plus the PAs of
+    # that day whose (game_pk, at_bat_number) was not applied
+    if watermark is None:
+        return combined_df
+    date = pd.Timestamp(watermark['date'])
+    dates = pd.to_datetime(combined_df['game_date']).to_numpy()
+    keep = dates > date.to_datetime64()
+    same_day = dates == date.to_datetime64()
+    if 'applied' in watermark:
+        applied = {tuple(key) for key in watermark['applied']}
+        keys = _pa_keys(combined_df[same_day])
+        keep[np.flatnonzero(same_day)] = [key not in applied for key in keys]
+    else:
+        keep |= same_day & (combined_df['at_bat_number'] > watermark['at_bat_number']).to_numpy()
+    late = int((dates < date.to_datetime64()).sum())
+    if late:
+        print(f"WARNING: ignoring {late} plate appearances dated before {watermark['date']}, "
+              f"days before the watermark are closed (rebuild the checkpoint to include them)")
+    return combined_df[keep].reset_index(drop=True)
+
+
+def _watermark(combined_df, previous=None):
+    # the last day in combined_df (the PAs just applied, in order), with its applied keys
+    if len(combined_df) == 0:
+        return previous
+    dates = pd.to_datetime(combined_df['game_date'])
+    last = dates.iloc[-1]
+    applied = _pa_keys(combined_df[(dates == last).to_numpy()])
+    date = last.strftime('%Y-%m-%d')
+    if previous is not None and previous['date'] == date:
+        applied = [tuple(key) for key in previous.get('applied', [])] + applied
+    return {'date': date, 'applied': [list(key) for key in applied]}
+
+
+def build_checkpoint(paths, checkpoint=CHECKPOINT, params=EloParams(), park_factors_path='park_factors.csv'):
+    # full run over paths, saved as the starting checkpoint
+    combined_df, report = ingest_statcast(paths, columns=COLUMNS)
+    print_ingest_report(report)
+    combined_df = preprocess_plate_appearances(combined_df, strikeout_value=params.strikeout_value)
+    woba_bounds = (combined_df['woba_add_0.5'].min(), combined_df['woba_add_0.5'].max())
+    state = run_elo(encode_plate_appearances(combined_df, read_park_factors(park_factors_path)), params,
+                    strength_of_schedule=True)
+    loaded = report.loc[report['status'] == 'loaded', 'file']
+    save_checkpoint(checkpoint, state, _watermark(combined_df), woba_bounds, params,
+                    [os.path.abspath(p) for p in loaded])
+    return state
+
+
+def _fingerprint(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _unchanged(path, fingerprint):
+    try:
+        return _fingerprint(path) == fingerprint
+    except OSError:
+        return False
+
+
+def apply_update(paths, checkpoint=CHECKPOINT, out=None, park_factors_path='park_factors.csv'):
+    # applies the plate appearances in paths that come after the checkpoint's watermark.
+    # writes the new checkpoint to out (default: overwrite checkpoint) and returns (state, n_applied)
+    state, meta = load_checkpoint(checkpoint)
+    params = meta['params']
+    combined_df, report = ingest_statcast(paths, columns=COLUMNS)
+    print_ingest_report(report)
+
+    new_df = after_watermark(combined_df, meta['watermark'])
+    loaded = {os.path.abspath(p) for p in report.loc[report['status'] == 'loaded', 'file']}
+    processed = set(meta['processed_files']) | loaded
+    # files that failed to read are remembered as they were, so watch doesn't retry (and
+    # report) them on every poll; a file that gets replaced is tried again
+    failed = {p: fingerprint for p, fingerprint in meta['failed_files'].items() if p not in loaded}
+    for p in report.loc[report['status'] == 'error', 'file']:
+        if os.path.exists(p):
+            failed[os.path.abspath(p)] = _fingerprint(p)
+    if len(new_df) == 0:
+        save_checkpoint(out or checkpoint, state, meta['watermark'], meta['woba_bounds'], params, processed, failed)
+        return state, 0
+
+    # keep the season's scaling constants, so old and new woba_norm values line up
+    new_df = preprocess_plate_appearances(new_df, strikeout_value=params.strikeout_value,
+                                          bounds=tuple(meta['woba_bounds']))
+    if new_df['woba_norm'].min() < 0 or new_df['woba_norm'].max() > 1:
+        print("WARNING: new plate appearances fall outside the checkpoint's woba scaling")
+
+    pas = encode_plate_appearances(new_df, read_park_factors(park_factors_path))
+    updated = run_elo(pas, params, state=state_for(pas, state, params), strength_of_schedule=True)
+    state = merge_states(state, updated)
+    save_checkpoint(out or checkpoint, state, _watermark(new_df, meta['watermark']), meta['woba_bounds'],
+                    params, processed, failed)
+    return state, len(new_df)
+
+
+def _settled(paths, settle):
+    # the paths whose size and mtime did not change over settle seconds; a file still being
+    # written would otherwise be applied (and recorded as processed) half-read
+    def stats(paths):
+        out = {}
+        for p in paths:
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            out[p] = (st.st_size, st.st_mtime_ns)
+        return out
+    before = stats(paths)
+    if not before:
+        return []
+    time.sleep(settle)
+    after = stats(before)
+    return [p for p in before if after.get(p) == before[p]]
+
+
+def watch(directory, checkpoint=CHECKPOINT, interval=60, pattern='*.csv', once=False, settle=2.0):
+    # polls directory and applies any csv not yet recorded in the checkpoint, once it has
+    # stopped changing for settle seconds (the rest waits for the next poll). a file that
+    # failed to read is reported once and skipped until it changes
+    while True:
+        _, meta = load_checkpoint(checkpoint)
+        seen = set(meta['processed_files'])
+        failed = meta['failed_files']
+        new_files = _settled(sorted(p for p in glob.glob(os.path.join(directory, pattern))
+                                    if os.path.abspath(p) not in seen
+                                    and not _unchanged(os.path.abspath(p), failed.get(os.path.abspath(p)))),
+                             settle)
+        if new_files:
+            _, applied = apply_update(new_files, checkpoint)
+            print(f"Applied {applied} new plate appearances from {len(new_files)} file(s)")
+        if once:
+            return
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental ELO updates from a checkpoint")
+    parser.add_argument('--checkpoint', default=CHECKPOINT)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    init = sub.add_parser('init', help="full run over the monthly files, saved as a checkpoint")
+    init.add_argument('--data-dir', default='.')
+
+    update = sub.add_parser('update', help="apply new statcast files to the checkpoint")
+    update.add_argument('files', nargs='+')
+
+    watch_cmd = sub.add_parser('watch', help="apply csv files as they get dropped into a directory")
+    watch_cmd.add_argument('directory')
+    watch_cmd.add_argument('--interval', type=float, default=60)
+
+    args = parser.parse_args()
+    if args.command == 'init':
+        build_checkpoint(statcast_paths(args.data_dir), args.checkpoint)
+    elif args.command == 'update':
+        _, applied = apply_update(args.files, args.checkpoint)
+        print(f"Applied {applied} new plate appearances")
+    else:
+        watch(args.directory, args.checkpoint, args.interval)
+
+
+if __name__ == '__main__':
+    main()
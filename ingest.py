@@ -0,0 +1,134 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+# reading the monthly statcast csvs (march1.csv ... sep6.csv) and park factors.
+# Each file is streamed in chunks with only the columns we use, non-event rows
+# (every pitch but the last one of a plate appearance) are dropped chunk by chunk,
+# and files are read concurrently in a thread pool. Memory stays proportional to
+# the plate appearances kept, not to the ~90 pitch-level columns of the raw files.
+
+MONTHS = ['march','april','may','june','july','aug','sep']
+NUMBERS = ['1','2','3','4','5','6']
+
+# columns we keep from the raw statcast files
+PA_COLUMNS = ['game_date', 'batter','pitcher','events','estimated_ba_using_speedangle',
+              'estimated_woba_using_speedangle','woba_value','woba_denom','at_bat_number',
+              'estimated_slg_using_speedangle', 'home_team']
+
+# handedness and half inning, only read when asked for (see splits.py):
+#   ingest_statcast(paths, columns=PA_COLUMNS + SPLIT_COLUMNS)
+SPLIT_COLUMNS = ['stand', 'p_throws', 'inning_topbot']
+
+# game_pk is only read to identify a plate appearance when deduplicating
+PA_KEY = ['game_pk', 'at_bat_number']
+# fallback key for files without game_pk
+PA_KEY_NO_GAME = ['game_date', 'home_team', 'at_bat_number', 'batter', 'pitcher']
+
+PA_DTYPES = {
+    'batter': 'int32',
+    'pitcher': 'int32',
+    'at_bat_number': 'int32',
+    'game_pk': 'int32',
+    'events': 'category',
+    'home_team': 'category',
+    'stand': 'category',
+    'p_throws': 'category',
+    'inning_topbot': 'category',
+    'woba_value': 'float64',
+    'woba_denom': 'float64',
+    'estimated_ba_using_speedangle': 'float64',
+    'estimated_woba_using_speedangle': 'float64',
+    'estimated_slg_using_speedangle': 'float64',
+}
+
+CHUNKSIZE = 100_000
+
+
+def statcast_paths(directory='.'):
+    # the months x numbers grid of file names, in the order they get combined
+    return [os.path.join(directory, f'{month}{number}.csv') for month in MONTHS for number in NUMBERS]
+
+
+def _read_file(path, columns, chunksize):
+    # stream one file, keeping only rows where 'events' is not null
+    wanted = set(columns) | {'game_pk'}
+    parts = []
+    with pd.read_csv(path, usecols=lambda c: c in wanted, dtype=PA_DTYPES,
+                     parse_dates=['game_date'], chunksize=chunksize) as reader:
+        for chunk in reader:
+            parts.append(chunk[chunk['events'].notna()])
+    missing = set(columns) - set(parts[0].columns) if parts else set(columns)
+    if missing:
+        raise ValueError(f"missing columns {sorted(missing)}")
+    return _concat(parts)
+
+
+def _concat(frames):
+    # pd.concat falls back to object dtype when categoricals have different categories
+    frames = [f for f in frames if len(f)] or frames[:1]
+    if len(frames) == 1:
+        return frames[0]
+    categorical = [c for c in frames[0].columns if isinstance(frames[0][c].dtype, pd.CategoricalDtype)]
+    combined = pd.concat(frames, ignore_index=True)
+    for col in categorical:
+        combined[col] = union_categoricals([f[col] for f in frames])
+    return combined
+
+
+def ingest_statcast(paths, columns=PA_COLUMNS, workers=8, chunksize=CHUNKSIZE):
+    # returns (combined_df, report). combined_df has one row per plate appearance,
+    # deduplicated on the plate appearance key and ordered chronologically
+    # (date, at_bat_number). report lists every path as loaded / missing / error
+    def load(path):
+        if not os.path.exists(path):
+            return path, None, 'missing', ''
+        try:
+            return path, _read_file(path, columns, chunksize), 'loaded', ''
+        except Exception as e:
+            return path, None, 'error', f'{type(e).__name__}: {e}'
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(load, paths))
+
+    frames = [df for _, df, status, _ in results if status == 'loaded']
+    report = pd.DataFrame([
+        {'file': path, 'status': status, 'plate_appearances': 0 if df is None else len(df), 'error': error}
+        for path, df, status, error in results
+    ])
+    if not frames:
+        return pd.DataFrame({c: pd.Series(dtype=PA_DTYPES.get(c, 'object')) for c in columns}), report
+
+    # files overlap (consecutive savant searches share days), so keep the first copy of each PA
+    combined_df = _concat(frames)
+    key = PA_KEY if 'game_pk' in combined_df.columns and combined_df['game_pk'].notna().all() else PA_KEY_NO_GAME
+    combined_df = combined_df.drop_duplicates(subset=key)
+    combined_df = combined_df[list(columns)]
+
+    combined_df = combined_df.sort_values(by=['game_date','at_bat_number'], ascending=[True, True]).reset_index(drop=True)
+    return combined_df, report
+
+
+def read_statcast_files(directory='.', paths=None, verbose=True, **kwargs):
+    # Read in all CSV files and combine into a single DataFrame of plate appearances
+    combined_df, report = ingest_statcast(statcast_paths(directory) if paths is None else paths, **kwargs)
+    if verbose:
+        print_ingest_report(report)
+    return combined_df
+
+
+def print_ingest_report(report):
+    loaded = report[report['status'] == 'loaded']
+    print(f"Loaded {len(loaded)} files ({loaded['plate_appearances'].sum()} plate appearances), "
+          f"{(report['status'] == 'missing').sum()} missing")
+    for row in report[report['status'] == 'error'].itertuples():
+        print(f"WARNING: skipped {row.file}: {row.error}")
+
+
+def read_park_factors(path='park_factors.csv'):
+    park_factors_df = pd.read_csv(path)
+    park_factors_df['Park Factor'] = park_factors_df['Park Factor'] / 100
+    return park_factors_df
@@ -0,0 +1,243 @@
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+# Run reports for the pipeline: wall and cpu time plus peak memory of every stage, the
+# counters the rating loop gathers (see run_elo(..., stats=...)), and optionally a profile
+# of the stages you ask for, written out as one json file at the end of a run.
+#
+# Peak memory is the process RSS, sampled by a background thread every sample_interval
+# seconds while a stage runs (psutil if it is installed, /proc/self/statm on linux,
+# nothing otherwise), so the stage code itself pays nothing for it. Profiling is opt-in:
+#
+#   profile='cprofile' - cProfile around the stage, the top functions go in the report and
+#                        the full stats to profile_<stage>.prof (open with snakeviz/pstats)
+#   profile='sample'   - the same sampler thread also records where the main thread is
+#                        every profile_interval; much less overhead than cProfile inside
+#                        the rating loop, but only statistically right
+#
+# ProgressBar is the throttled progress display run_elo uses instead of printing lines.
+
+PROFILE_MODES = (None, 'cprofile', 'sample')
+TOP_FUNCTIONS = 20
+
+
+def _rss_reader():
+    # () -> current RSS in bytes, or None where there is no cheap way to get it
+    try:
+        import psutil
+        process = psutil.Process()
+        return lambda: process.memory_info().rss
+    except ImportError:
+        pass
+    if os.path.exists('/proc/self/statm'):
+        page = os.sysconf('SC_PAGE_SIZE')
+
+        def read():
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * page
+        return read
+    return None
+
+
+class _Sampler(threading.Thread):
+    # peak RSS and, given target_thread, leaf/inclusive function counts of that thread's stack
+    def __init__(self, interval, read_rss, target_thread=None):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.read_rss = read_rss
+        self.target = target_thread
+        self.peak = read_rss() if read_rss else None
+        self.samples = 0
+        self.leaf = {}
+        self.inclusive = {}
+        self._stop_event = threading.Event()
+
+    def _sample_stack(self):
+        frame = sys._current_frames().get(self.target)
+        seen = set()
+        first = True
+        while frame is not None:
+            code = frame.f_code
+            name = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+            if first:
+                # f_lineno can be None while the frame is between lines
+                where = f"{name}:{frame.f_lineno}" if frame.f_lineno else name
+                self.leaf[where] = self.leaf.get(where, 0) + 1
+                first = False
+            if name not in seen:
+                seen.add(name)
+                self.inclusive[name] = self.inclusive.get(name, 0) + 1
+            frame = frame.f_back
+        self.samples += 1
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            if self.read_rss:
+                self.peak = max(self.peak, self.read_rss())
+            if self.target is not None:
+                self._sample_stack()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        if self.read_rss:
+            self.peak = max(self.peak, self.read_rss())
+
+
+def _top(counts, total, n=TOP_FUNCTIONS):
+    return [{'function': name, 'samples': k, 'share': round(k / total, 4)}
+            for name, k in sorted(counts.items(), key=lambda item: -item[1])[:n]]
+
+
+class RunReport:
+    def __init__(self, name, profile=None, profile_stages=(), sample_interval=0.05, profile_interval=0.005,
+                 profile_dir='.'):
+        # profile_stages limits profiling to those stages, empty = every stage
+        if profile not in PROFILE_MODES:
+            raise ValueError(f"profile must be one of {PROFILE_MODES}, not {profile!r}")
+        self.name = name
+        self.profile = profile
+        self.profile_stages = set(profile_stages)
+        self.sample_interval = sample_interval
+        self.profile_interval = profile_interval
+        self.profile_dir = profile_dir
+        self.stages = {}
+        self.counters = {}
+        self.info = {}
+        self.created = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        self._read_rss = _rss_reader()
+        self._start = time.perf_counter()
+        self._open = None
+
+    def _profiled(self, stage):
+        return self.profile is not None and (not self.profile_stages or stage in self.profile_stages)
+
+    @contextmanager
+    def stage(self, name):
+        # times the block; a stage entered again (e.g. once per season) adds up
+        profiled = self._profiled(name)
+        sample_stacks = profiled and self.profile == 'sample'
+        sampler = _Sampler(self.profile_interval if sample_stacks else self.sample_interval, self._read_rss,
+                           threading.get_ident() if sample_stacks else None)
+        sampler.start()
+        profiler = cProfile.Profile() if profiled and self.profile == 'cprofile' else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            sampler.stop()
+            self._record(name, wall, cpu, sampler, profiler)
+
+    def _record(self, name, wall, cpu, sampler, profiler):
+        entry = self.stages.setdefault(name, {'seconds': 0.0, 'cpu_seconds': 0.0, 'calls': 0, 'peak_rss_mb': None})
+        entry['seconds'] = round(entry['seconds'] + wall, 4)
+        entry['cpu_seconds'] = round(entry['cpu_seconds'] + cpu, 4)
+        entry['calls'] += 1
+        if sampler.peak is not None:
+            entry['peak_rss_mb'] = round(max(entry['peak_rss_mb'] or 0, sampler.peak / 2 ** 20), 1)
+        if profiler:
+            path = os.path.join(self.profile_dir, f'profile_{name}.prof')
+            profiler.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+            entry['profile'] = {'mode': 'cprofile', 'stats_file': path, 'top': out.getvalue().splitlines()}
+        elif sampler.samples:
+            entry['profile'] = {'mode': 'sample', 'interval': sampler.interval, 'samples': sampler.samples,
+                                'leaf': _top(sampler.leaf, sampler.samples),
+                                'inclusive': _top(sampler.inclusive, sampler.samples)}
+
+    # start/stop for code that runs stage after stage at the top level of a script;
+    # starting a stage stops the one before it
+    def start(self, name):
+        self.stop()
+        self._open = self.stage(name)
+        self._open.__enter__()
+
+    def stop(self):
+        if self._open is not None:
+            open_stage, self._open = self._open, None
+            open_stage.__exit__(None, None, None)
+
+    def add_counters(self, counters):
+        # sums numbers into the report's counters (run_elo stats, row counts, ...)
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def as_dict(self):
+        self.stop()
+        counters = dict(self.counters)
+        if counters.get('loop_seconds'):
+            counters['pas_per_second'] = round(counters.get('plate_appearances', 0) / counters['loop_seconds'])
+        return {
+            'name': self.name,
+            'created': self.created,
+            'seconds': round(time.perf_counter() - self._start, 4),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'info': self.info,
+            'stages': self.stages,
+            'counters': counters,
+        }
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2, default=str)
+
+    def summary(self):
+        parts = []
+        for name, entry in self.stages.items():
+            memory = f", {entry['peak_rss_mb']:.0f} MB" if entry['peak_rss_mb'] is not None else ''
+            parts.append(f"{name} {entry['seconds']:.2f}s{memory}")
+        return ', '.join(parts)
+
+
+class ProgressBar:
+    # redraws at most every interval seconds on a terminal; elsewhere (logs, notebooks)
+    # it prints a plain line at most every log_interval seconds
+    def __init__(self, total, label='', unit='PAs', interval=0.2, log_interval=10.0, stream=None, width=30):
+        self.total = total
+        self.label = label
+        self.unit = unit
+        self.stream = stream or sys.stderr
+        self.tty = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        self.interval = interval if self.tty else log_interval
+        self.width = width
+        self._start = time.perf_counter()
+        self._last = None
+
+    def update(self, done):
+        now = time.perf_counter()
+        if self._last is not None and now - self._last < self.interval and done < self.total:
+            return
+        self._last = now
+        elapsed = now - self._start
+        share = done / self.total if self.total else 1.0
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - done) / rate if rate > 0 else 0.0
+        text = f"{done:,}/{self.total:,} {self.unit} ({share:.0%}), {rate:,.0f} {self.unit}/s, {eta:.0f}s left"
+        if self.tty:
+            filled = int(self.width * share)
+            self.stream.write(f"\r{self.label} [{'#' * filled}{'.' * (self.width - filled)}] {text}")
+        else:
+            self.stream.write(f"{self.label}: {text}\n")
+        self.stream.flush()
+
+    def close(self):
+        if self.tty:
+            self.stream.write('\n')
+            self.stream.flush()
@@ -0,0 +1,108 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from app_data import DEFAULT_SEASON
+from elo_engine import DEFAULT_PARAMS, expected_batter_score
+from ingest import read_park_factors
+from rating_history import HISTORY_DIR, HistoryStore
+
+
+# As-of matchup expectations: "what was the expected outcome for batter X vs pitcher Y
+# at park Z on date D?" answered from the rating history (see rating_history.py)
+# instead of re-running the season up to D. Each player's records are already sorted
+# by date, so the history is flattened into one sorted (player, date) key per role
+# and every lookup, single or batched, is a searchsorted: O(log n) per query.
+
+# player rank goes in the high bits of the key, days since epoch in the low bits
+_DAY_BITS = 32
+_DAY_OFFSET = 1 << 31
+
+
+class MatchupIndex:
+
+    def __init__(self, season=DEFAULT_SEASON, park_factors_df=None, start_elo=DEFAULT_PARAMS.start_elo,
+                 root=HISTORY_DIR):
+        store = HistoryStore(season, root)
+        if park_factors_df is None:
+            park_factors_df = read_park_factors()
+        self.park_factors = park_factors_df.drop_duplicates('Team').set_index('Team')['Park Factor']
+        # players with no plate appearance before the date get the starting rating
+        self.start_elo = start_elo
+        self._index = {}
+        for role in ('batter', 'pitcher'):
+            ids, offsets, records = store._open(role)
+            ranks = np.repeat(np.arange(len(ids), dtype=np.int64), np.diff(offsets))
+            keys = (ranks << _DAY_BITS) | (records['game_date'].astype(np.int64) + _DAY_OFFSET)
+            self._index[role] = (np.asarray(ids), np.asarray(offsets), keys, np.asarray(records['post'], dtype=np.float64))
+
+    def rating_as_of(self, player_ids, dates, role='batter', include_day=False):
+        # rating after the player's last plate appearance before each date
+        # (or on it, with include_day=True). vectorized over player_ids/dates
+        ids, offsets, keys, post = self._index[role]
+        player_ids = np.atleast_1d(np.asarray(player_ids, dtype=np.int64))
+        days = np.atleast_1d(np.asarray(dates, dtype='datetime64[D]')).astype(np.int64)
+        days = np.broadcast_to(days, player_ids.shape)
+
+        rank = np.searchsorted(ids, player_ids)
+        known = rank < len(ids)
+        known[known] = ids[rank[known]] == player_ids[known]
+        rank = np.where(known, rank, 0)
+
+        query = (rank << _DAY_BITS) | (days + _DAY_OFFSET)
+        last = np.searchsorted(keys, query, side='right' if include_day else 'left') - 1
+        # the hit has to fall inside this player's own block of records
+        found = known & (last >= offsets[rank])
+        return np.where(found, post[np.maximum(last, 0)], self.start_elo)
+
+    def expected(self, batter_ids, pitcher_ids, parks, dates, include_day=False):
+        # batched matchups -> DataFrame with both as-of ratings, park factor and expected batter score
+        batter_ids = np.atleast_1d(np.asarray(batter_ids, dtype=np.int64))
+        parks = np.broadcast_to(np.atleast_1d(np.asarray(parks, dtype=object)), batter_ids.shape)
+        park_factor = self.park_factors.reindex(parks).to_numpy(dtype=np.float64)
+        if np.isnan(park_factor).any():
+            raise KeyError(f"No park factor for: {sorted(set(parks[np.isnan(park_factor)]))}")
+
+        batter_elo = self.rating_as_of(batter_ids, dates, 'batter', include_day)
+        pitcher_elo = self.rating_as_of(pitcher_ids, dates, 'pitcher', include_day)
+        return pd.DataFrame({
+            'batter': batter_ids,
+            'pitcher': np.broadcast_to(np.asarray(pitcher_ids, dtype=np.int64), batter_ids.shape),
+            'home_team': parks,
+            'game_date': np.broadcast_to(np.asarray(dates, dtype='datetime64[D]'), batter_ids.shape),
+            'batter_elo': batter_elo,
+            'pitcher_elo': pitcher_elo,
+            'park_factor': park_factor,
+            'expected_batter': expected_batter_score(batter_elo, pitcher_elo, park_factor),
+        })
+
+    def expected_one(self, batter_id, pitcher_id, park, date, include_day=False):
+        return float(self.expected([batter_id], [pitcher_id], [park], [date], include_day)['expected_batter'].iloc[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="As-of batter vs pitcher expectations from the rating history")
+    parser.add_argument('--batter', type=int)
+    parser.add_argument('--pitcher', type=int)
+    parser.add_argument('--park', help="home team abbreviation, as in park_factors.csv")
+    parser.add_argument('--date', help="YYYY-MM-DD, ratings as of the start of that day")
+    parser.add_argument('--matchups', help="csv with batter, pitcher, home_team, game_date columns")
+    parser.add_argument('--out', default='matchup_expectations.csv')
+    parser.add_argument('--season', default=DEFAULT_SEASON, help="whose rating history to query")
+    parser.add_argument('--history-root', default=HISTORY_DIR)
+    args = parser.parse_args()
+
+    index = MatchupIndex(args.season, root=args.history_root)
+    if args.matchups:
+        matchups = pd.read_csv(args.matchups)
+        result = index.expected(matchups['batter'], matchups['pitcher'], matchups['home_team'],
+                                pd.to_datetime(matchups['game_date']).to_numpy())
+        result.to_csv(args.out, index=False)
+        print(f"Wrote {len(result)} matchups to {args.out}")
+    else:
+        print(index.expected([args.batter], [args.pitcher], [args.park], [args.date]).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+import argparse
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from elo_engine import DEFAULT_PARAMS, EloParams, normalize_woba, run_elo
+from pa_cache import load_plate_appearances
+from player_index import attach_metadata, load_player_index
+
+
+# ELO on several outcome metrics in one pass. Every player carries one rating per
+# metric (a row of the n_players x n_metrics matrix), and each plate appearance
+# updates all of a player's tracks at once. The PA count, and so the K factor, is
+# shared by the tracks.
+#
+# A plate appearance only reads and writes its own batter's and pitcher's rows, so it
+# only has to wait for the earlier plate appearances of those two players. Each PA
+# gets a wave number, one past the later of its players' previous waves, and a wave
+# is a set of PAs with no player in common: the whole wave is updated with numpy over
+# (PAs in the wave x metrics) at once. Within a player the order is the file order,
+# so every column is the sequential run_elo, up to the last bits numpy's vectorized
+# power gives (around 1e-13 elo). A season is ~4000 waves for ~180k plate appearances,
+# which makes the four metrics together about 2x faster than four run_elo calls
+# (python multi_metric.py --benchmark).
+#
+# Metrics (all scaled to [0, 1] from the batter's side):
+#   woba   - woba_norm, as in elo_calculations.py
+#   xwoba  - estimated_woba_using_speedangle for batted balls, actual woba_value for
+#            everything else (walks, hbp, strikeouts at the strikeout value), min/max scaled
+#   binary - binary_outcome, a hit is a win and an out is a loss
+#   xslg   - estimated_slg_using_speedangle for batted balls, 0 otherwise and the
+#            strikeout value for strikeouts, min/max scaled
+
+METRICS = ('woba', 'xwoba', 'binary', 'xslg')
+
+
+def metric_outcomes(combined_df, metrics=METRICS, strikeout_value=-0.7):
+    # combined_df has to be preprocessed (see preprocess_plate_appearances).
+    # returns an (n_pa x n_metrics) float64 matrix, columns in the order of metrics
+    is_strikeout = (combined_df['events'] == 'strikeout').to_numpy()
+    woba_value = combined_df['woba_value'].to_numpy(dtype=np.float64)
+    columns = []
+    for metric in metrics:
+        if metric == 'woba':
+            values = combined_df['woba_norm'].to_numpy(dtype=np.float64)
+        elif metric == 'xwoba':
+            xwoba = combined_df['estimated_woba_using_speedangle'].to_numpy(dtype=np.float64)
+            values, _ = normalize_woba(np.where(np.isnan(xwoba), woba_value, xwoba), is_strikeout, strikeout_value)
+        elif metric == 'binary':
+            values = combined_df['binary_outcome'].to_numpy(dtype=np.float64)
+        elif metric == 'xslg':
+            xslg = np.nan_to_num(combined_df['estimated_slg_using_speedangle'].to_numpy(dtype=np.float64))
+            values, _ = normalize_woba(xslg, is_strikeout, strikeout_value)
+        else:
+            raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS}")
+        columns.append(values)
+    return np.column_stack(columns)
+
+
+@dataclass
+class MultiEloState:
+    metrics: tuple
+    batter_ids: np.ndarray
+    batter_elo: np.ndarray      # (n_batters, n_metrics)
+    batter_count: np.ndarray
+    pitcher_ids: np.ndarray
+    pitcher_elo: np.ndarray     # (n_pitchers, n_metrics)
+    pitcher_count: np.ndarray
+    clipped: int = 0            # clipped expectations, summed over all tracks
+
+    def _frame(self, role):
+        df = pd.DataFrame({'player_id': getattr(self, f'{role}_ids'), 'count': getattr(self, f'{role}_count')})
+        elo = getattr(self, f'{role}_elo')
+        for j, metric in enumerate(self.metrics):
+            df[f'elo_{metric}'] = elo[:, j]
+        return df
+
+    # wide tables: player_id, count, elo_<metric> for every metric
+    def batter_frame(self):
+        return self._frame('batter')
+
+    def pitcher_frame(self):
+        return self._frame('pitcher')
+
+
+def _waves(pas):
+    # (order, bounds): pas sorted by wave, wave w is order[bounds[w]:bounds[w + 1]].
+    # a PA's wave is one past the later of its batter's and pitcher's previous ones
+    batter_next = [0] * len(pas.batter_ids)
+    pitcher_next = [0] * len(pas.pitcher_ids)
+    wave = [0] * len(pas)
+    for i, (batter, pitcher) in enumerate(zip(pas.batter.tolist(), pas.pitcher.tolist())):
+        w = max(batter_next[batter], pitcher_next[pitcher])
+        wave[i] = w
+        batter_next[batter] = pitcher_next[pitcher] = w + 1
+    wave = np.array(wave, dtype=np.int64)
+    # stable, so a wave keeps the file order (not that it matters, no player is in it twice)
+    order = np.argsort(wave, kind='stable')
+    n_waves = int(wave.max()) + 1 if len(wave) else 0
+    bounds = np.searchsorted(wave[order], np.arange(n_waves + 1))
+    return order, bounds
+
+
+def run_elo_multi(pas, outcomes, metrics=METRICS, params=DEFAULT_PARAMS):
+    # outcomes is the (len(pas) x n_metrics) matrix from metric_outcomes
+    outcomes = np.asarray(outcomes, dtype=np.float64)
+    m = len(metrics)
+    if outcomes.shape != (len(pas), m):
+        raise ValueError(f"outcomes must have shape {(len(pas), m)}, got {outcomes.shape}")
+    n_batters, n_pitchers = len(pas.batter_ids), len(pas.pitcher_ids)
+
+    batter_elo = np.full((n_batters, m), float(params.start_elo))
+    pitcher_elo = np.full((n_pitchers, m), float(params.start_elo))
+    batter_count = np.zeros(n_batters, dtype=np.int64)
+    pitcher_count = np.zeros(n_pitchers, dtype=np.int64)
+
+    order, bounds = _waves(pas)
+    batters = pas.batter[order].astype(np.intp)
+    pitchers = pas.pitcher[order].astype(np.intp)
+    park_factors = pas.park_factor[order] if params.use_park_factor else np.ones(len(pas))
+    outcomes = outcomes[order]
+
+    clipped = 0
+    for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        # no player shows up twice in a wave, so the fancy-indexed writes can't collide
+        batter, pitcher = batters[start:end], pitchers[start:end]
+        b_elo, p_elo = batter_elo[batter], pitcher_elo[pitcher]
+
+        expected_batter = 1 / ((10 ** ((p_elo - b_elo) / 400)) + 1) * park_factors[start:end, None]
+        over = expected_batter > 1
+        if over.any():
+            expected_batter[over] = 1
+            clipped += int(over.sum())
+        expected_pitcher = 1 - expected_batter
+        outcome = outcomes[start:end]
+
+        b_k = np.where(batter_count[batter] <= params.pa_threshold, params.k_high, params.k_low)
+        p_k = np.where(pitcher_count[pitcher] <= params.pa_threshold, params.k_high, params.k_low)
+        batter_elo[batter] = b_elo + b_k[:, None] * (outcome - expected_batter)
+        pitcher_elo[pitcher] = p_elo + p_k[:, None] * ((1 - outcome) - expected_pitcher)
+        batter_count[batter] += 1
+        pitcher_count[pitcher] += 1
+
+    return MultiEloState(
+        metrics=tuple(metrics),
+        batter_ids=pas.batter_ids,
+        batter_elo=batter_elo,
+        batter_count=batter_count,
+        pitcher_ids=pas.pitcher_ids,
+        pitcher_elo=pitcher_elo,
+        pitcher_count=pitcher_count,
+        clipped=clipped,
+    )
+
+
+def benchmark(pas, outcomes, metrics=METRICS, params=DEFAULT_PARAMS, repeat=3):
+    # best-of-repeat seconds of run_elo_multi against one run_elo per metric
+    multi, separate = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_elo_multi(pas, outcomes, metrics, params)
+        multi.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        for j in range(len(metrics)):
+            run_elo(pas, params, woba_norm=outcomes[:, j])
+        separate.append(time.perf_counter() - start)
+    return min(multi), min(separate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ELO on several outcome metrics in one pass")
+    parser.add_argument('--metrics', nargs='+', choices=METRICS, default=list(METRICS))
+    parser.add_argument('--prefix', default='elo_by_metric')
+    parser.add_argument('--benchmark', action='store_true',
+                        help="time the one pass against one run_elo per metric and exit")
+    args = parser.parse_args()
+
+    params = EloParams()
+    combined_df, pas = load_plate_appearances(strikeout_value=params.strikeout_value)
+    outcomes = metric_outcomes(combined_df, args.metrics, params.strikeout_value)
+    if args.benchmark:
+        multi, separate = benchmark(pas, outcomes, args.metrics, params)
+        print(f"{len(pas)} plate appearances, {len(args.metrics)} metrics: one pass {multi:.3f}s, "
+              f"run_elo per metric {separate:.3f}s ({separate / multi:.1f}x)")
+        return
+    state = run_elo_multi(pas, outcomes, args.metrics, params)
+    if state.clipped:
+        print(f"HAD TO CLIP {state.clipped} EXPECTATIONS")
+
+    player_index = load_player_index()
+    for role, df in (('batter', state.batter_frame()), ('pitcher', state.pitcher_frame())):
+        df = attach_metadata(df, player_index, ['MLBID', 'MLBNAME', 'TEAM']).drop(columns='MLBID')
+        df = df.sort_values(f'elo_{args.metrics[0]}', ascending=False)
+        df.to_csv(f'{args.prefix}_{role}s.csv', index=False)
+    print(f"Wrote {args.prefix}_batters.csv and {args.prefix}_pitchers.csv")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from dataclasses import fields
+
+import numpy as np
+import pandas as pd
+
+from elo_engine import PlateAppearances, encode_plate_appearances, preprocess_plate_appearances
+from ingest import PA_COLUMNS, ingest_statcast, print_ingest_report, read_park_factors, statcast_paths
+
+
+# On-disk cache of the preprocessed, sorted and encoded plate-appearance table.
+# Every column is stored as its own .npy file so warm runs memory-map them instead
+# of re-parsing the raw statcast csvs and recomputing woba_norm and the sort.
+# The cache key covers the source files (size + mtime, or content hashes) and the
+# preprocessing parameters, so any change to either lands in a new entry; the old
+# entry for the same set of files is deleted right away and everything else is
+# evicted least-recently-used once the cache grows past max_bytes.
+
+CACHE_DIR = '.elo_cache'
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+# a temp folder this old is from a writer that crashed
+TEMP_MAX_AGE = 3600
+# bump when the stored layout or the preprocessing changes
+CACHE_VERSION = 1
+
+
+def _file_fingerprint(path, hash_contents):
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    if not hash_contents:
+        return [stat.st_size, stat.st_mtime_ns]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return [stat.st_size, digest.hexdigest()]
+
+
+def cache_key(paths, params, hash_contents=False):
+    # returns (key, sources): sources identifies the set of inputs regardless of their contents
+    sources = sorted(os.path.abspath(p) for p in paths)
+    payload = {
+        'version': CACHE_VERSION,
+        'files': {p: _file_fingerprint(p, hash_contents) for p in sources},
+        'params': params,
+    }
+    key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:24]
+    source_id = hashlib.sha256(json.dumps({'sources': sources, 'params': params}, sort_keys=True).encode()).hexdigest()[:24]
+    return key, source_id
+
+
+def _save_frame(df, directory):
+    # one .npy per column; categoricals are stored as codes, datetimes as int64,
+    # nullable integers as their values plus a second .npy with the missing mask
+    columns = []
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        entry = {'name': col, 'file': f'frame_{i}.npy'}
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            entry['kind'] = 'category'
+            entry['categories'] = series.cat.categories.tolist()
+            values = series.cat.codes.to_numpy()
+        elif pd.api.types.is_datetime64_any_dtype(series.dtype):
+            entry['kind'] = 'datetime'
+            entry['unit'] = np.datetime_data(series.dtype)[0]
+            values = series.to_numpy().view(np.int64)
+        elif pd.api.types.is_extension_array_dtype(series.dtype) and pd.api.types.is_integer_dtype(series.dtype):
+            entry['kind'] = 'masked'
+            entry['mask'] = f'mask_{i}.npy'
+            np.save(os.path.join(directory, entry['mask']), series.isna().to_numpy(), allow_pickle=False)
+            values = series.fillna(0).to_numpy(series.dtype.numpy_dtype)
+        else:
+            entry['kind'] = 'plain'
+            values = series.to_numpy()
+        np.save(os.path.join(directory, entry['file']), values, allow_pickle=False)
+        columns.append(entry)
+    return columns
+
+
+def _load_frame(columns, directory, rows=None):
+    # rows (positions) reads just those rows of every memory-mapped column
+    data = {}
+    for entry in columns:
+        values = np.load(os.path.join(directory, entry['file']), mmap_mode='r')
+        if rows is not None:
+            values = values[rows]
+        if entry['kind'] == 'category':
+            data[entry['name']] = pd.Categorical.from_codes(values, entry['categories'])
+        elif entry['kind'] == 'datetime':
+            data[entry['name']] = values.view(f"datetime64[{entry['unit']}]")
+        elif entry['kind'] == 'masked':
+            mask = np.load(os.path.join(directory, entry['mask']))
+            if rows is not None:
+                mask = mask[rows]
+            data[entry['name']] = pd.arrays.IntegerArray(np.array(values), mask)
+        else:
+            data[entry['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def _save_entry(directory, combined_df, pas, meta):
+    tmp = f'{directory}.tmp{os.getpid()}'
+    os.makedirs(tmp, exist_ok=True)
+    meta = dict(meta, frame=_save_frame(combined_df, tmp), encoded={})
+    for field in fields(PlateAppearances):
+        values = getattr(pas, field.name)
+        if values.dtype == object:
+            meta['encoded'][field.name] = values.tolist()
+        else:
+            np.save(os.path.join(tmp, f'pa_{field.name}.npy'), values, allow_pickle=False)
+            meta['encoded'][field.name] = None
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    # rename last so a half-written entry is never picked up
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+
+
+def _load_entry(directory):
+    with open(os.path.join(directory, 'meta.json')) as f:
+        meta = json.load(f)
+    combined_df = _load_frame(meta['frame'], directory)
+    arrays = {}
+    for name, inline in meta['encoded'].items():
+        if inline is not None:
+            arrays[name] = np.array(inline, dtype=object)
+        else:
+            arrays[name] = np.load(os.path.join(directory, f'pa_{name}.npy'), mmap_mode='r')
+    return combined_df, PlateAppearances(**arrays), meta
+
+
+def _entry_size(directory):
+    return sum(e.stat().st_size for e in os.scandir(directory) if e.is_file())
+
+
+def _is_temp(name):
+    # <entry>.tmp<pid> folders belong to a writer that hasn't renamed them yet; they get
+    # meta.json before the rename, so they must never be listed (or evicted) as entries
+    return '.tmp' in name
+
+
+def _entries(cache_dir):
+    if not os.path.isdir(cache_dir):
+        return []
+    return [e.path for e in os.scandir(cache_dir)
+            if e.is_dir() and not _is_temp(e.name) and os.path.exists(os.path.join(e.path, 'meta.json'))]
+
+
+def _drop_abandoned(cache_dir, max_age=TEMP_MAX_AGE):
+    # temp folders left behind by a writer that died before its rename
+    if not os.path.isdir(cache_dir):
+        return
+    for e in os.scandir(cache_dir):
+        if e.is_dir() and _is_temp(e.name) and time.time() - e.stat().st_mtime > max_age:
+            shutil.rmtree(e.path, ignore_errors=True)
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, keep=()):
+    # drop least recently used entries (meta.json mtime is touched on every hit) until under max_bytes
+    _drop_abandoned(cache_dir)
+    entries = sorted(_entries(cache_dir), key=lambda d: os.path.getmtime(os.path.join(d, 'meta.json')))
+    total = sum(_entry_size(d) for d in entries)
+    for directory in entries:
+        if total <= max_bytes:
+            break
+        if os.path.abspath(directory) in keep:
+            continue
+        total -= _entry_size(directory)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _drop_stale(cache_dir, source_id, current):
+    # same input files and parameters, different contents: that entry can never be hit again
+    for directory in _entries(cache_dir):
+        if os.path.abspath(directory) == os.path.abspath(current):
+            continue
+        try:
+            with open(os.path.join(directory, 'meta.json')) as f:
+                stale = json.load(f).get('source_id') == source_id
+        except (OSError, ValueError):
+            stale = True
+        if stale:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def load_plate_appearances(paths=None, park_factors_path='park_factors.csv', strikeout_value=-0.7,
+                           columns=PA_COLUMNS, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES,
+                           hash_contents=False, verbose=True):
+    # returns (combined_df, plate_appearances): the preprocessed table (see
+    # preprocess_plate_appearances) and its encoded arrays, from the cache when possible
+    if paths is None:
+        paths = statcast_paths()
+    params = {'strikeout_value': strikeout_value, 'columns': list(columns)}
+    key, source_id = cache_key(list(paths) + [park_factors_path], params, hash_contents)
+    directory = os.path.join(cache_dir, key)
+
+    if os.path.exists(os.path.join(directory, 'meta.json')):
+        try:
+            combined_df, pas, _ = _load_entry(directory)
+            os.utime(os.path.join(directory, 'meta.json'))
+            if verbose:
+                print(f"Loaded {len(combined_df)} plate appearances from cache {directory}")
+            return combined_df, pas
+        except (OSError, ValueError, KeyError) as e:
+            print(f"WARNING: ignoring unreadable cache entry {directory}: {e}")
+            shutil.rmtree(directory, ignore_errors=True)
+
+    combined_df, report = ingest_statcast(paths, columns=columns)
+    if verbose:
+        print_ingest_report(report)
+    combined_df = preprocess_plate_appearances(combined_df, strikeout_value=strikeout_value)
+    pas = encode_plate_appearances(combined_df, read_park_factors(park_factors_path))
+
+    os.makedirs(cache_dir, exist_ok=True)
+    _save_entry(directory, combined_df, pas, {'key': key, 'source_id': source_id, 'created': time.time(),
+                                              'files': report.to_dict(orient='records')})
+    _drop_stale(cache_dir, source_id, directory)
+    evict(cache_dir, max_bytes, keep={os.path.abspath(directory)})
+    return combined_df, pas
@@ -0,0 +1,188 @@
+import functools
+import itertools
+import json
+import os
+import shutil
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from pa_cache import CACHE_DIR, _drop_stale, _load_frame, _save_frame, cache_key
+
+
+# Slim player metadata index. playerid_map.csv has ~45 columns; only the handful below
+# are kept, keyed by the integer MLBID (what statcast uses), and stored in the cache
+# folder as per-column .npy files, so later runs memory-map it instead of parsing the
+# csv. Loading is lazy and happens once per process.
+#
+# The FanGraphs leaderboards (wrc_plus.csv, era_minus.csv) only carry names, so each of
+# their rows is resolved to an MLBID once and every join after that is on the integer
+# id. Players sharing a name (Max Muncy, Luis Garcia) are told apart by the leaderboard's
+# team, if it has one, and then by its PA/IP against the rated players' PA counts. Names
+# that still match nobody, or more than one player, are reported in a diagnostics table
+# instead of silently disappearing from (or duplicating rows in) an inner join.
+
+PLAYER_MAP = 'playerid_map.csv'
+# IDFANGRAPHS stays a string: minor leaguers have ids like 'sa3011918'
+INDEX_COLUMNS = ['MLBID', 'IDFANGRAPHS', 'MLBNAME', 'FANGRAPHSNAME', 'TEAM', 'BATS', 'THROWS']
+# the columns elo_calculations.py has always merged onto the ratings
+METADATA_COLUMNS = ['MLBID', 'MLBNAME', 'TEAM', 'FANGRAPHSNAME']
+DIAGNOSTICS_FILE = 'player_match_diagnostics.csv'
+# plate appearances per inning pitched, to hold an ERA- leaderboard's IP against PA counts
+BATTERS_PER_INNING = 4.3
+# namesakes beyond this many are left ambiguous instead of trying every assignment
+MAX_NAMESAKES = 6
+
+
+def normalize_name(names):
+    # case, accents, periods and extra whitespace don't count ("J.P. Crawford" == "JP Crawford")
+    def one(name):
+        if not isinstance(name, str):
+            return ''
+        name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode()
+        return ' '.join(name.replace('.', '').casefold().split())
+    return pd.Series([one(n) for n in names], index=names.index if isinstance(names, pd.Series) else None, dtype=object)
+
+
+def build_player_index(path=PLAYER_MAP):
+    # one row per MLBID, sorted by it; rows without an MLBID can't be joined to statcast
+    index = pd.read_csv(path, usecols=INDEX_COLUMNS, dtype={'IDFANGRAPHS': str})
+    index = index.dropna(subset=['MLBID'])
+    index['MLBID'] = index['MLBID'].astype(np.int64)
+    index = index.drop_duplicates('MLBID').sort_values('MLBID').reset_index(drop=True)
+    index['name_key'] = normalize_name(index['FANGRAPHSNAME'].fillna(index['MLBNAME']))
+    # strings go to disk as categoricals (codes + categories), .npy can't hold objects
+    for col in index.columns.drop('MLBID'):
+        index[col] = index[col].astype('category')
+    return index
+
+
+@functools.lru_cache(maxsize=None)
+def load_player_index(path=PLAYER_MAP, cache_dir=CACHE_DIR):
+    # the index for path, built once and then read back from the cache folder
+    key, source_id = cache_key([path], {'player_index': INDEX_COLUMNS})
+    directory = os.path.join(cache_dir, f'players_{key}')
+    meta_path = os.path.join(directory, 'meta.json')
+    if os.path.exists(meta_path):
+        try:
+            with open(meta_path) as f:
+                return _load_frame(json.load(f)['frame'], directory)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"WARNING: ignoring unreadable player index {directory}: {e}")
+
+    index = build_player_index(path)
+    tmp = f'{directory}.tmp{os.getpid()}'
+    os.makedirs(tmp, exist_ok=True)
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump({'key': key, 'source_id': source_id, 'created': time.time(), 'frame': _save_frame(index, tmp)}, f)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+    _drop_stale(cache_dir, source_id, directory)
+    return index
+
+
+def attach_metadata(ratings_df, index, columns=METADATA_COLUMNS, on='player_id'):
+    # left join of index columns onto ratings_df[on] (an MLBID), one row per rating row
+    meta = index[columns].copy()
+    for col in meta.columns:
+        if isinstance(meta[col].dtype, pd.CategoricalDtype):
+            meta[col] = meta[col].astype(object)
+    return ratings_df.merge(meta, left_on=on, right_on='MLBID', how='left', validate='many_to_one')
+
+
+def _fangraphs_matches(stats_df, index, id_col):
+    # exact matches on the FanGraphs id, for leaderboards exported with a playerid column
+    by_id = dict(zip(index['IDFANGRAPHS'].astype(object), index['MLBID']))
+    return [[by_id[i]] if i in by_id else [] for i in stats_df[id_col].astype(str)]
+
+
+def _name_matches(stats_df, index, name_col, candidates, team_col):
+    groups = {}
+    for key, mlbid in zip(index['name_key'].astype(object), index['MLBID'].tolist()):
+        groups.setdefault(key, []).append(mlbid)
+    teams = dict(zip(index['MLBID'].tolist(), index['TEAM'].astype(object)))
+    row_teams = stats_df[team_col].tolist() if team_col in stats_df.columns else [None] * len(stats_df)
+    matches = []
+    for key, team in zip(normalize_name(stats_df[name_col]), row_teams):
+        ids = groups.get(key, [])
+        if len(ids) > 1 and candidates:
+            # shared name: keep the namesakes that were actually rated, if that settles it
+            ids = [i for i in ids if i in candidates] or ids
+        if len(ids) > 1 and isinstance(team, str):
+            ids = [i for i in ids if teams.get(i) == team] or ids
+        matches.append(ids)
+    return matches
+
+
+def _split_namesakes(matches, volume, counts):
+    # rows still matching several players get spread over them by volume: every row sharing
+    # the same candidates goes to a different one of them, picking the assignment with the
+    # smallest total gap between the row's volume (expected PAs) and the player's rated PA
+    # count. only settled when that assignment is strictly the best one
+    settled = {}
+    groups = {}
+    for row, ids in enumerate(matches):
+        if len(ids) > 1:
+            groups.setdefault(tuple(ids), []).append(row)
+    for ids, rows in groups.items():
+        if len(rows) > len(ids) or len(ids) > MAX_NAMESAKES or np.isnan(volume[rows]).any():
+            continue
+        costs = sorted((sum(abs(volume[r] - counts.get(i, 0)) for r, i in zip(rows, chosen)), chosen)
+                       for chosen in itertools.permutations(ids, len(rows)))
+        if len(costs) == 1 or costs[0][0] < costs[1][0]:
+            settled.update(zip(rows, costs[0][1]))
+    return settled
+
+
+def resolve_names(stats_df, index, candidates=None, name_col='Name', id_col='playerid', source='',
+                  counts=None, volume_col=None, volume_scale=1.0, team_col='Team'):
+    # adds player_id (MLBID) to a FanGraphs leaderboard, by FanGraphs id when the file has
+    # one and by normalized name otherwise. candidates (e.g. the rated batter ids) breaks
+    # ties between players sharing a name, then the leaderboard's team_col if it has one.
+    # with counts (rated PAs, lined up with candidates) and volume_col ('PA', or 'IP' with
+    # volume_scale=BATTERS_PER_INNING), namesakes left after that are told apart by volume.
+    # returns (resolved, diagnostics): resolved keeps the rows that map to exactly one
+    # player, each player at most once, and diagnostics has every row that did not resolve
+    # cleanly ('tie_broken' rows are resolved, but listed so they can be checked)
+    if id_col in stats_df.columns:
+        matches = _fangraphs_matches(stats_df, index, id_col)
+    else:
+        matches = _name_matches(stats_df, index, name_col, set(np.asarray(candidates).tolist()) if candidates is not None else set(),
+                                team_col)
+    settled = {}
+    if counts is not None and volume_col in stats_df.columns:
+        volume = pd.to_numeric(stats_df[volume_col], errors='coerce').to_numpy(dtype=np.float64) * volume_scale
+        settled = _split_namesakes(matches, volume, dict(zip(np.asarray(candidates).tolist(), np.asarray(counts).tolist())))
+    n_names = [len(ids) for ids in matches]
+    player_id = np.array([settled.get(row, ids[0] if len(ids) == 1 else -1) for row, ids in enumerate(matches)],
+                         dtype=np.int64)
+    status = np.select([np.equal(n_names, 0), np.greater(n_names, 1)], ['unmatched', 'ambiguous'], 'matched').astype(object)
+    status[list(settled)] = 'tie_broken'
+    # two leaderboard rows claiming the same player: keep neither, report both
+    duplicate = (player_id >= 0) & pd.Series(player_id).duplicated(keep=False).to_numpy()
+    status[duplicate] = 'duplicate'
+    player_id[duplicate] = -1
+
+    diagnostics = pd.DataFrame({
+        'source': source,
+        name_col: stats_df[name_col].to_numpy(),
+        'status': status,
+        'candidates': [' '.join(str(i) for i in ids) for ids in matches],
+        'player_id': np.where(player_id >= 0, player_id, pd.NA),
+    })[status != 'matched'].reset_index(drop=True)
+    resolved = stats_df.assign(player_id=player_id)[player_id >= 0].reset_index(drop=True)
+    return resolved, diagnostics
+
+
+def print_match_summary(source, stats_df, resolved, diagnostics):
+    counts = diagnostics['status'].value_counts()
+    details = ', '.join(f"{n} {status}" for status, n in counts.items())
+    print(f"{source}: matched {len(resolved)} of {len(stats_df)} rows by name" + (f" ({details})" if details else ""))
+    # the namesakes are few, and worth a look one by one
+    name_col = diagnostics.columns[1]
+    for row in diagnostics[diagnostics['status'].isin(['ambiguous', 'tie_broken', 'duplicate'])].itertuples(index=False):
+        row = row._asdict()
+        chosen = f" -> {row['player_id']}" if row['status'] == 'tie_broken' else ""
+        print(f"  {row['status']}: {row[name_col]} (player ids {row['candidates']}){chosen}")
@@ -0,0 +1,129 @@
+import os
+import shutil
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from app_data import DEFAULT_SEASON, season_dir
+
+
+# Per-plate-appearance rating history. run_elo(..., history=...) fills preallocated
+# float32 arrays with both players' ratings before and after every PA. save_history()
+# regroups those into one block of records per player (sorted by player id, with a
+# CSR-style offsets array) and writes them as .npy files, so a player's trajectory
+# is a binary search plus one contiguous slice of a memory-mapped file.
+# Every season has its own folder, elo_history/<season>/, like app_data/<season>/.
+
+HISTORY_DIR = 'elo_history'
+
+RECORD_DTYPE = np.dtype([
+    ('pa', 'i4'),            # index of the plate appearance in the season
+    ('game_date', 'M8[D]'),
+    ('opponent', 'i8'),      # opposing pitcher / batter id
+    ('outcome', 'f4'),       # woba_norm, from the batter's side
+    ('pre', 'f4'),
+    ('post', 'f4'),
+])
+
+
+@dataclass
+class RatingHistory:
+    batter_pre: np.ndarray
+    batter_post: np.ndarray
+    pitcher_pre: np.ndarray
+    pitcher_post: np.ndarray
+
+    @classmethod
+    def allocate(cls, n):
+        return cls(*(np.zeros(n, dtype=np.float32) for _ in range(4)))
+
+
+def _player_blocks(codes, ids, opponent_ids, pre, post, pas):
+    # group records by player: records sorted by (player id, pa), plus offsets per player
+    order = np.lexsort((np.arange(len(codes)), ids[codes]))
+    records = np.empty(len(codes), dtype=RECORD_DTYPE)
+    records['pa'] = order
+    records['game_date'] = np.asarray(pas.game_date)[order]
+    records['opponent'] = opponent_ids[order]
+    records['outcome'] = np.asarray(pas.woba_norm)[order]
+    records['pre'] = pre[order]
+    records['post'] = post[order]
+
+    player_ids = np.sort(np.unique(ids[codes]))
+    counts = np.bincount(np.searchsorted(player_ids, ids[codes]), minlength=len(player_ids))
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return player_ids, offsets, records
+
+
+def history_dir(season=DEFAULT_SEASON, root=HISTORY_DIR):
+    return season_dir(season, root)
+
+
+def save_history(history, pas, season=DEFAULT_SEASON, root=HISTORY_DIR):
+    directory = history_dir(season, root)
+    batter_ids = np.asarray(pas.batter_ids, dtype=np.int64)
+    pitcher_ids = np.asarray(pas.pitcher_ids, dtype=np.int64)
+    batter_codes = np.asarray(pas.batter)
+    pitcher_codes = np.asarray(pas.pitcher)
+
+    tmp = f'{directory}.tmp{os.getpid()}'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for role, codes, ids, opponents, pre, post in (
+            ('batter', batter_codes, batter_ids, pitcher_ids[pitcher_codes], history.batter_pre, history.batter_post),
+            ('pitcher', pitcher_codes, pitcher_ids, batter_ids[batter_codes], history.pitcher_pre, history.pitcher_post)):
+        player_ids, offsets, records = _player_blocks(codes, ids, opponents, pre, post, pas)
+        np.save(os.path.join(tmp, f'{role}_ids.npy'), player_ids)
+        np.save(os.path.join(tmp, f'{role}_offsets.npy'), offsets)
+        np.save(os.path.join(tmp, f'{role}_records.npy'), records)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+
+
+class HistoryStore:
+    # read side; opening only maps the files, nothing gets read until a trajectory is asked for
+
+    def __init__(self, season=DEFAULT_SEASON, root=HISTORY_DIR):
+        self.season = season
+        self.directory = history_dir(season, root)
+        self._roles = {}
+
+    def _open(self, role):
+        if role not in self._roles:
+            load = lambda name: np.load(os.path.join(self.directory, f'{role}_{name}.npy'), mmap_mode='r')
+            self._roles[role] = (load('ids'), load('offsets'), load('records'))
+        return self._roles[role]
+
+    def records(self, player_id, role='batter'):
+        ids, offsets, records = self._open(role)
+        k = np.searchsorted(ids, player_id)
+        if k == len(ids) or ids[k] != player_id:
+            return records[:0]
+        return records[offsets[k]:offsets[k + 1]]
+
+    def trajectory(self, player_id, role='batter'):
+        # one row per plate appearance of the player, in order
+        df = pd.DataFrame(np.array(self.records(player_id, role)))
+        df.insert(0, 'pa_number', np.arange(1, len(df) + 1))
+        return df
+
+
+def history_exists(season=DEFAULT_SEASON, root=HISTORY_DIR):
+    return os.path.exists(os.path.join(history_dir(season, root), 'batter_records.npy'))
+
+
+def history_mtime(season=DEFAULT_SEASON, root=HISTORY_DIR):
+    # changes with every save_history (the folder is replaced), None without a history
+    path = os.path.join(history_dir(season, root), 'batter_records.npy')
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def remove_history(season=DEFAULT_SEASON, root=HISTORY_DIR):
+    # a run that doesn't write a history drops the season's old one, so it can't be shown
+    # against other ratings
+    directory = history_dir(season, root)
+    if os.path.exists(directory):
+        shutil.rmtree(directory, ignore_errors=True)
+        return True
+    return False
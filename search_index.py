@@ -0,0 +1,98 @@
+import numpy as np
+
+from player_index import normalize_name
+
+
+# Row-id indexes over one results table (Name, TEAM, PAs, is_qualified), so the Results
+# tab's search box and filters don't scan the whole table on every keystroke. Built once
+# per table and cached by the app; every filter returns a sorted array of row positions,
+# and a combined filter is the intersection of those arrays, smallest first.
+#
+#   name     - normalized like player_index.normalize_name (case, accents and periods
+#              don't count). 3+ characters: rows holding all of the query's trigrams,
+#              checked for the full substring. Shorter queries have no trigram to look
+#              up, and match nearly every name anyway, so they scan the names. Either way
+#              it's the rows whose name contains the query, like the old str.contains
+#   team     - postings per team
+#   PAs      - row ids sorted by PAs, so "at least n PAs" is one searchsorted cut
+#   qualified - postings of the qualified rows
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _postings(keys):
+    # key -> sorted row ids
+    postings = {}
+    for row, key in enumerate(keys):
+        postings.setdefault(key, []).append(row)
+    return {key: np.array(rows, dtype=np.int64) for key, rows in postings.items()}
+
+
+class PlayerSearchIndex:
+    def __init__(self, table):
+        self.n_rows = len(table)
+        self.names = normalize_name(table['Name']).tolist()
+
+        trigram_rows = {}
+        for row, name in enumerate(self.names):
+            for gram in _trigrams(name):
+                trigram_rows.setdefault(gram, []).append(row)
+        self.trigrams = {gram: np.array(rows, dtype=np.int64) for gram, rows in trigram_rows.items()}
+
+        # players without a team (NaN) are only reachable without a team filter
+        self.teams = _postings(table['TEAM'].astype(object).fillna('').tolist())
+        self.teams.pop('', None)
+
+        pas = table['PAs'].to_numpy()
+        self.pa_order = np.argsort(pas, kind='stable')
+        self.pa_sorted = pas[self.pa_order]
+        self.qualified = np.flatnonzero(table['is_qualified'].to_numpy(dtype=bool))
+
+    def team_list(self):
+        return sorted(self.teams)
+
+    def match_name(self, query):
+        # sorted row ids whose name contains query
+        if not query:
+            return np.arange(self.n_rows)
+        # a space typed before or after the name still has to be there, like with str.contains
+        normalized = normalize_name([query])[0]
+        query = (' ' if query[:1].isspace() else '') + normalized + (' ' if query[-1:].isspace() and normalized else '')
+        if len(query) < 3:
+            return np.array([row for row, name in enumerate(self.names) if query in name], dtype=np.int64)
+        postings = [self.trigrams.get(gram) for gram in _trigrams(query)]
+        if any(p is None for p in postings):
+            return np.empty(0, dtype=np.int64)
+        candidates = _intersect(postings)
+        # trigrams can all be present without the query being a substring
+        return np.array([row for row in candidates if query in self.names[row]], dtype=np.int64)
+
+    def min_pa(self, limit):
+        return np.sort(self.pa_order[np.searchsorted(self.pa_sorted, limit, side='left'):])
+
+    def select(self, name='', team='', min_pa=0, qualified=False):
+        # sorted row ids passing every given filter; empty or falsy arguments don't filter
+        sets = []
+        if team:
+            sets.append(self.teams.get(team, np.empty(0, dtype=np.int64)))
+        if qualified:
+            sets.append(self.qualified)
+        if name:
+            sets.append(self.match_name(name))
+        if min_pa > 0:
+            sets.append(self.min_pa(min_pa))
+        if not sets:
+            return np.arange(self.n_rows)
+        return _intersect(sets)
+
+
+def _intersect(sets):
+    sets = sorted(sets, key=len)
+    rows = sets[0]
+    for other in sets[1:]:
+        if not len(rows):
+            break
+        rows = np.intersect1d(rows, other, assume_unique=True)
+    return rows
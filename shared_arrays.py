@@ -0,0 +1,45 @@
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+# Read-only numpy arrays shared with process pool workers. The parent copies each
+# array into its own shared memory block once and hands the workers small specs;
+# workers map the same blocks instead of each getting a pickled copy.
+
+
+def share_arrays(arrays):
+    # returns (blocks, specs). keep blocks alive in the parent and release() them when done
+    blocks, specs = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def attach_arrays(specs):
+    # worker side: dict of read-only views. the blocks ride along under '_blocks' so
+    # they stay mapped for as long as the dict is alive
+    arrays, blocks = {}, []
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        # the parent owns (and unlinks) the blocks. spawned workers get their own resource
+        # tracker, which would otherwise unlink them when the worker exits
+        if multiprocessing.get_start_method() == 'spawn':
+            resource_tracker.unregister(block._name, 'shared_memory')
+        view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        view.flags.writeable = False
+        arrays[name] = view
+        blocks.append(block)
+    arrays['_blocks'] = blocks
+    return arrays
+
+
+def release(blocks):
+    for block in blocks:
+        block.close()
+        block.unlink()
@@ -0,0 +1,225 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from bootstrap import ELO_BINS, ELO_PLUS_BINS, StreamingHistogram
+from elo_engine import DEFAULT_PARAMS, EloParams, EloState, expected_batter_score, run_elo
+from ingest import read_park_factors
+from pa_cache import load_plate_appearances
+from rating_periods import day_boundaries
+
+
+# Monte Carlo rest-of-season / matchup simulator. The input ratings are treated as
+# every player's true talent: each simulated plate appearance draws a woba_norm value
+# from the season's empirical outcome distribution, tilted (exponentially reweighted)
+# so its mean equals the ELO expectation of the matchup, park factor included. The
+# simulated ratings then move with the rating-period update from rating_periods.py,
+# one game_date at a time, as array operations over a whole batch of simulations:
+# the (simulations x players) rating matrices are gathered, scored and scatter-added
+# back with bincount. Batches are sized to fit memory_bytes, and per-player histograms
+# (see bootstrap.py) keep the end-of-season ELO and ELO+ distributions, so the
+# number of simulations is only limited by time.
+#
+# start='current' continues from the input ratings and counts (projections),
+# start='fresh' restarts everybody at start_elo with no PAs, which shows how far the
+# ratings still are from the truth after a given number of PAs.
+
+STARTS = ('current', 'fresh')
+# expectations the outcome distribution is tilted to, interpolated between
+TILT_GRID = 512
+
+
+def outcome_distribution(woba_norm):
+    # distinct woba_norm values and how often each one happened
+    values, counts = np.unique(np.asarray(woba_norm, dtype=np.float64), return_counts=True)
+    return values, counts / counts.sum()
+
+
+def tilted_cdfs(values, probabilities, grid=TILT_GRID):
+    # (means, cdfs): cdfs[g] is the outcome cdf reweighted by exp(lam * value) so that its
+    # mean is means[g]. lam is found by bisection, for every grid point at once
+    margin = (values[-1] - values[0]) * 1e-3
+    means = np.linspace(values[0] + margin, values[-1] - margin, grid)
+    low, high = np.full(grid, -200.0), np.full(grid, 200.0)
+    for _ in range(100):
+        lam = (low + high) / 2
+        weights = probabilities * np.exp(lam[:, None] * (values - values.mean()))
+        mean = (weights * values).sum(axis=1) / weights.sum(axis=1)
+        low = np.where(mean < means, lam, low)
+        high = np.where(mean < means, high, lam)
+    weights /= weights.sum(axis=1, keepdims=True)
+    return means, np.cumsum(weights, axis=1)
+
+
+def encode_schedule(schedule, state, park_factors_df, params=DEFAULT_PARAMS):
+    # schedule: DataFrame with batter, pitcher, home_team, game_date. returns
+    # (state, batter, pitcher, park_factor, game_date): state gets the schedule's new
+    # players appended at start_elo, codes index into it, everything sorted by date
+    schedule = schedule.assign(game_date=pd.to_datetime(schedule['game_date'])) \
+        .sort_values('game_date', kind='stable').reset_index(drop=True)
+    extended = {'clipped': state.clipped}
+    codes = {}
+    for role in ('batter', 'pitcher'):
+        ids = getattr(state, f'{role}_ids')
+        new_ids = pd.Index(pd.unique(schedule[role])).difference(pd.Index(ids)).to_numpy()
+        extended[f'{role}_ids'] = np.concatenate([ids, new_ids.astype(ids.dtype)])
+        extended[f'{role}_elo'] = np.concatenate([getattr(state, f'{role}_elo'), np.full(len(new_ids), float(params.start_elo))])
+        extended[f'{role}_count'] = np.concatenate([getattr(state, f'{role}_count'), np.zeros(len(new_ids), dtype=np.int64)])
+        codes[role] = pd.Index(extended[f'{role}_ids']).get_indexer(schedule[role]).astype(np.int32)
+
+    park = park_factors_df.drop_duplicates('Team').set_index('Team')['Park Factor']
+    park_factor = park.reindex(schedule['home_team']).to_numpy(dtype=np.float64)
+    if np.isnan(park_factor).any():
+        missing = sorted(set(schedule['home_team'][np.isnan(park_factor)]))
+        raise KeyError(f"No park factor for home team(s): {missing}")
+    return (EloState(**extended), codes['batter'], codes['pitcher'], park_factor,
+            schedule['game_date'].to_numpy().astype('datetime64[D]'))
+
+
+def batch_size(n_batters, n_pitchers, max_day, n_values, memory_bytes):
+    # simulations per batch: rating matrices plus the per-day temporaries, float64
+    per_simulation = 8 * (2 * (n_batters + n_pitchers) + max_day * (8 + n_values))
+    return max(1, int(memory_bytes // per_simulation))
+
+
+def _elo_plus2_rows(elo, count):
+    # elo_plus2 for every row (simulation) of elo at once
+    adjusted = elo - elo.min(axis=1, keepdims=True)
+    return adjusted / ((adjusted * count).sum(axis=1, keepdims=True) / count.sum()) * 100
+
+
+def simulate(state, batter, pitcher, park_factor, game_date, woba_norm, params=DEFAULT_PARAMS,
+             n_simulations=1000, start='current', memory_bytes=512 * 1024 ** 2, seed=0,
+             batter_ids=None, pitcher_ids=None, levels=(0.05, 0.95)):
+    # state: true ratings (and the starting point for start='current'), laid out in the
+    # same player codes as batter/pitcher. woba_norm is the sample the outcome
+    # distribution comes from. batter_ids/pitcher_ids limit the ELO+ scaling and the
+    # report to those players. returns one DataFrame per role (dict)
+    if start not in STARTS:
+        raise ValueError(f"start must be one of {STARTS}")
+    rng = np.random.default_rng(seed)
+    batter, pitcher = np.asarray(batter), np.asarray(pitcher)
+    park_factor = park_factor if params.use_park_factor else np.ones(len(batter))
+    n_batters, n_pitchers = len(state.batter_ids), len(state.pitcher_ids)
+
+    # the outcome of every scheduled PA only depends on the true ratings: look up its
+    # tilted distribution once, each simulation then only needs a uniform draw
+    values, probabilities = outcome_distribution(woba_norm)
+    means, cdfs = tilted_cdfs(values, probabilities)
+    expected = expected_batter_score(state.batter_elo[batter], state.pitcher_elo[pitcher], park_factor)
+    grid = np.clip(np.rint((expected - means[0]) / (means[1] - means[0])), 0, len(means) - 1).astype(np.int64)
+
+    if start == 'current':
+        start_batter, start_pitcher = state.batter_elo, state.pitcher_elo
+        batter_count, pitcher_count = state.batter_count.astype(np.int64), state.pitcher_count.astype(np.int64)
+    else:
+        start_batter = np.full(n_batters, float(params.start_elo))
+        start_pitcher = np.full(n_pitchers, float(params.start_elo))
+        batter_count, pitcher_count = np.zeros(n_batters, np.int64), np.zeros(n_pitchers, np.int64)
+
+    # counts do not depend on outcomes, so the K factor of every PA is the same in every simulation
+    starts, stops = day_boundaries(game_date)
+    days = []
+    for lo, hi in zip(starts, stops):
+        b, p = batter[lo:hi], pitcher[lo:hi]
+        b_k = np.where(batter_count[b] <= params.pa_threshold, params.k_high, params.k_low)
+        p_k = np.where(pitcher_count[p] <= params.pa_threshold, params.k_high, params.k_low)
+        days.append((b, p, park_factor[lo:hi], cdfs[grid[lo:hi]], b_k, p_k))
+        batter_count += np.bincount(b, minlength=n_batters)
+        pitcher_count += np.bincount(p, minlength=n_pitchers)
+
+    masks = {
+        'batter': np.ones(n_batters, bool) if batter_ids is None else np.isin(state.batter_ids, batter_ids),
+        'pitcher': np.ones(n_pitchers, bool) if pitcher_ids is None else np.isin(state.pitcher_ids, pitcher_ids),
+    }
+    final_count = {'batter': batter_count, 'pitcher': pitcher_count}
+    hists, sums, squares = {}, {}, {}
+    for role in ('batter', 'pitcher'):
+        n = int(masks[role].sum())
+        hists[role] = {
+            'elo': StreamingHistogram(n, params.start_elo + ELO_BINS[0], params.start_elo + ELO_BINS[1], ELO_BINS[2]),
+            'elo+2': StreamingHistogram(n, *ELO_PLUS_BINS),
+        }
+        sums[role], squares[role] = np.zeros(n), np.zeros(n)
+
+    max_day = int((stops - starts).max()) if len(starts) else 0
+    size = batch_size(n_batters, n_pitchers, max_day, len(values), memory_bytes)
+    done = 0
+    while done < n_simulations:
+        s = min(size, n_simulations - done)
+        b_elo = np.tile(start_batter, (s, 1))
+        p_elo = np.tile(start_pitcher, (s, 1))
+        # row offsets into the flattened (simulations x players) matrices
+        b_rows = (np.arange(s) * n_batters)[:, None]
+        p_rows = (np.arange(s) * n_pitchers)[:, None]
+        for b, p, pf, cdf, b_k, p_k in days:
+            outcome = values[(cdf[None, :, :] < rng.random((s, len(b), 1))).sum(axis=2).clip(0, len(values) - 1)]
+            exp_b = np.minimum(1 / ((10 ** ((p_elo[:, p] - b_elo[:, b]) / 400)) + 1) * pf, 1)
+            b_elo += np.bincount((b_rows + b).ravel(), weights=(b_k * (outcome - exp_b)).ravel(),
+                                 minlength=s * n_batters).reshape(s, n_batters)
+            p_elo += np.bincount((p_rows + p).ravel(), weights=(p_k * ((1 - outcome) - (1 - exp_b))).ravel(),
+                                 minlength=s * n_pitchers).reshape(s, n_pitchers)
+
+        for role, elo in (('batter', b_elo), ('pitcher', p_elo)):
+            elo = elo[:, masks[role]]
+            elo_plus2 = _elo_plus2_rows(elo, final_count[role][masks[role]])
+            for row in range(s):
+                hists[role]['elo'].add(elo[row])
+                hists[role]['elo+2'].add(elo_plus2[row])
+            sums[role] += elo.sum(axis=0)
+            squares[role] += (elo ** 2).sum(axis=0)
+        done += s
+
+    results = {}
+    for role in ('batter', 'pitcher'):
+        mask = masks[role]
+        mean = sums[role] / done
+        df = pd.DataFrame({
+            'player_id': getattr(state, f'{role}_ids')[mask],
+            'true_elo': getattr(state, f'{role}_elo')[mask],
+            'start_elo': (start_batter if role == 'batter' else start_pitcher)[mask],
+            'count': final_count[role][mask],
+            'elo_mean': mean,
+            'elo_sd': np.sqrt(np.maximum(squares[role] / done - mean ** 2, 0)),
+        })
+        for metric in ('elo', 'elo+2'):
+            df[f'{metric}_low'] = hists[role][metric].quantile(levels[0])
+            df[f'{metric}_median'] = hists[role][metric].quantile(0.5)
+            df[f'{metric}_high'] = hists[role][metric].quantile(levels[1])
+        df['simulations'] = done
+        results[role] = df.sort_values('elo_mean', ascending=False).reset_index(drop=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of ELO over a schedule of matchups")
+    parser.add_argument('--schedule', help="csv with batter, pitcher, home_team, game_date (default: replay this season's matchups)")
+    parser.add_argument('--start', choices=STARTS, default='current')
+    parser.add_argument('--simulations', type=int, default=1000)
+    parser.add_argument('--memory-mb', type=float, default=512)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--prefix', default='simulated')
+    args = parser.parse_args()
+
+    params = EloParams()
+    _, pas = load_plate_appearances(strikeout_value=params.strikeout_value)
+    state = run_elo(pas, params)
+    if args.schedule:
+        state, batter, pitcher, park_factor, game_date = encode_schedule(
+            pd.read_csv(args.schedule), state, read_park_factors(), params)
+    else:
+        batter, pitcher, park_factor, game_date = pas.batter, pas.pitcher, pas.park_factor, pas.game_date
+
+    # same players (and so the same elo+2 scale) as the results the app shows
+    batter_ids = pd.read_csv('improved_batter_elo_ratings_park_factored1.csv', usecols=['player_id'])['player_id']
+    pitcher_ids = pd.read_csv('improved_pitcher_elo_ratings_park_factored1.csv', usecols=['player_id'])['player_id']
+    results = simulate(state, batter, pitcher, park_factor, game_date, pas.woba_norm, params, args.simulations,
+                       args.start, args.memory_mb * 1024 ** 2, args.seed, batter_ids, pitcher_ids)
+    for role in ('batter', 'pitcher'):
+        results[role].to_csv(f'{args.prefix}_{role}_elo.csv', index=False)
+    print(f"Wrote {args.prefix}_batter_elo.csv and {args.prefix}_pitcher_elo.csv ({args.simulations} simulations)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import argparse
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from elo_engine import DEFAULT_PARAMS, EloParams, run_elo
+from ingest import PA_COLUMNS, SPLIT_COLUMNS
+from pa_cache import load_plate_appearances
+from player_index import attach_metadata, load_player_index
+
+
+# Split-context ratings (platoon and home/road) from the same pass as the overall
+# ratings. Next to the overall elo every player has a dense (n_players x n_splits)
+# array of split ratings and counts. A plate appearance updates the overall rating
+# exactly like run_elo does, plus one split rating per split family (handedness and
+# venue). A split rating is judged against the opponent's overall pre-PA rating, so
+# all splits stay on the shared opponent-strength chain instead of rating each
+# filtered subset of combined_df on its own. The K factor of a split follows that
+# split's own count. The update itself is run_elo's (its splits argument), this module
+# only turns the raw columns into split codes and the state into tables. The split
+# columns aren't read by default, load with columns=PA_COLUMNS + SPLIT_COLUMNS.
+#
+# Split columns are the same for both roles, always from the player's point of view:
+#   vs_left / vs_right - opponent bats (for pitchers) or throws (for batters) left/right
+#   home / away        - the player's team is the home team or not (from inning_topbot)
+
+SPLITS = ('vs_left', 'vs_right', 'home', 'away')
+_HAND = {'L': 0, 'R': 1}
+
+
+def split_codes(combined_df):
+    # returns (batter_splits, pitcher_splits), each an (n_pa x 2) int8 array of split
+    # columns: [handedness family, venue family]. -1 where the raw data is missing
+    def hand(column):
+        # object first: mapping a categorical keeps it categorical, and fillna(-1) on that fails
+        return combined_df[column].astype(object).map(_HAND).fillna(-1).to_numpy(dtype=np.int8)
+
+    topbot = combined_df['inning_topbot'].astype(object).to_numpy()
+    # the home team bats in the bottom half
+    batter_venue = np.select([topbot == 'Bot', topbot == 'Top'], [2, 3], -1).astype(np.int8)
+    pitcher_venue = np.select([topbot == 'Top', topbot == 'Bot'], [2, 3], -1).astype(np.int8)
+    return (np.column_stack([hand('p_throws'), batter_venue]),
+            np.column_stack([hand('stand'), pitcher_venue]))
+
+
+@dataclass
+class SplitEloState:
+    batter_ids: np.ndarray
+    batter_elo: np.ndarray
+    batter_count: np.ndarray
+    batter_split_elo: np.ndarray      # (n_batters, len(SPLITS))
+    batter_split_count: np.ndarray
+    pitcher_ids: np.ndarray
+    pitcher_elo: np.ndarray
+    pitcher_count: np.ndarray
+    pitcher_split_elo: np.ndarray     # (n_pitchers, len(SPLITS))
+    pitcher_split_count: np.ndarray
+    clipped: int = 0  # overall expectations clipped at 1, same as run_elo
+
+    def _frame(self, role):
+        df = pd.DataFrame({'player_id': getattr(self, f'{role}_ids'), 'elo': getattr(self, f'{role}_elo'),
+                           'count': getattr(self, f'{role}_count')})
+        elo = getattr(self, f'{role}_split_elo')
+        count = getattr(self, f'{role}_split_count')
+        for j, split in enumerate(SPLITS):
+            df[f'elo_{split}'] = elo[:, j]
+            df[f'count_{split}'] = count[:, j]
+        return df
+
+    # wide tables: player_id, elo, count, then elo_<split>/count_<split> for every split
+    def batter_frame(self):
+        return self._frame('batter')
+
+    def pitcher_frame(self):
+        return self._frame('pitcher')
+
+
+def run_elo_splits(pas, batter_splits, pitcher_splits, params=DEFAULT_PARAMS, woba_norm=None):
+    # batter_splits/pitcher_splits come from split_codes and line up with pas
+    state = run_elo(pas, params, woba_norm=woba_norm, splits=(batter_splits, pitcher_splits, len(SPLITS)))
+    return SplitEloState(
+        batter_ids=state.batter_ids,
+        batter_elo=state.batter_elo,
+        batter_count=state.batter_count,
+        batter_split_elo=state.batter_split_elo,
+        batter_split_count=state.batter_split_count,
+        pitcher_ids=state.pitcher_ids,
+        pitcher_elo=state.pitcher_elo,
+        pitcher_count=state.pitcher_count,
+        pitcher_split_elo=state.pitcher_split_elo,
+        pitcher_split_count=state.pitcher_split_count,
+        clipped=state.clipped,
+    )
+
+
+def split_leaderboard(frame, split, min_count=0, player_index=None):
+    # players with at least min_count PAs in the split, best split elo first
+    board = frame[frame[f'count_{split}'] >= min_count]
+    if player_index is not None:
+        board = attach_metadata(board, player_index, ['MLBID', 'MLBNAME', 'TEAM']).drop(columns='MLBID')
+    board = board.sort_values(f'elo_{split}', ascending=False).reset_index(drop=True)
+    board.insert(0, 'rank', np.arange(1, len(board) + 1))
+    return board
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overall plus platoon and home/away ELO in one run")
+    parser.add_argument('--min-count', type=int, default=50, help="PAs in a split to make its leaderboard")
+    parser.add_argument('--top', type=int, default=10, help="leaderboard rows to print per split")
+    args = parser.parse_args()
+
+    params = EloParams()
+    combined_df, pas = load_plate_appearances(strikeout_value=params.strikeout_value,
+                                              columns=PA_COLUMNS + SPLIT_COLUMNS)
+    state = run_elo_splits(pas, *split_codes(combined_df), params)
+    if state.clipped:
+        print(f"HAD TO CLIP {state.clipped} EXPECTATIONS")
+
+    player_index = load_player_index()
+    for role, frame in (('batter', state.batter_frame()), ('pitcher', state.pitcher_frame())):
+        attach_metadata(frame, player_index, ['MLBID', 'MLBNAME', 'TEAM']).drop(columns='MLBID') \
+            .sort_values('elo', ascending=False).to_csv(f'{role}_split_elo_ratings.csv', index=False)
+        for split in SPLITS:
+            board = split_leaderboard(frame, split, args.min_count, player_index)
+            print(f"\n{role}s, {split} (min {args.min_count} PAs)")
+            print(board[['rank', 'MLBNAME', 'TEAM', f'elo_{split}', f'count_{split}', 'elo']].head(args.top).to_string(index=False))
+    print("\nWrote batter_split_elo_ratings.csv and pitcher_split_elo_ratings.csv")
+
+
+if __name__ == '__main__':
+    main()
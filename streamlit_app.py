@@ -3,6 +3,11 @@ import numpy as np
 import streamlit as st
 import plotly.express as px
 
+from app_data import DEFAULT_SEASON, build_from_files, list_seasons, load_app_data, read_rows, season_dir, season_inputs
+from rating_history import HistoryStore, history_mtime
+from search_index import PlayerSearchIndex
+from what_if import DEFAULT_PARAMS, WhatIfEngine, data_available, what_if_params
+
 st.set_page_config(page_title="ELO: Chess-Inspired MLB Rating System", layout="wide", page_icon="⚾")
 
 # Title and subtitle
@@ -18,20 +23,114 @@ with col2:
     </a>
     """, unsafe_allow_html=True)
 
-# Load data
-@st.cache_data
-def load_data():
-    batters = pd.read_csv('improved_batter_elo_ratings_park_factored1.csv')
-    pitchers = pd.read_csv('improved_pitcher_elo_ratings_park_factored1.csv')
-    batters["ELO+"] = batters['elo+2'].round().astype(int)
-    pitchers["ELO+"] = pitchers['elo+2'].round().astype(int)
-    batters["PAs"] = batters['count']
-    pitchers["PAs"] = pitchers['count']
-    batters = batters[['Name', 'TEAM', 'ELO+', 'WRC+', 'PAs', 'is_qualified']]
-    pitchers = pitchers[['Name', 'TEAM', 'ELO+', 'ERA-', 'PAs','is_qualified']]
-    return batters, pitchers
-
-batters, pitchers = load_data()
+# Load data: every derived column, rank and summary table is precomputed by app_data.py
+# (at the end of elo_calculations.py), so a rerun only filters these tables. Only the
+# selected season is loaded, and the caches are bounded so browsing many seasons
+# doesn't keep all of them in memory
+SEASON_CACHE = dict(max_entries=4, ttl=3600)
+
+@st.cache_data(ttl=600)
+def available_seasons():
+    # seasons with precomputed tables, newest first; without any, the csvs in this folder
+    return list_seasons() or [DEFAULT_SEASON]
+
+@st.cache_resource(**SEASON_CACHE)
+def load_data(season):
+    loaded = load_app_data(season_dir(season))
+    return loaded if loaded is not None else build_from_files()
+
+@st.cache_resource(**SEASON_CACHE)
+def load_history_store(season, mtime):
+    # the season's per-PA rating history written by elo_calculations.py, memory-mapped. mtime
+    # is only the cache key: a rerun of elo_calculations.py replaces the files, and the new ones get opened
+    return HistoryStore(season) if mtime is not None else None
+
+@st.cache_resource(**SEASON_CACHE)
+def load_player_labels(season):
+    # {role: {player_id: "Name (TEAM)"}}. players are picked by id, so namesakes stay apart;
+    # namesakes on the same team get their id in the label too
+    labels = {}
+    for role in ('batter', 'pitcher'):
+        df = load_data(season)[0][f'{role}s']
+        label = df['Name'].astype(str) + df['TEAM'].map(lambda team: f" ({team})" if pd.notna(team) else "")
+        shared = label.duplicated(keep=False)
+        label[shared] = label[shared] + " #" + df.loc[shared, 'player_id'].astype(str)
+        labels[role] = dict(zip(df['player_id'].tolist(), label.tolist()))
+    return labels
+
+@st.cache_resource(max_entries=2 * SEASON_CACHE['max_entries'], ttl=SEASON_CACHE['ttl'])
+def load_search_index(season, role):
+    # name/team/PA/qualified indexes over one results table (see search_index.py)
+    tables, _ = load_data(season)
+    return PlayerSearchIndex(tables[role])
+
+@st.cache_resource(max_entries=2, ttl=SEASON_CACHE['ttl'])
+def load_what_if_engine(season):
+    # one engine and result cache (see what_if.py) per season, shared by every session. it
+    # reruns the statcast files elo_calculations.py rated the season from; without any saved
+    # seasons the tables come from this folder's csvs, and so do the statcast files
+    saved = bool(list_seasons())
+    paths = season_inputs(season_dir(season)) if saved else None
+    if (saved and paths is None) or not data_available(paths):
+        return None
+    tables, _ = load_data(season)
+    return WhatIfEngine({'batter': tables['batters']['player_id'].to_numpy(),
+                         'pitcher': tables['pitchers']['player_id'].to_numpy()}, paths=paths)
+
+@st.cache_data(max_entries=256, ttl=SEASON_CACHE['ttl'])
+def load_player_seasons(role, player_id):
+    # one player's rows from every season, without loading any season in full
+    stat = 'WRC+' if role == 'batter' else 'ERA-'
+    rows = []
+    for s in list_seasons():
+        df = read_rows(season_dir(s), f'{role}s', player_id, ['Name', 'TEAM', 'ELO+', stat, 'PAs'])
+        if df is not None and len(df):
+            rows.append(df.head(1).assign(Season=s))
+    if not rows:
+        return None
+    career = pd.concat(rows, ignore_index=True)
+    return career[['Season', 'Name', 'TEAM', 'ELO+', stat, 'PAs']].sort_values('Season')
+
+def show_player(player_ids, role, key):
+    # the selected player's ELO after every plate appearance of the season and their ELO+ in every season
+    labels = load_player_labels(season)[role]
+    player_id = st.selectbox("Select player:", player_ids, format_func=labels.get, key=key)
+    if player_id is None:
+        return
+    name = labels[player_id]
+
+    st.subheader("ELO Trajectory")
+    store = load_history_store(season, history_mtime(season))
+    if store is None:
+        st.info(f"No rating history for {season}. Run elo_calculations.py --season {season} to create it.")
+    else:
+        trajectory = store.trajectory(player_id, role)
+        fig = px.line(trajectory, x='pa_number', y='post', hover_data=['game_date', 'opponent', 'pre'],
+                      labels={'pa_number': 'Plate Appearance', 'post': 'ELO'}, title=f"{name}'s ELO through the season")
+        st.plotly_chart(fig, use_container_width=True)
+
+    if len(seasons) > 1:
+        career = load_player_seasons(role, player_id)
+        if career is not None:
+            st.subheader("Across Seasons")
+            st.dataframe(career, hide_index=True)
+            if len(career) > 1:
+                st.plotly_chart(px.line(career, x='Season', y='ELO+', markers=True, title=f"{name}'s ELO+ by season"),
+                                use_container_width=True)
+
+seasons = available_seasons()
+season = st.selectbox("Season:", seasons) if len(seasons) > 1 else seasons[0]
+tables, info = load_data(season)
+batters, pitchers = tables['batters'], tables['pitchers']
+uncertainty_cols = info['uncertainty_cols']
+sos_cols = info['sos_cols']
+
+def with_error_bars(df):
+    # (data, error_y, error_y_minus) for the ELO+ scatter plots; bootstrap intervals win over RD
+    if 'ELO+ low' in df.columns:
+        data = df.assign(err_plus=df['ELO+ high'] - df['ELO+'], err_minus=df['ELO+'] - df['ELO+ low'])
+        return data, 'err_plus', 'err_minus'
+    return df, ('ELO+ RD' if 'ELO+ RD' in df.columns else None), None
 batters_q = batters[batters['is_qualified'] == True]
 pitchers_q = pitchers[pitchers['is_qualified'] == True]
 
@@ -69,11 +168,14 @@ with tab1:
 
     #show batters2.png
     #st.image("batters2.png")
+    data, error_y, error_y_minus = with_error_bars(batters_q)
     figb = px.scatter(
-        batters_q,
+        data,
         x='WRC+',
         y='ELO+',
         hover_name='Name',
+        error_y=error_y,
+        error_y_minus=error_y_minus,
         title='ELO+ compared to wRC+ in 2025'
     )
     figb.add_shape(
@@ -100,11 +202,14 @@ with tab1:
     #show batters2.png
     #st.image("pitchers2.png")
 
+    data, error_y, error_y_minus = with_error_bars(pitchers_q)
     figp = px.scatter(
-        pitchers_q,
+        data,
         x='ERA-',
         y='ELO+',
         hover_name='Name',
+        error_y=error_y,
+        error_y_minus=error_y_minus,
         title='ELO+ compared to ERA- in 2025'
     )
 
@@ -118,12 +223,8 @@ with tab1:
     st.subheader("Biggest changes when comparing ELO+ to wRC+ and ERA- for qualified players")
     st.write("Next, we will take a look at the ten qualified batters who had the greatest change in ELO+ compared to wRC+.")
 
-    batters_q2 = batters_q.copy()
-    batters_q2['ELO Change'] = batters_q2['ELO+'] - batters_q2['WRC+']
-    batters_q2.drop(columns=['is_qualified'], inplace=True)
-    batters_q2 = batters_q2.drop_duplicates()
-    batters_q2_top = batters_q2.sort_values('ELO Change', ascending=False).reset_index(drop=True).head(10)
-    batters_q2_bottom = batters_q2.sort_values('ELO Change', ascending=True).reset_index(drop=True).head(10)
+    batters_q2_top = tables['batter_changes_top']
+    batters_q2_bottom = tables['batter_changes_bottom']
 
     #display batters_q2_top and batters_q2_bottom next to each other (to the right and left of each other). Add a title as well 
     col1, col2 = st.columns(2)
@@ -139,16 +240,8 @@ with tab1:
     st.write("Now, we do the same for qualified pitchers. However, because ERA- and ELO+ are inversely related, we will look at the top 10 pitchers with the biggest difference in rank order. " \
     "In other words, we rank all pitchers by their ELO+ and ERA- values, and then compare the two rankings.")
 
-    pitchers_q2 = pitchers_q.copy()
-    pitchers_q2 = pitchers_q2.sort_values('ELO+', ascending=False).reset_index(drop=True)
-    pitchers_q2['ELO rank'] = pitchers_q2.index + 1
-    pitchers_q2 = pitchers_q2.sort_values('ERA-', ascending=True).reset_index(drop=True)
-    pitchers_q2['ERA rank'] = pitchers_q2.index + 1
-    pitchers_q2['ELO Ranking Change'] = pitchers_q2['ELO rank'] - pitchers_q2['ERA rank']
-    pitchers_q2.drop(columns=['is_qualified'], inplace=True)
-    pitchers_q2 = pitchers_q2.drop_duplicates()
-    pitchers_q2_top = pitchers_q2.sort_values('ELO Ranking Change', ascending=False).reset_index(drop=True).head(10)
-    pitchers_q2_bottom = pitchers_q2.sort_values('ELO Ranking Change', ascending=True).reset_index(drop=True).head(10)
+    pitchers_q2_top = tables['pitcher_changes_top']
+    pitchers_q2_bottom = tables['pitcher_changes_bottom']
 
     #display batters_q2_top and batters_q2_bottom next to each other (to the right and left of each other). Add a title as well 
     col1, col2 = st.columns(2)
@@ -168,12 +261,10 @@ with tab1:
             does playing on a worse team mean you face tougher competition, which would mean your ELO would \
             be inflated as compared to stats like wRC+ and ERA-?")
 
-    #summarize ELO Change by Team in batters_q2 and pitchers_q2
-    batters_team_summary = batters_q2.groupby('TEAM')['ELO Change'].mean().reset_index()
-    pitchers_team_summary = pitchers_q2.groupby('TEAM')['ELO Ranking Change'].mean().reset_index()
-
-    batters_team_summary = batters_team_summary.sort_values('ELO Change', ascending=False)
-    pitchers_team_summary = pitchers_team_summary.sort_values('ELO Ranking Change', ascending=False)
+    # ELO Change by team for qualified players, plus the opponents each team's players
+    # actually faced (when the rating loop measured it)
+    batters_team_summary = tables['batter_teams']
+    pitchers_team_summary = tables['pitcher_teams']
 
     col1, col2 = st.columns(2)
 
@@ -189,6 +280,10 @@ with tab1:
             more favorably than wRC+) there are only 3 playoff teams (Cincinnati, Milwaukee, and San Diego). This does seem to suggest that better teams \
             may not face as tough of competition, leading to lower ELO values compared to wRC+. On the pitching side of things, this impact is not as great. \
             In fact, the top three teams in ELO Ranking Change are all playoff teams (Chicago Cubs, San Diego, and Detroit)")
+    if sos_cols:
+        st.write("Avg Opp ELO answers the question directly: it is the average ELO of the opposing pitchers (for hitters) or hitters \
+                (for pitchers) at the moment of each plate appearance, weighted by plate appearances across all of the team's players. \
+                Avg Park Factor is the average park factor of those plate appearances.")
 
     st.write("---")
     st.subheader("Pittsburgh Pirates Hitters")
@@ -198,15 +293,10 @@ with tab1:
     # give a dropdown selector to either filter "qualified" or "all"
     filter_option = st.selectbox("Select filter:", ["All Hitters", "Qualified Hitters"])
 
-    pirates_batters = batters[batters['TEAM'] == 'PIT']
+    pirates_batters = tables['pirates_batters']
     if filter_option == "Qualified Hitters":
         pirates_batters = pirates_batters[pirates_batters['is_qualified'] == True]
-
-
-
-    pirates_batters['ELO Change'] = pirates_batters['ELO+'] - pirates_batters['WRC+']
-    pirates_batters = pirates_batters[['Name', 'TEAM', 'ELO+', 'WRC+', 'ELO Change', 'PAs', 'is_qualified']]
-    pirates_batters = pirates_batters.sort_values('PAs', ascending=False)
+    pirates_batters = pirates_batters[['Name', 'TEAM', 'ELO+'] + uncertainty_cols + ['WRC+', 'ELO Change', 'PAs'] + sos_cols + ['is_qualified']]
     st.dataframe(pirates_batters, hide_index=True)
 
     st.write("Despite being a few at bats from qualifying, Tommy Pham does have an above average ELO+ of 104, compared to his below average wRC+ of 95. \
@@ -223,39 +313,30 @@ with tab2:
 
         
         # Display batter table
-        st.subheader("2025 Batter Results")
+        st.subheader(f"{season} Batter Results")
 
         
-        batters_for_display = batters.copy()
-        batters_for_display['ELO Change'] = batters_for_display['ELO+'] - batters_for_display['WRC+']
-        batters_for_display = batters_for_display[['Name', 'TEAM', 'ELO+', 'WRC+', 'ELO Change', 'PAs', 'is_qualified']]
-        batters_for_display = batters_for_display.sort_values('ELO+', ascending=False).reset_index(drop=True)
+        # already sorted by ELO+
+        batters_for_display = batters[['Name', 'TEAM', 'ELO+'] + uncertainty_cols + ['WRC+', 'ELO Change', 'PAs'] + sos_cols + ['is_qualified']]
     
 
+        search = load_search_index(season, 'batters')
         qual = st.selectbox("Select qualified status:", ["Qualified", "All"])
-        team_list = sorted([t for t in batters_for_display['TEAM'].unique() if pd.notna(t)])
-        team_choice = st.selectbox("Select team:", [""] + team_list)
+        team_choice = st.selectbox("Select team:", [""] + search.team_list())
 
         search_name = st.text_input("Search player by name:")
 
-        if search_name != "":
-            batters_for_display = batters_for_display[batters_for_display['Name'].str.contains(search_name, case=False)]
-
         #pa limit
         pa_limit = st.slider("Select PA limit:", 0, 700, 100)
-        batters_for_display = batters_for_display[batters_for_display['PAs'] >= pa_limit]
-
-        if qual == "Qualified":
-            batters_for_display = batters_for_display[batters_for_display['is_qualified'] == True]
-
-        if team_choice != "":
-            batters_for_display = batters_for_display[batters_for_display['TEAM'] == team_choice]
 
-        if pa_limit > 0:
-            batters_for_display = batters_for_display[batters_for_display['PAs'] >= pa_limit]
+        # all filters at once, as an intersection of the index's row ids
+        rows = search.select(search_name, team_choice, pa_limit, qual == "Qualified")
+        batters_for_display = batters_for_display.iloc[rows]
 
         st.dataframe(batters_for_display.reset_index(drop=True), use_container_width=True)
 
+        show_player(batters['player_id'].iloc[rows].tolist(), 'batter', key="trajectory_batter")
+
 
         #display_cols = ['Name', 'TEAM', 'ELO+', 'WRC+', 'elo', 'count']
         #batter_display = batters[[c for c in display_cols if c in batters.columns]].sort_values('ELO+', ascending=False)
@@ -264,38 +345,27 @@ with tab2:
     else:  # Pitcher Results
 
         # Display pitcher table
-        st.subheader("2025 Pitcher Results")
+        st.subheader(f"{season} Pitcher Results")
         
-        pitchers_for_display = pitchers.copy()
-        pitchers_for_display = pitchers_for_display.sort_values('ELO+', ascending=False).reset_index(drop=True)
-        pitchers_for_display['ELO rank'] = pitchers_for_display.index + 1
-        pitchers_for_display = pitchers_for_display.sort_values('ERA-', ascending=True).reset_index(drop=True)
-        pitchers_for_display['ERA rank'] = pitchers_for_display.index + 1
-        pitchers_for_display['ELO Ranking Change'] = pitchers_for_display['ELO rank'] - pitchers_for_display['ERA rank']
-        pitchers_for_display = pitchers_for_display[['Name', 'TEAM', 'ELO+', 'ERA-', 'ELO Ranking Change', 'PAs', 'is_qualified']]
-        pitchers_for_display = pitchers_for_display.sort_values('ELO+', ascending=False).reset_index(drop=True)
+        # already sorted by ELO+, ranks over all pitchers
+        pitchers_for_display = pitchers[['Name', 'TEAM', 'ELO+'] + uncertainty_cols + ['ERA-', 'ELO Ranking Change', 'PAs'] + sos_cols + ['is_qualified']]
         
+        search_p = load_search_index(season, 'pitchers')
         qual_p = st.selectbox("Select qualified status:", ["Qualified", "All"], key="qual_pitcher")
-        team_list_p = sorted([t for t in pitchers_for_display['TEAM'].unique() if pd.notna(t)])
-        team_choice_p = st.selectbox("Select team:", [""] + team_list_p, key="team_pitcher")
+        team_choice_p = st.selectbox("Select team:", [""] + search_p.team_list(), key="team_pitcher")
 
         search_name_p = st.text_input("Search player by name:")
 
-        if search_name_p != "":
-            pitchers_for_display = pitchers_for_display[pitchers_for_display['Name'].str.contains(search_name_p, case=False)]
-
         # pa limit
         pa_limit_p = st.slider("Select IP limit:", 0, 300, 50, key="pa_pitcher")
-        pitchers_for_display = pitchers_for_display[pitchers_for_display['PAs'] >= pa_limit_p]
-        
-        if qual_p == "Qualified":
-            pitchers_for_display = pitchers_for_display[pitchers_for_display['is_qualified'] == True]
-        
-        if team_choice_p != "":
-            pitchers_for_display = pitchers_for_display[pitchers_for_display['TEAM'] == team_choice_p]
+
+        rows_p = search_p.select(search_name_p, team_choice_p, pa_limit_p, qual_p == "Qualified")
+        pitchers_for_display = pitchers_for_display.iloc[rows_p]
         
         st.dataframe(pitchers_for_display.reset_index(drop=True), use_container_width=True)
 
+        show_player(pitchers['player_id'].iloc[rows_p].tolist(), 'pitcher', key="trajectory_pitcher")
+
 # ============ TAB 3: METHODOLOGY ============
 with tab3:
     st.header("Methodology")
@@ -336,6 +406,50 @@ with tab3:
     
     st.write("Finally, one limitation of this analysis is the equal initialization of players. That means that a home run against Tarik Skubal in the first week of the season would not be as valuable as the same home run in the last week of the season, as Skubal's elite status was not yet reflected by his ELO. There are a few potential methods to fix this. One would be to simply include more data, and track ELO changes for multiple years in a row. However, this still leads to an issue, as initializing ELO for rookies is still uncertain. Another option would be to use a projections tools, such as ZiPS, to initialize ELO. This is still imperfect, as this means that the season's results will be biased by the projections. One way to get around this would potentially be to track two different versions of ELO for one player. One version would be initialized at the start of the season to 1500, and would reflect the player's 2025 results. Another would be initialized using ZiPS, and would just be used to calculate the opponent's ELO. I would love to explore this option, but historic ZiPS data on [Fangraphs](https://www.fangraphs.com/projections?type=zips_2025&stats=bat&pos=all&team=0&players=0&lg=all&z=1769658349&sortcol=&sortdir=&pageitems=30&statgroup=dashboard&fantasypreset=dashboard) is behind a paywall, and the approach outlined above would rely on having access to ZiPS projections for the 2025 season.")
     
+    if 'batch_batters' in tables:
+        batch_comparison = (tables['batch_batters'], tables['batch_pitchers'])
+        st.subheader("Order-Independent (Batch) Ratings")
+        st.write("To see how much the order of the season matters, every rating was also fit at once from the whole season (a Bradley-Terry model on the same scaled values, with the park factor included), so a home run against Skubal counts the same in April as in September. Points far from the dotted line are players whose ELO+ depends the most on when they faced whom.")
+        col1, col2 = st.columns(2)
+        for col, df, label in ((col1, batch_comparison[0], "hitters"), (col2, batch_comparison[1], "pitchers")):
+            with col:
+                qualified = df[df['is_qualified'] == True]
+                fig = px.scatter(qualified, x='ELO+', y='Batch ELO+', hover_name='Name',
+                                 title=f'Sequential vs batch ELO+, qualified {label}')
+                top = max(qualified['ELO+'].max(), qualified['Batch ELO+'].max())
+                fig.add_shape(type="line", x0=0, y0=0, x1=top, y1=top, line=dict(color="gray", width=2, dash="dash"))
+                st.plotly_chart(fig, use_container_width=True)
+
+    st.subheader("What If?")
+    st.write("The K factors, PA threshold and strikeout value above are choices, not facts. Move the sliders to rerun the whole season with other values and see how the ELO+ of qualified players changes. Results for settings someone already tried come back instantly.")
+    engine = load_what_if_engine(season)
+    if engine is None:
+        st.info(f"The what-if panel needs the Statcast plate appearance files {season} was rated from. "
+                f"Run elo_calculations.py --season {season} in the folder with them.")
+    else:
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            k_high = st.slider("K factor before the threshold:", 5, 80, int(DEFAULT_PARAMS.k_high), step=5)
+        with col2:
+            k_low = st.slider("K factor after the threshold:", 5, 80, int(DEFAULT_PARAMS.k_low), step=5)
+        with col3:
+            pa_threshold = st.slider("PA threshold:", 0, 400, DEFAULT_PARAMS.pa_threshold, step=10)
+        with col4:
+            strikeout_value = st.slider("Strikeout value:", -2.0, 0.0, DEFAULT_PARAMS.strikeout_value, step=0.1)
+        use_park_factor = st.checkbox("Use park factors", value=DEFAULT_PARAMS.use_park_factor)
+
+        with st.spinner("Rerunning the season..."):
+            what_if = engine.ratings(what_if_params(k_high, k_low, pa_threshold, strikeout_value, use_park_factor))
+        col1, col2 = st.columns(2)
+        for col, role, df, label in ((col1, 'batter', batters_q, "Hitters"), (col2, 'pitcher', pitchers_q, "Pitchers")):
+            with col:
+                st.subheader(f"Qualified {label}")
+                rerun = df[['player_id', 'Name', 'TEAM', 'ELO+']].merge(what_if[role][['player_id', 'elo+2']], on='player_id')
+                rerun['What-if ELO+'] = rerun['elo+2'].round().astype(int)
+                rerun['Difference'] = rerun['What-if ELO+'] - rerun['ELO+']
+                rerun = rerun.sort_values('What-if ELO+', ascending=False)
+                st.dataframe(rerun[['Name', 'TEAM', 'ELO+', 'What-if ELO+', 'Difference']], hide_index=True)
+
     st.write("Please do not hesitate to reach out with any questions, concerns, feedback, or thoughts. My email is malcolm.t.gaynor@gmail.com")
 
 
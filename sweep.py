@@ -0,0 +1,158 @@
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, fields
+
+import numpy as np
+import pandas as pd
+
+from elo_engine import EloParams, PlateAppearances, normalize_woba, encode_plate_appearances, \
+    preprocess_plate_appearances, run_elo
+from ingest import read_park_factors, read_statcast_files
+from player_index import BATTERS_PER_INNING, load_player_index, resolve_names
+from shared_arrays import attach_arrays, release, share_arrays
+
+
+# Hyperparameter sweep over the hard-coded choices in elo_calculations.py
+# (k factors, PA threshold, strikeout woba_value, starting elo).
+# The preprocessed plate-appearance arrays are put in shared memory once; every
+# worker process attaches to the same blocks read-only instead of getting its own
+# pickled copy. Each configuration comes back as its final ratings plus the
+# correlation with wRC+ / ERA- for qualified players, all in one long table.
+
+PARAM_COLUMNS = [f.name for f in fields(EloParams)]
+
+
+def param_grid(**values):
+    # every combination of the given EloParams fields, e.g. param_grid(k_high=[30, 40], k_low=[10, 20])
+    names = list(values)
+    return [EloParams(**dict(zip(names, combo))) for combo in itertools.product(*values.values())]
+
+
+def reference_targets(player_ids, counts, stats_df, stat_col, min_col, min_value, player_index, volume_scale=1.0):
+    # wRC+/ERA- and qualified flag per player code, with the leaderboard rows resolved to
+    # MLBIDs the same way elo_calculations.enrich does (see player_index.resolve_names), so
+    # the sweep scores against the same matched players. unmatched players get NaN
+    stats_df = stats_df.dropna()
+    resolved, _ = resolve_names(stats_df, player_index, player_ids, counts=counts, volume_col=min_col,
+                                volume_scale=volume_scale)
+    stats = resolved.set_index('player_id')
+    stat = stats[stat_col].reindex(player_ids).to_numpy(dtype=np.float64)
+    qualified = (stats[min_col].reindex(player_ids) >= min_value).to_numpy()
+    return stat, qualified
+
+
+# per-worker globals, filled in by _init_worker
+_worker = {}
+
+
+def _init_worker(specs, small):
+    _worker.update(attach_arrays(specs))
+    _worker.update(small)
+    _worker['pas'] = PlateAppearances(
+        batter=_worker['batter'], pitcher=_worker['pitcher'], home=_worker['home'],
+        woba_norm=None, game_date=None, at_bat_number=None,
+        batter_ids=small['batter_ids'], pitcher_ids=small['pitcher_ids'],
+        teams=small['teams'], team_park_factor=small['team_park_factor'],
+    )
+
+
+def _corr(elo, stat, qualified):
+    mask = qualified & ~np.isnan(stat)
+    if mask.sum() < 3:
+        return np.nan
+    return float(np.corrcoef(elo[mask], stat[mask])[0, 1])
+
+
+def _run_config(config_id, params):
+    woba_norm, _ = normalize_woba(_worker['woba_value'], _worker['is_strikeout'], params.strikeout_value)
+    state = run_elo(_worker['pas'], params, woba_norm=woba_norm)
+    return config_id, state.batter_elo, state.batter_count, state.pitcher_elo, state.pitcher_count, {
+        'wrc_plus_corr': _corr(state.batter_elo, _worker['wrc_plus'], _worker['batter_qualified']),
+        # ERA- is lower-is-better, so a good rating shows up as a negative correlation
+        'era_minus_corr': _corr(state.pitcher_elo, _worker['era_minus'], _worker['pitcher_qualified']),
+        'clipped': state.clipped,
+    }
+
+
+def run_sweep(combined_df, park_factors_df, grid, wrc_df=None, era_df=None, player_index=None, workers=None):
+    # combined_df is the sorted plate-appearance table from read_statcast_files().
+    # returns one row per (configuration, player) with the parameters, the player's final
+    # elo/count and the configuration's wRC+/ERA- correlations
+    base = preprocess_plate_appearances(combined_df)
+    pas = encode_plate_appearances(base, park_factors_df)
+    raw_woba = combined_df['woba_value'].fillna(0).to_numpy(dtype=np.float64)
+    is_strikeout = (combined_df['events'] == 'strikeout').to_numpy()
+
+    if player_index is None:
+        player_index = load_player_index()
+    if wrc_df is None:
+        wrc_df = pd.read_csv('wrc_plus.csv')
+    if era_df is None:
+        era_df = pd.read_csv('era_minus.csv')
+    # PA counts don't depend on the parameters, they only break ties between namesakes
+    batter_counts = np.bincount(pas.batter, minlength=len(pas.batter_ids))
+    pitcher_counts = np.bincount(pas.pitcher, minlength=len(pas.pitcher_ids))
+    wrc_plus, batter_qualified = reference_targets(pas.batter_ids, batter_counts, wrc_df, 'WRC+', 'PA', 502,
+                                                   player_index)
+    era_minus, pitcher_qualified = reference_targets(pas.pitcher_ids, pitcher_counts, era_df, 'ERA-', 'IP', 162,
+                                                     player_index, BATTERS_PER_INNING)
+
+    blocks, specs = share_arrays({'batter': pas.batter, 'pitcher': pas.pitcher, 'home': pas.home,
+                                  'woba_value': raw_woba, 'is_strikeout': is_strikeout})
+    # everything per-player or per-team is tiny, so it just rides along with the initializer
+    small = {'batter_ids': pas.batter_ids, 'pitcher_ids': pas.pitcher_ids, 'teams': pas.teams,
+             'team_park_factor': pas.team_park_factor, 'wrc_plus': wrc_plus, 'era_minus': era_minus,
+             'batter_qualified': batter_qualified, 'pitcher_qualified': pitcher_qualified}
+
+    frames = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                 initializer=_init_worker, initargs=(specs, small)) as pool:
+            futures = [pool.submit(_run_config, i, params) for i, params in enumerate(grid)]
+            for future in futures:
+                config_id, b_elo, b_count, p_elo, p_count, summary = future.result()
+                meta = {'config_id': config_id, **asdict(grid[config_id]), **summary}
+                for role, ids, elo, count in (('batter', pas.batter_ids, b_elo, b_count),
+                                              ('pitcher', pas.pitcher_ids, p_elo, p_count)):
+                    frame = pd.DataFrame({'role': role, 'player_id': ids, 'elo': elo, 'count': count})
+                    frames.append(frame.assign(**meta))
+    finally:
+        release(blocks)
+
+    results = pd.concat(frames, ignore_index=True)
+    leading = ['config_id'] + PARAM_COLUMNS + ['wrc_plus_corr', 'era_minus_corr', 'clipped']
+    return results[leading + ['role', 'player_id', 'elo', 'count']]
+
+
+def sweep_summary(results):
+    # one row per configuration, best wRC+ correlation first
+    summary = results.drop_duplicates('config_id')
+    return summary.drop(columns=['role', 'player_id', 'elo', 'count']).sort_values(
+        'wrc_plus_corr', ascending=False).reset_index(drop=True)
+
+
+def main():
+    defaults = EloParams()
+    parser = argparse.ArgumentParser(description="Sweep ELO hyperparameters over a process pool")
+    parser.add_argument('--k-high', type=float, nargs='+', default=[defaults.k_high])
+    parser.add_argument('--k-low', type=float, nargs='+', default=[defaults.k_low])
+    parser.add_argument('--pa-threshold', type=int, nargs='+', default=[defaults.pa_threshold])
+    parser.add_argument('--strikeout-value', type=float, nargs='+', default=[defaults.strikeout_value])
+    parser.add_argument('--start-elo', type=float, nargs='+', default=[defaults.start_elo])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--data-dir', default='.')
+    parser.add_argument('--out', default='elo_sweep_results.csv')
+    args = parser.parse_args()
+
+    grid = param_grid(k_high=args.k_high, k_low=args.k_low, pa_threshold=args.pa_threshold,
+                      strikeout_value=args.strikeout_value, start_elo=args.start_elo)
+    print(f"Sweeping {len(grid)} configurations")
+    results = run_sweep(read_statcast_files(args.data_dir), read_park_factors(), grid, workers=args.workers)
+    results.to_csv(args.out, index=False)
+    print(sweep_summary(results).head(20).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
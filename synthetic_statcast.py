@@ -0,0 +1,228 @@
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# Synthetic pitch-level statcast files shaped like the monthly savant exports that
+# elo_calculations.py reads (march1.csv ... sep6.csv), for benchmark.py and for anybody
+# without the raw files. Nothing here is real data: 30 teams of 22 batters and 28
+# pitchers play a ~162 game schedule (starters go ~22 batters, relievers ~5), events
+# follow the league event mix tilted by batter minus pitcher talent, every plate
+# appearance is 1-8 pitches with the event on the last one, and the ~75 columns the
+# pipeline never reads are filled with noise so the files are as wide as the real ones.
+# Player ids come from the committed results csvs first, so the name/wRC+/ERA- merges
+# find matches like they do on the real data.
+
+MONTHS = ['march', 'april', 'may', 'june', 'july', 'aug', 'sep']
+FILES_PER_MONTH = 6
+
+# (event, probability, woba_value, is batted ball)
+EVENT_MIX = [
+    ('strikeout', 0.222, 0.0, False),
+    ('field_out', 0.380, 0.0, True),
+    ('force_out', 0.020, 0.0, True),
+    ('grounded_into_double_play', 0.018, 0.0, True),
+    ('sac_fly', 0.007, 0.0, True),
+    ('fielders_choice_out', 0.003, 0.0, True),
+    ('field_error', 0.007, 0.9, True),
+    ('sac_bunt', 0.002, 0.0, True),
+    ('single', 0.140, 0.9, True),
+    ('double', 0.043, 1.25, True),
+    ('triple', 0.004, 1.6, True),
+    ('home_run', 0.030, 2.0, True),
+    ('walk', 0.083, 0.7, False),
+    ('intent_walk', 0.004, 0.0, False),
+    ('hit_by_pitch', 0.011, 0.7, False),
+    ('catcher_interf', 0.001, 0.7, False),
+    ('caught_stealing_2b', 0.002, np.nan, False),
+    ('truncated_pa', 0.002, 0.0, False),
+]
+
+# columns a real savant export carries but the pipeline never reads
+FILLER_COLUMNS = [
+    'pitch_type', 'release_speed', 'release_pos_x', 'release_pos_z', 'player_name',
+    'description', 'spin_dir', 'spin_rate_deprecated', 'break_angle_deprecated',
+    'break_length_deprecated', 'zone', 'des', 'game_type', 'type', 'hit_location',
+    'bb_type', 'balls', 'strikes', 'game_year', 'pfx_x', 'pfx_z', 'plate_x', 'plate_z',
+    'on_3b', 'on_2b', 'on_1b', 'outs_when_up', 'inning', 'hc_x', 'hc_y',
+    'tfs_deprecated', 'tfs_zulu_deprecated', 'umpire', 'sv_id', 'vx0', 'vy0', 'vz0',
+    'ax', 'ay', 'az', 'sz_top', 'sz_bot', 'hit_distance_sc', 'launch_speed',
+    'launch_angle', 'effective_speed', 'release_spin_rate', 'release_extension',
+    'fielder_2', 'fielder_3', 'fielder_4', 'fielder_5', 'fielder_6', 'fielder_7',
+    'fielder_8', 'fielder_9', 'release_pos_y', 'babip_value', 'iso_value',
+    'launch_speed_angle', 'pitch_number', 'pitch_name', 'home_score', 'away_score',
+    'bat_score', 'fld_score', 'post_away_score', 'post_home_score', 'post_bat_score',
+    'post_fld_score', 'if_fielding_alignment', 'of_fielding_alignment', 'spin_axis',
+    'delta_home_win_exp', 'delta_run_exp', 'bat_speed', 'swing_length',
+]
+
+
+def _player_ids(kind, n, rng):
+    # real ids first (so merges behave like the real run), then made-up ones
+    results_file = f'improved_{kind}_elo_ratings_park_factored1.csv'
+    ids = []
+    if os.path.exists(results_file):
+        ids = pd.read_csv(results_file, usecols=['player_id'])['player_id'].drop_duplicates().tolist()
+    rng.shuffle(ids)
+    ids = ids[:n]
+    offset = 900000 if kind == 'batter' else 950000
+    ids += list(range(offset, offset + n - len(ids)))
+    return np.array(ids, dtype=np.int64)
+
+
+def _schedule(year, teams, rng, game_fraction):
+    # one row per game: (date, home, away). roughly 162 games per team
+    days = pd.date_range(f'{year}-03-27', f'{year}-09-28', freq='D')
+    games = []
+    n_teams = len(teams)
+    for day in days:
+        order = rng.permutation(n_teams)
+        for i in range(0, n_teams - 1, 2):
+            # ~13 of the 15 possible games happen on a given day
+            if rng.random() < 0.87 * game_fraction:
+                games.append((day, order[i], order[i + 1]))
+    return games
+
+
+def generate_season(year=2025, scale=1.0, seed=0, batters_per_team=22, pitchers_per_team=28,
+                    teams=None, batter_ids=None, pitcher_ids=None):
+    # returns one pitch-level dataframe for a season. scale < 1 thins out the schedule
+    rng = np.random.default_rng(seed)
+    if teams is None:
+        teams = pd.read_csv('park_factors.csv')['Team'].tolist()
+    n_teams = len(teams)
+    if batter_ids is None:
+        batter_ids = _player_ids('batter', n_teams * batters_per_team, rng)
+    if pitcher_ids is None:
+        pitcher_ids = _player_ids('pitcher', n_teams * pitchers_per_team, rng)
+    team_batters = np.array(batter_ids).reshape(n_teams, -1)
+    team_pitchers = np.array(pitcher_ids).reshape(n_teams, -1)
+    batter_talent = dict(zip(batter_ids, rng.normal(0, 0.35, len(batter_ids))))
+    pitcher_talent = dict(zip(pitcher_ids, rng.normal(0, 0.35, len(pitcher_ids))))
+    stand = dict(zip(batter_ids, rng.choice(['R', 'L'], len(batter_ids), p=[0.6, 0.4])))
+    throws = dict(zip(pitcher_ids, rng.choice(['R', 'L'], len(pitcher_ids), p=[0.72, 0.28])))
+
+    rows = {'game_pk': [], 'game_date': [], 'home_team': [], 'away_team': [], 'at_bat_number': [],
+            'batter': [], 'pitcher': [], 'inning_topbot': []}
+    game_pk = year * 1000000
+    for day, home, away in _schedule(year, teams, rng, min(scale, 1.0)):
+        game_pk += 1
+        # batting order: 9 of the team's position players, mostly the regulars
+        lineups = {}
+        for team in (home, away):
+            weights = np.linspace(3.0, 0.2, team_batters.shape[1])
+            lineups[team] = rng.choice(team_batters[team], 9, replace=False, p=weights / weights.sum())
+        slot = {home: 0, away: 0}
+        faced = {home: 0, away: 0}
+        staff = {team: [team_pitchers[team][rng.integers(0, 5)]] for team in (home, away)}
+        at_bat = 0
+        for half in range(18):
+            batting, fielding = (away, home) if half % 2 == 0 else (home, away)
+            for _ in range(3 + rng.poisson(1.2)):
+                at_bat += 1
+                # pull the starter after ~22 batters, relievers go ~5 batters
+                if faced[fielding] >= (22 if len(staff[fielding]) == 1 else 5):
+                    staff[fielding].append(team_pitchers[fielding][rng.integers(5, team_pitchers.shape[1])])
+                    faced[fielding] = 0
+                faced[fielding] += 1
+                rows['game_pk'].append(game_pk)
+                rows['game_date'].append(day)
+                rows['home_team'].append(teams[home])
+                rows['away_team'].append(teams[away])
+                rows['at_bat_number'].append(at_bat)
+                rows['batter'].append(lineups[batting][slot[batting] % 9])
+                rows['pitcher'].append(staff[fielding][-1])
+                rows['inning_topbot'].append('Top' if half % 2 == 0 else 'Bot')
+                slot[batting] += 1
+
+    pa = pd.DataFrame(rows)
+    n = len(pa)
+
+    # outcome: shift the hit/out odds by batter minus pitcher talent
+    names = [e[0] for e in EVENT_MIX]
+    base = np.array([e[1] for e in EVENT_MIX])
+    base = base / base.sum()
+    woba = np.array([e[2] for e in EVENT_MIX])
+    batted = np.array([e[3] for e in EVENT_MIX])
+    edge = pa['batter'].map(batter_talent).to_numpy() - pa['pitcher'].map(pitcher_talent).to_numpy()
+    good = np.nan_to_num(woba) > 0
+    probs = np.where(good, base, 0)[None, :] * np.exp(edge)[:, None] + np.where(good, 0, base)[None, :]
+    probs /= probs.sum(axis=1, keepdims=True)
+    event_idx = (probs.cumsum(axis=1) > rng.random(n)[:, None]).argmax(axis=1)
+
+    pa['events'] = np.array(names, dtype=object)[event_idx]
+    pa['woba_value'] = woba[event_idx]
+    pa['woba_denom'] = np.where(np.isnan(woba[event_idx]), np.nan, 1.0)
+    is_batted = batted[event_idx]
+    xba = np.clip(rng.beta(2, 5, n) + 0.25 * np.nan_to_num(woba[event_idx]), 0, 1)
+    pa['estimated_ba_using_speedangle'] = np.where(is_batted, xba.round(3), np.nan)
+    pa['estimated_woba_using_speedangle'] = np.where(is_batted, (xba * 1.25).round(3), np.nan)
+    pa['estimated_slg_using_speedangle'] = np.where(is_batted, (xba * 1.7).round(3), np.nan)
+    pa['stand'] = pa['batter'].map(stand)
+    pa['p_throws'] = pa['pitcher'].map(throws)
+
+    # pitch level: 1-8 pitches per pa, only the last one carries the event
+    n_pitches = np.clip(rng.poisson(2.9, n) + 1, 1, 8)
+    pitches = pa.loc[pa.index.repeat(n_pitches)].reset_index(drop=True)
+    pitch_number = np.concatenate([np.arange(1, k + 1) for k in n_pitches]) if n else np.array([], dtype=int)
+    last = pitch_number == np.repeat(n_pitches, n_pitches)
+    for col in ['events', 'woba_value', 'woba_denom', 'estimated_ba_using_speedangle',
+                'estimated_woba_using_speedangle', 'estimated_slg_using_speedangle']:
+        pitches.loc[~last, col] = np.nan
+    for i, col in enumerate(FILLER_COLUMNS):
+        if col == 'pitch_number':
+            pitches[col] = pitch_number
+        elif i % 3 == 0:
+            pitches[col] = rng.normal(0, 1, len(pitches)).round(2)
+        else:
+            pitches[col] = rng.integers(0, 100, len(pitches))
+
+    # savant exports are newest first within a file
+    return pitches.sort_values(['game_date', 'game_pk', 'at_bat_number', 'pitch_number'],
+                               ascending=[False, True, False, False]).reset_index(drop=True)
+
+
+def write_monthly_files(pitches, out_dir, overlap_days=1):
+    # split a season into the {month}{number}.csv layout. consecutive files overlap
+    # by a day, like hand-downloaded savant searches tend to
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    dates = pd.to_datetime(pitches['game_date'])
+    for m, month in enumerate(MONTHS):
+        month_number = m + 3
+        in_month = pitches[dates.dt.month == month_number]
+        if month == 'sep':
+            in_month = pitches[dates.dt.month >= month_number]
+        if in_month.empty:
+            continue
+        month_days = np.sort(pd.to_datetime(in_month['game_date']).unique())
+        chunks = np.array_split(month_days, min(FILES_PER_MONTH, len(month_days)))
+        for i, chunk in enumerate(chunks):
+            days = set(chunk)
+            if overlap_days and i > 0:
+                days |= set(chunks[i - 1][-overlap_days:])
+            part = in_month[pd.to_datetime(in_month['game_date']).isin(days)].copy()
+            part['game_date'] = pd.to_datetime(part['game_date']).dt.strftime('%Y-%m-%d')
+            path = os.path.join(out_dir, f'{month}{i + 1}.csv')
+            part.to_csv(path, index=False)
+            written.append(path)
+    return written
+
+
+def generate(out_dir, scale=1.0, seed=0, first_year=2025):
+    # scale 1 = one season of pas, scale 20 = twenty seasons (a fraction thins out the last
+    # one). every season goes to out_dir/<year>/; returns {year: [paths]}
+    n_seasons = max(1, math.ceil(scale))
+    written = {}
+    rng = np.random.default_rng(seed)
+    n_teams = len(pd.read_csv('park_factors.csv'))
+    batter_ids = _player_ids('batter', n_teams * 22, rng)
+    pitcher_ids = _player_ids('pitcher', n_teams * 28, rng)
+    for s in range(n_seasons):
+        year = first_year + s
+        season_scale = min(1.0, scale - s) if scale > s else 1.0
+        pitches = generate_season(year, season_scale, seed + s, batter_ids=batter_ids, pitcher_ids=pitcher_ids)
+        written[year] = write_monthly_files(pitches, os.path.join(out_dir, str(year)))
+    return written
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from elo_engine import encode_plate_appearances, preprocess_plate_appearances  # noqa: E402
+from ingest import PA_COLUMNS, ingest_statcast, read_park_factors  # noqa: E402
+from synthetic_statcast import generate_season, write_monthly_files  # noqa: E402
+
+
+# Small synthetic seasons (see synthetic_statcast.py) shared by the tests. Everything the
+# generator would read from the working directory is passed in, so the tests run from any
+# folder, and the same made-up player ids play in every season so the chain tests carry
+# players over.
+
+PARK_FACTORS = os.path.join(REPO, 'park_factors.csv')
+TEAMS = pd.read_csv(PARK_FACTORS)['Team'].tolist()
+BATTER_IDS = np.arange(900000, 900000 + 22 * len(TEAMS))
+PITCHER_IDS = np.arange(950000, 950000 + 28 * len(TEAMS))
+SCALE = 0.05
+
+
+def season_pitches(year, seed):
+    return generate_season(year, SCALE, seed, teams=TEAMS, batter_ids=BATTER_IDS, pitcher_ids=PITCHER_IDS)
+
+
+def write_csv(pitches, path):
+    # one file holding pitches, with game_date written the way savant exports it
+    pitches.assign(game_date=pd.to_datetime(pitches['game_date']).dt.strftime('%Y-%m-%d')).to_csv(path, index=False)
+    return path
+
+
+def plate_appearances(paths, columns=PA_COLUMNS):
+    # (combined_df, PlateAppearances) the way elo_calculations.py builds them
+    combined_df, _ = ingest_statcast(paths, columns=columns)
+    combined_df = preprocess_plate_appearances(combined_df)
+    return combined_df, encode_plate_appearances(combined_df, read_park_factors(PARK_FACTORS))
+
+
+@pytest.fixture(scope='session')
+def pitches():
+    return season_pitches(2025, 0)
+
+
+@pytest.fixture(scope='session')
+def season_files(pitches, tmp_path_factory):
+    # the season as monthly files (march1.csv ... sep6.csv), in delivery order
+    return write_monthly_files(pitches, str(tmp_path_factory.mktemp('season')))
+
+
+@pytest.fixture(scope='session')
+def season(season_files):
+    return plate_appearances(season_files)
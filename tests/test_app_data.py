@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app_data import build_from_files, compact, list_seasons, load_app_data, read_rows, save_app_data, season_dir, \
+    season_inputs
+from conftest import REPO
+
+INFO = {'uncertainty_cols': ['ELO+ low', 'ELO+ high'], 'sos_cols': []}
+
+
+@pytest.fixture
+def table():
+    # every kind of column the app tables carry, with missing values where they can have them
+    return compact(pd.DataFrame({
+        'player_id': np.array([660271, 592450, 605141, 669257], dtype=np.int64),
+        'Name': ['Shohei Ohtani', 'Aaron Judge', 'Mookie Betts', 'Will Smith'],
+        'TEAM': ['LAD', 'NYY', None, 'LAD'],
+        'ELO+': [131.5, 140.25, np.nan, 101.0],
+        'Rank Change': pd.array([3, pd.NA, -12, 0], dtype='Int64'),
+        'is_qualified': [True, True, False, True],
+        'PAs': [731, 704, 12, 520],
+    }))
+
+
+def test_round_trip(table, tmp_path):
+    directory = season_dir('2025', str(tmp_path))
+    save_app_data({'batters': table, 'empty': table.iloc[:0]}, INFO, directory)
+    tables, info = load_app_data(directory)
+
+    assert info == INFO
+    assert isinstance(tables['batters']['TEAM'].dtype, pd.CategoricalDtype)
+    # Int64 downcast by compact, still nullable
+    assert tables['batters']['Rank Change'].dtype == table['Rank Change'].dtype == 'Int8'
+    assert tables['batters']['Rank Change'].isna().tolist() == [False, True, False, False]
+    # the loaded columns are memory-mapped, copy() makes them plain arrays to compare
+    pd.testing.assert_frame_equal(tables['batters'].copy(), table)
+    pd.testing.assert_frame_equal(tables['empty'].copy(), table.iloc[:0])
+
+
+def test_read_rows(table, tmp_path):
+    directory = season_dir('2025', str(tmp_path))
+    save_app_data({'batters': table}, INFO, directory)
+    rows = read_rows(directory, 'batters', 592450, ['Name', 'TEAM', 'Rank Change', 'not a column'])
+    assert rows.columns.tolist() == ['Name', 'TEAM', 'Rank Change']
+    assert rows['Name'].tolist() == ['Aaron Judge'] and pd.isna(rows['Rank Change'].iloc[0])
+    assert len(read_rows(directory, 'batters', 1, ['Name'])) == 0
+    assert read_rows(directory, 'pitchers', 592450, ['Name']) is None
+    assert read_rows(str(tmp_path / 'missing'), 'batters', 592450, ['Name']) is None
+
+
+def test_built_tables_round_trip(tmp_path):
+    # the tables the app shows, from the results csvs that ship with the repo
+    tables, info = build_from_files(directory=REPO)
+    directory = season_dir('2025', str(tmp_path))
+    save_app_data(tables, info, directory)
+    loaded, loaded_info = load_app_data(directory)
+    assert loaded_info == info and loaded.keys() == tables.keys()
+    for name, df in tables.items():
+        pd.testing.assert_frame_equal(loaded[name].copy(), compact(df), obj=name)
+
+
+def test_seasons_skip_unfinished_artifacts(table, tmp_path):
+    root = str(tmp_path)
+    save_app_data({'batters': table}, INFO, season_dir('2024', root))
+    save_app_data({'batters': table}, INFO, season_dir('2025', root))
+    # a writer that hasn't renamed its folder yet, and a folder without meta.json
+    os.makedirs(season_dir('2026.tmp4242', root))
+    os.makedirs(season_dir('2023', root))
+    assert list_seasons(root) == ['2025', '2024']
+    assert load_app_data(season_dir('2023', root)) is None
+
+
+def test_statcast_paths_kept_with_the_season(table, tmp_path):
+    # what the what-if panel reruns; the app's info dict doesn't change for it
+    paths = [str(tmp_path / 'april1.csv'), str(tmp_path / 'may1.csv')]
+    save_app_data({'batters': table}, dict(INFO, statcast_paths=paths), season_dir('2024', str(tmp_path)))
+    save_app_data({'batters': table}, INFO, season_dir('2025', str(tmp_path)))
+    assert season_inputs(season_dir('2024', str(tmp_path))) == paths
+    assert load_app_data(season_dir('2024', str(tmp_path)))[1] == INFO
+    assert season_inputs(season_dir('2025', str(tmp_path))) is None
+    assert season_inputs(season_dir('2023', str(tmp_path))) is None
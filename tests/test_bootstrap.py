@@ -0,0 +1,26 @@
+import numpy as np
+
+from bootstrap import StreamingHistogram, _summaries
+from elo_engine import EloState, elo_plus2
+
+
+def test_player_without_plate_appearances_is_left_out():
+    # the second batter wasn't drawn in this replicate and still sits at the starting elo
+    state = EloState(batter_ids=np.array([1, 2, 3]), batter_elo=np.array([1600.0, 1500.0, 1450.0]),
+                     batter_count=np.array([10, 0, 5]), pitcher_ids=np.array([8, 9]), pitcher_elo=np.array([1510.0, 1490.0]),
+                     pitcher_count=np.array([8, 7]))
+    masks = {'batter': np.ones(3, bool), 'pitcher': np.ones(2, bool)}
+    summary = _summaries(state, masks)['batter']
+
+    assert np.isnan(summary['elo'][1]) and np.isnan(summary['elo+2'][1]) and np.isnan(summary['rank'][1])
+    assert summary['elo+2'][[0, 2]].tolist() == elo_plus2(np.array([1600.0, 1450.0]), np.array([10, 5])).tolist()
+    assert summary['rank'][[0, 2]].tolist() == [1, 2]
+
+
+def test_histogram_skips_missing_values():
+    hist = StreamingHistogram(2, 0.0, 10.0, 1.0)
+    for values in ([2.5, np.nan], [3.5, 7.5], [2.5, np.nan]):
+        hist.add(np.array(values))
+    assert hist.counts.sum(axis=1).tolist() == [3, 1]
+    # the missing draws don't pull the second player's quantiles anywhere
+    assert hist.quantile(0.5)[1] == 7.5
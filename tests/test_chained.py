@@ -0,0 +1,74 @@
+import dataclasses
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from chained import ChainParams, run_chain, start_season
+from conftest import PARK_FACTORS, plate_appearances, season_pitches, write_csv
+from elo_engine import DEFAULT_PARAMS, NEVER_SEEN, encode_plate_appearances, run_elo
+from ingest import read_park_factors
+from rating_history import RatingHistory
+
+
+@pytest.fixture(scope='module')
+def two_seasons(pitches, tmp_path_factory):
+    # {season: (combined_df, PlateAppearances)}, the same players in both
+    directory = tmp_path_factory.mktemp('chain')
+    return {'2025': plate_appearances([write_csv(pitches, directory / '2025.csv')]),
+            '2026': plate_appearances([write_csv(season_pitches(2026, 1), directory / '2026.csv')])}
+
+
+def by_id(state, role, field):
+    return dict(zip(getattr(state, f'{role}_ids').tolist(), getattr(state, f'{role}_{field}').tolist()))
+
+
+def test_chain_without_regression_is_one_run(two_seasons):
+    # nothing given back over the offseason: the chain is one run over both seasons
+    results, career = run_chain(((season, pas) for season, (_, pas) in two_seasons.items()),
+                                chain=ChainParams(regression=0.0))
+    combined = pd.concat([combined_df for combined_df, _ in two_seasons.values()], ignore_index=True)
+    whole = run_elo(encode_plate_appearances(combined, read_park_factors(PARK_FACTORS)), strength_of_schedule=True)
+
+    for role in ('batter', 'pitcher'):
+        for field in ('elo', 'count', 'last_seen'):
+            assert by_id(career, role, field) == by_id(whole, role, field), f'{role}_{field}'
+        # the per-season counts add up to the career ones
+        season_counts = [by_id(result.state, role, 'count') for result in results.values()]
+        assert {i: sum(counts.get(i, 0) for counts in season_counts) for i in by_id(career, role, 'count')} == \
+            by_id(career, role, 'count')
+    assert career.clipped == whole.clipped
+
+
+def test_offseason_is_regressed_once_with_decay(two_seasons):
+    # with decay on, a returning player's first rating of the new season is the regressed
+    # one, decayed only over the days since opening day
+    params = dataclasses.replace(DEFAULT_PARAMS, decay_half_life=60.0)
+    chain = ChainParams(regression=0.3)
+    first = two_seasons['2025'][1]
+    career = run_elo(first, params, start_season(first, None, params, chain))
+
+    pas = two_seasons['2026'][1]
+    start = start_season(pas, career, params, chain)
+    opening_day = np.min(pas.game_date).astype(np.int64)
+    returning = by_id(career, 'batter', 'elo')
+    known = np.isin(start.batter_ids, list(returning))
+    assert set(start.batter_last_seen[known].tolist()) == {opening_day}
+    assert set(start.batter_last_seen[~known].tolist()) <= {NEVER_SEEN}
+    history = RatingHistory.allocate(len(pas))
+    run_elo(pas, params, start, history=history)
+
+    days = pas.game_date.astype(np.int64)
+    codes, first_pa = np.unique(pas.batter, return_index=True)
+    target = params.start_elo
+    expected, actual = [], []
+    for code, i in zip(codes, first_pa):
+        elo = returning.get(pas.batter_ids[code])
+        if elo is None:
+            continue
+        regressed = target + 0.7 * (elo - target)
+        expected.append(target + (regressed - target) * 0.5 ** ((days[i] - opening_day) / params.decay_half_life))
+        actual.append(history.batter_pre[i])
+    assert len(actual) > 0
+    # the history is float32
+    np.testing.assert_allclose(actual, expected, rtol=1e-6)
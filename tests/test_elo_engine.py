@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import PARK_FACTORS
+from elo_engine import run_elo
+from rating_history import RatingHistory
+
+
+def baseline_ratings(combined_df):
+    # the rating loop elo_calculations.py started out with, arithmetic and order untouched;
+    # only the .loc lookups are dicts here, so it runs in seconds. returns (batters, pitchers, clipped)
+    park_factors_df = pd.read_csv(PARK_FACTORS)
+    park_factors_df['Park Factor'] = park_factors_df['Park Factor'] / 100
+    park_factors = dict(zip(park_factors_df['Team'], park_factors_df['Park Factor'].to_numpy()))
+
+    woba_value = combined_df['woba_value'].fillna(0).to_numpy()
+    woba_value = np.where(combined_df['events'].astype(object) == 'strikeout', -0.7, woba_value)
+    woba_add = woba_value + 0.7
+    woba_norm = (woba_add - woba_add.min()) / (woba_add.max() - woba_add.min())
+
+    batters = {b: [1500.00, 0] for b in combined_df['batter'].unique()}
+    pitchers = {p: [1500.00, 0] for p in combined_df['pitcher'].unique()}
+    clipped = 0
+    for batter, pitcher, home_team, outcome_woba_norm in zip(combined_df['batter'], combined_df['pitcher'],
+                                                               combined_df['home_team'], woba_norm):
+        park_factor = park_factors[home_team]
+        batter_elo, batter_count = batters[batter]
+        pitcher_elo, pitcher_count = pitchers[pitcher]
+        batter_k_factor = 40 if batter_count <= 120 else 20
+        pitcher_k_factor = 40 if pitcher_count <= 120 else 20
+
+        difference = pitcher_elo - batter_elo
+        value1 = difference / 400
+        value2 = (10**value1)+1
+        expected_batter = 1 / value2
+        expected_batter = expected_batter * park_factor
+        if expected_batter > 1:
+            expected_batter = 1
+            clipped += 1
+        expected_pitcher = 1 - expected_batter
+
+        batter_change = batter_k_factor * (outcome_woba_norm - expected_batter)
+        pitcher_change = pitcher_k_factor * ((1-outcome_woba_norm)-expected_pitcher)
+        batters[batter] = [batter_elo + batter_change, batter_count + 1]
+        pitchers[pitcher] = [pitcher_elo + pitcher_change, pitcher_count + 1]
+    return batters, pitchers, clipped
+
+
+@pytest.fixture(scope='module')
+def baseline(season):
+    combined_df, _ = season
+    return baseline_ratings(combined_df)
+
+
+def test_woba_norm_matches_baseline(season):
+    combined_df, pas = season
+    woba_value = combined_df['woba_value'].fillna(0).to_numpy()
+    woba_value = np.where(combined_df['events'].astype(object) == 'strikeout', -0.7, woba_value) + 0.7
+    expected = (woba_value - woba_value.min()) / (woba_value.max() - woba_value.min())
+    assert np.array_equal(pas.woba_norm, expected)
+
+
+# the extras (strength of schedule sums, the rating history) must not touch the ratings
+@pytest.mark.parametrize('strength_of_schedule, record', [(False, False), (True, False), (True, True)])
+def test_run_elo_bit_for_bit(season, baseline, strength_of_schedule, record):
+    _, pas = season
+    batters, pitchers, clipped = baseline
+    history = RatingHistory.allocate(len(pas)) if record else None
+    state = run_elo(pas, history=history, strength_of_schedule=strength_of_schedule)
+
+    for role, expected in (('batter', batters), ('pitcher', pitchers)):
+        frame = getattr(state, f'{role}_frame')()
+        assert frame['player_id'].tolist() == list(expected)
+        # exact equality on purpose: the engine promises the same floats, not close ones
+        assert frame['elo'].tolist() == [elo for elo, _ in expected.values()]
+        assert frame['count'].tolist() == [count for _, count in expected.values()]
+    assert state.clipped == clipped
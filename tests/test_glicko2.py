@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from elo_engine import PlateAppearances
+from glicko2 import SCALE, Glicko2Params, _g, _rate_side, _solve_volatility, run_glicko2
+
+
+# the worked example of Glickman's "Example of the Glicko-2 system" (glicko2.pdf): a 1500/200
+# player with volatility 0.06 beats a 1400/30 player and loses to 1550/100 and 1700/300, tau 0.5
+OPPONENTS = [(1400, 30), (1550, 100), (1700, 300)]
+SCORES = [1.0, 0.0, 0.0]
+
+
+def test_volatility_solve_matches_the_paper():
+    # v and delta as the paper works them out in steps 3 and 4
+    sigma = _solve_volatility(np.array([0.06]), np.array([200 / SCALE]), np.array([1.7785]), np.array([-0.4834]),
+                              tau=0.5, tolerance=1e-6)
+    assert sigma[0] == pytest.approx(0.05999, abs=1e-5)
+
+
+def test_rating_period_matches_the_paper():
+    mu, phi, sigma = np.zeros(1), np.array([200 / SCALE]), np.array([0.06])
+    opponent_mu = np.array([(r - 1500) / SCALE for r, _ in OPPONENTS])
+    g_opponent = _g(np.array([rd / SCALE for _, rd in OPPONENTS]))
+    expected = 1 / (1 + np.exp(-g_opponent * (mu[0] - opponent_mu)))
+    _rate_side(np.zeros(3, dtype=np.int64), 1, mu, phi, sigma, g_opponent, expected, np.array(SCORES),
+               Glicko2Params(tau=0.5))
+
+    assert mu[0] * SCALE + 1500 == pytest.approx(1464.06, abs=0.01)
+    assert phi[0] * SCALE == pytest.approx(151.52, abs=0.01)
+    assert sigma[0] == pytest.approx(0.05999, abs=1e-5)
+
+
+def test_idle_player_only_gains_deviation():
+    mu, phi, sigma = np.zeros(2), np.array([200 / SCALE, 50 / SCALE]), np.full(2, 0.06)
+    _rate_side(np.zeros(1, dtype=np.int64), 2, mu, phi, sigma, _g(np.array([30 / SCALE])), np.array([0.5]),
+               np.array([1.0]), Glicko2Params())
+    assert mu[1] == 0
+    assert phi[1] * SCALE == pytest.approx(np.sqrt(50 ** 2 + (0.06 * SCALE) ** 2))
+
+
+def test_one_day_of_plate_appearances():
+    # a batter who hits well off a pitcher goes up, the pitcher goes down by the same, both settle
+    pas = PlateAppearances(
+        batter=np.zeros(4, dtype=np.int32), pitcher=np.zeros(4, dtype=np.int32), home=np.zeros(4, dtype=np.int32),
+        woba_norm=np.array([1.0, 0.8, 0.5, 1.0]), game_date=np.full(4, '2025-04-01', dtype='datetime64[D]'),
+        at_bat_number=np.arange(1, 5, dtype=np.int32), batter_ids=np.array([101]), pitcher_ids=np.array([201]),
+        teams=np.array(['NYY'], dtype=object), team_park_factor=np.array([1.0]))
+    state = run_glicko2(pas)
+    assert state.batter_rating[0] > 1500
+    assert state.batter_rating[0] - 1500 == pytest.approx(1500 - state.pitcher_rating[0])
+    assert state.batter_rd[0] < 350 and state.pitcher_rd[0] < 350
+    assert state.batter_count.tolist() == [4] and state.clipped == 0
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from conftest import PARK_FACTORS, write_csv
+from elo_engine import SOS_FIELDS
+from incremental import apply_update, build_checkpoint, load_checkpoint, watch
+
+
+def assert_same_state(state, expected):
+    # every array of both roles, compared per player id (merge_states appends new players)
+    for role in ('batter', 'pitcher'):
+        ids = getattr(state, f'{role}_ids')
+        expected_ids = getattr(expected, f'{role}_ids')
+        assert sorted(ids.tolist()) == sorted(expected_ids.tolist())
+        order, expected_order = np.argsort(ids), np.argsort(expected_ids)
+        for field in ('elo', 'count', 'last_seen') + SOS_FIELDS:
+            values = getattr(state, f'{role}_{field}')[order]
+            expected_values = getattr(expected, f'{role}_{field}')[expected_order]
+            if field == 'park_factor_sum':
+                # summed per delivery outside the loop, so only up to the order of the additions
+                np.testing.assert_allclose(values, expected_values, rtol=1e-12, err_msg=f'{role}_{field}')
+            else:
+                assert np.array_equal(values, expected_values), f'{role}_{field}'
+    assert state.clipped == expected.clipped
+
+
+def test_updates_match_full_run(season_files, tmp_path):
+    # the files overlap by a day, so the first update re-delivers the watermark's day
+    checkpoint = str(tmp_path / 'checkpoint.npz')
+    half = len(season_files) // 2
+    build_checkpoint(season_files[:half], checkpoint, park_factors_path=PARK_FACTORS)
+    applied = 0
+    for path in season_files[half:]:
+        applied += apply_update([path], checkpoint, park_factors_path=PARK_FACTORS)[1]
+    full = build_checkpoint(season_files, str(tmp_path / 'full.npz'), park_factors_path=PARK_FACTORS)
+
+    state, _ = load_checkpoint(checkpoint)
+    assert_same_state(state, full)
+    assert applied > 0
+    # and the same files again change nothing
+    assert apply_update(season_files, checkpoint, park_factors_path=PARK_FACTORS)[1] == 0
+
+
+def test_game_split_across_deliveries(pitches, tmp_path):
+    # one game of the watermark's day only shows up in the next delivery; its PAs share
+    # at_bat_numbers with the games already applied and must still all get applied
+    dates = pd.to_datetime(pitches['game_date'])
+    day = np.sort(dates.unique())[len(dates.unique()) // 2]
+    late_game = pitches.loc[dates == day, 'game_pk'].max()
+    late = (pitches['game_pk'] == late_game).to_numpy()
+    first = write_csv(pitches[(dates < day).to_numpy() | ((dates == day).to_numpy() & ~late)], tmp_path / 'first.csv')
+    second = write_csv(pitches[(dates > day).to_numpy() | late], tmp_path / 'second.csv')
+    everything = write_csv(pitches, tmp_path / 'everything.csv')
+
+    checkpoint = str(tmp_path / 'checkpoint.npz')
+    build_checkpoint([first], checkpoint, park_factors_path=PARK_FACTORS)
+    apply_update([second], checkpoint, park_factors_path=PARK_FACTORS)
+    full = build_checkpoint([everything], str(tmp_path / 'full.npz'), park_factors_path=PARK_FACTORS)
+
+    # the late game's PAs run after the rest of its day instead of interleaved with them, so
+    # only the counts have to line up exactly
+    state, meta = load_checkpoint(checkpoint)
+    for role in ('batter', 'pitcher'):
+        counts = dict(zip(getattr(state, f'{role}_ids').tolist(), getattr(state, f'{role}_count').tolist()))
+        expected = dict(zip(getattr(full, f'{role}_ids').tolist(), getattr(full, f'{role}_count').tolist()))
+        assert counts == expected
+    assert meta['watermark']['date'] == dates.max().strftime('%Y-%m-%d')
+
+
+def test_watch_reports_a_bad_file_once(season_files, tmp_path, capsys):
+    checkpoint = str(tmp_path / 'checkpoint.npz')
+    build_checkpoint(season_files[:2], checkpoint, park_factors_path=PARK_FACTORS)
+    drop = tmp_path / 'drop'
+    drop.mkdir()
+    bad = drop / 'bad.csv'
+    bad.write_text('not,a,statcast,file\n1,2,3,4\n')
+
+    capsys.readouterr()
+    watch(str(drop), checkpoint, once=True, settle=0)
+    assert 'WARNING: skipped' in capsys.readouterr().out
+    # the next poll leaves it alone
+    watch(str(drop), checkpoint, once=True, settle=0)
+    assert capsys.readouterr().out == ''
+    assert list(load_checkpoint(checkpoint)[1]['failed_files']) == [str(bad)]
+
+    # a file that gets replaced is tried again, and a good one is applied and forgotten as failed
+    pd.read_csv(season_files[2]).to_csv(bad, index=False)
+    os.utime(bad, ns=(1, 1))
+    watch(str(drop), checkpoint, once=True, settle=0)
+    assert 'Applied' in capsys.readouterr().out
+    _, meta = load_checkpoint(checkpoint)
+    assert meta['failed_files'] == {} and str(bad) in meta['processed_files']
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from conftest import PARK_FACTORS
+from elo_engine import expected_batter_score, run_elo
+from ingest import read_park_factors
+from matchup_query import MatchupIndex
+from rating_history import RatingHistory, save_history
+
+
+@pytest.fixture(scope='module')
+def rated(season, tmp_path_factory):
+    # (pas, history, index) of the synthetic season, with its history saved and indexed
+    _, pas = season
+    history = RatingHistory.allocate(len(pas))
+    run_elo(pas, history=history)
+    root = str(tmp_path_factory.mktemp('history'))
+    save_history(history, pas, '2025', root)
+    return pas, history, MatchupIndex('2025', read_park_factors(PARK_FACTORS), root=root)
+
+
+def brute_force(pas, history, role, player_id, date, include_day):
+    # post-PA rating of the player's last plate appearance before (or on) date, by scanning
+    codes = getattr(pas, role)
+    code = np.flatnonzero(getattr(pas, f'{role}_ids') == player_id)[0]
+    day = np.datetime64(date, 'D')
+    before = (codes == code) & ((pas.game_date <= day) if include_day else (pas.game_date < day))
+    if not before.any():
+        return 1500.0
+    return float(getattr(history, f'{role}_post')[np.flatnonzero(before)[-1]])
+
+
+@pytest.mark.parametrize('role', ['batter', 'pitcher'])
+@pytest.mark.parametrize('include_day', [False, True])
+def test_as_of_matches_a_scan(rated, role, include_day):
+    pas, history, index = rated
+    rng = np.random.default_rng(0)
+    player_ids = rng.choice(getattr(pas, f'{role}_ids'), 40)
+    # the first and last days, days with games and days in between
+    dates = np.concatenate([pas.game_date[[0, -1]], rng.choice(pas.game_date, 38)]) + rng.integers(-1, 2, 40)
+    result = index.rating_as_of(player_ids, dates, role, include_day)
+    assert result.tolist() == [brute_force(pas, history, role, p, d, include_day) for p, d in zip(player_ids, dates)]
+
+
+def test_unknown_player_and_early_date(rated):
+    pas, _, index = rated
+    first_day = pas.game_date[0]
+    assert index.rating_as_of([123], [first_day + 30]).tolist() == [1500.0]
+    assert index.rating_as_of(pas.batter_ids[:3], [first_day]).tolist() == [1500.0] * 3
+
+
+def test_expected_uses_both_ratings_and_the_park(rated):
+    pas, _, index = rated
+    batter, pitcher, date = pas.batter_ids[0], pas.pitcher_ids[0], pas.game_date[len(pas) // 2]
+    result = index.expected([batter], [pitcher], ['COL'], [date])
+    park_factor = read_park_factors(PARK_FACTORS).set_index('Team').loc['COL', 'Park Factor']
+    row = result.iloc[0]
+    assert row['park_factor'] == park_factor
+    assert row['expected_batter'] == expected_batter_score(row['batter_elo'], row['pitcher_elo'], park_factor)
+    assert index.expected_one(batter, pitcher, 'COL', date) == row['expected_batter']
+    with pytest.raises(KeyError):
+        index.expected([batter], [pitcher], ['XXX'], [date])
@@ -0,0 +1,20 @@
+import numpy as np
+
+from elo_engine import run_elo
+from multi_metric import METRICS, metric_outcomes, run_elo_multi
+
+
+def test_every_track_is_the_sequential_elo(season):
+    combined_df, pas = season
+    outcomes = metric_outcomes(combined_df)
+    state = run_elo_multi(pas, outcomes)
+    clipped = 0
+    for j, metric in enumerate(METRICS):
+        single = run_elo(pas, woba_norm=outcomes[:, j])
+        # the waves only reorder plate appearances of different players, what's left is numpy's power
+        np.testing.assert_allclose(state.batter_elo[:, j], single.batter_elo, rtol=0, atol=1e-9, err_msg=metric)
+        np.testing.assert_allclose(state.pitcher_elo[:, j], single.pitcher_elo, rtol=0, atol=1e-9, err_msg=metric)
+        assert state.batter_count.tolist() == single.batter_count.tolist()
+        assert state.pitcher_count.tolist() == single.pitcher_count.tolist()
+        clipped += single.clipped
+    assert state.clipped == clipped
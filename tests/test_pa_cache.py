@@ -0,0 +1,82 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import PARK_FACTORS
+from pa_cache import _entries, evict, load_plate_appearances
+
+
+@pytest.fixture
+def files(season_files, tmp_path):
+    # a private copy of the season, so a test can rewrite a file
+    directory = tmp_path / 'statcast'
+    directory.mkdir()
+    return [shutil.copy(path, directory) for path in season_files]
+
+
+def load(paths, cache_dir, **kwargs):
+    return load_plate_appearances(paths, PARK_FACTORS, cache_dir=str(cache_dir), **kwargs)
+
+
+def test_hit_returns_the_same_table(files, tmp_path, capsys):
+    cache_dir = tmp_path / 'cache'
+    combined_df, pas = load(files, cache_dir)
+    capsys.readouterr()
+    cached_df, cached_pas = load(files, cache_dir)
+    assert 'from cache' in capsys.readouterr().out
+
+    # the cached columns are memory-mapped, copy() makes them plain arrays to compare
+    pd.testing.assert_frame_equal(cached_df.copy(), combined_df)
+    for name in ('batter', 'pitcher', 'home', 'woba_norm', 'game_date', 'at_bat_number', 'batter_ids',
+                 'pitcher_ids', 'teams', 'team_park_factor'):
+        assert np.array_equal(getattr(cached_pas, name), getattr(pas, name)), name
+    assert len(_entries(str(cache_dir))) == 1
+
+
+def test_changed_file_replaces_the_entry(files, tmp_path, capsys):
+    cache_dir = tmp_path / 'cache'
+    combined_df, _ = load(files, cache_dir)
+    (old_entry,) = _entries(str(cache_dir))
+
+    # drop the last file's rows but one, like a re-downloaded search that came back shorter
+    last = pd.read_csv(files[-1])
+    last.iloc[:1].to_csv(files[-1], index=False)
+    capsys.readouterr()
+    changed_df, _ = load(files, cache_dir)
+    assert 'from cache' not in capsys.readouterr().out
+    assert len(changed_df) < len(combined_df)
+    # the old entry can never be hit again, so it is gone right away
+    assert _entries(str(cache_dir)) != [old_entry] and len(_entries(str(cache_dir))) == 1
+
+    # and a different strikeout value is a different entry too
+    load(files, cache_dir, strikeout_value=-0.5)
+    assert len(_entries(str(cache_dir))) == 2
+
+
+def test_least_recently_used_is_evicted(files, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    load(files[:5], cache_dir)
+    (first,) = _entries(str(cache_dir))
+    load(files[5:10], cache_dir)
+    (second,) = set(_entries(str(cache_dir))) - {first}
+    os.utime(os.path.join(first, 'meta.json'), (1000, 1000))
+    os.utime(os.path.join(second, 'meta.json'), (2000, 2000))
+    # a hit makes the older entry the most recently used one
+    load(files[:5], cache_dir)
+
+    evict(str(cache_dir), max_bytes=sum(e.stat().st_size for e in os.scandir(first)))
+    assert _entries(str(cache_dir)) == [first]
+
+
+def test_in_progress_entry_is_not_listed(files, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    load(files[:5], cache_dir)
+    (entry,) = _entries(str(cache_dir))
+    # a writer that hasn't renamed its folder yet, with meta.json already in it
+    shutil.copytree(entry, f'{entry}.tmp12345')
+    assert _entries(str(cache_dir)) == [entry]
+    evict(str(cache_dir), max_bytes=0, keep={os.path.abspath(entry)})
+    assert os.path.exists(f'{entry}.tmp12345')
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from player_index import INDEX_COLUMNS, build_player_index, resolve_names
+
+
+@pytest.fixture(scope='module')
+def rated(season):
+    # (batter ids, their PA counts) of the synthetic season, most PAs first
+    _, pas = season
+    counts = np.bincount(pas.batter, minlength=len(pas.batter_ids))
+    order = np.argsort(-counts, kind='stable')
+    return pas.batter_ids[order], counts[order]
+
+
+@pytest.fixture(scope='module')
+def index(rated, tmp_path_factory):
+    # a player map where some of the synthetic batters share a name
+    ids, _ = rated
+    rows = [
+        # a regular and a bench player on the same team, plus a namesake who was never rated
+        (ids[0], 'Max Muncy', 'LAD'), (ids[-1], 'Max Muncy', 'LAD'), (999999, 'Max Muncy', 'OAK'),
+        # namesakes on different teams
+        (ids[1], 'Luis Garcia', 'HOU'), (ids[2], 'Luis García', 'WSN'),
+        # namesakes on one team the leaderboard can't tell apart
+        (ids[3], 'Will Smith', 'LAD'), (ids[4], 'Will Smith', 'LAD'),
+        (ids[5], 'Tommy Pham', 'PIT'),
+    ]
+    index = pd.DataFrame(rows, columns=['MLBID', 'FANGRAPHSNAME', 'TEAM'])
+    index['MLBNAME'] = index['FANGRAPHSNAME']
+    index['IDFANGRAPHS'] = [str(i) for i in range(len(index))]
+    index['BATS'] = index['THROWS'] = 'R'
+    path = tmp_path_factory.mktemp('index') / 'playerid_map.csv'
+    index[INDEX_COLUMNS].to_csv(path, index=False)
+    return build_player_index(str(path))
+
+
+def test_namesakes_resolved_by_team_and_volume(rated, index):
+    ids, counts = rated
+    pa = dict(zip(ids.tolist(), counts.tolist()))
+    leaderboard = pd.DataFrame([
+        # listed bench player first, PAs a little off the rated counts like a real leaderboard
+        ('Max Muncy', 'LAD', pa[ids[-1]] + 2),
+        ('Max Muncy', 'LAD', pa[ids[0]] - 3),
+        ('Luis Garcia', 'WSN', pa[ids[2]]),
+        ('Luis Garcia', 'HOU', pa[ids[1]]),
+        ('Will Smith', 'LAD', (pa[ids[3]] + pa[ids[4]]) / 2),
+        ('Tommy Pham', 'PIT', pa[ids[5]]),
+        ('Nobody Here', 'NYY', 10),
+    ], columns=['Name', 'Team', 'PA'])
+
+    resolved, diagnostics = resolve_names(leaderboard, index, candidates=ids, counts=counts, volume_col='PA')
+    assert resolved[['Name', 'Team', 'player_id']].values.tolist() == [
+        ['Max Muncy', 'LAD', ids[-1]],
+        ['Max Muncy', 'LAD', ids[0]],
+        ['Luis Garcia', 'WSN', ids[2]],
+        ['Luis Garcia', 'HOU', ids[1]],
+        ['Tommy Pham', 'PIT', ids[5]],
+    ]
+    # the tie-broken rows are resolved but still listed, with the id they went to
+    assert [(name, status, None if pd.isna(player_id) else player_id) for name, status, player_id in
+            diagnostics[['Name', 'status', 'player_id']].itertuples(index=False)] == [
+        ('Max Muncy', 'tie_broken', ids[-1]),
+        ('Max Muncy', 'tie_broken', ids[0]),
+        ('Will Smith', 'ambiguous', None),
+        ('Nobody Here', 'unmatched', None),
+    ]
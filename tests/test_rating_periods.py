@@ -0,0 +1,66 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+from elo_engine import DEFAULT_PARAMS, PlateAppearances
+from rating_periods import run_elo_periods
+
+
+def batch(rows):
+    # PlateAppearances from (day, batter code, pitcher code, woba_norm) rows, one park with factor 1
+    days, batters, pitchers, outcomes = zip(*rows)
+    return PlateAppearances(
+        batter=np.array(batters, dtype=np.int32), pitcher=np.array(pitchers, dtype=np.int32),
+        home=np.zeros(len(rows), dtype=np.int32), woba_norm=np.array(outcomes, dtype=np.float64),
+        game_date=np.array(days, dtype='datetime64[D]'), at_bat_number=np.arange(1, len(rows) + 1, dtype=np.int32),
+        batter_ids=np.array([101, 102]), pitcher_ids=np.array([201, 202]),
+        teams=np.array(['NYY'], dtype=object), team_park_factor=np.array([1.0]))
+
+
+ROWS = [
+    ('2025-04-01', 0, 0, 1.0),
+    ('2025-04-01', 0, 1, 0.0),
+    ('2025-04-01', 1, 0, 0.5),
+    ('2025-04-02', 1, 1, 1.0),
+    ('2025-04-02', 0, 0, 0.0),
+]
+
+
+def expected_batter(batter_elo, pitcher_elo):
+    return 1 / (10 ** ((pitcher_elo - batter_elo) / 400) + 1)
+
+
+def test_day_batch_by_hand():
+    params = dataclasses.replace(DEFAULT_PARAMS, pa_threshold=1)
+    state = run_elo_periods(batch(ROWS), params)
+
+    # day 1: everybody at 1500 and k 40, every expectation 0.5, all against the frozen ratings
+    #   b101: 40 * (1 - .5) + 40 * (0 - .5) = 0      p201: 40 * (0 - .5) + 40 * (.5 - .5) = -20
+    #   b102: 40 * (.5 - .5) = 0                     p202: 40 * (1 - .5) = +20
+    # day 2: b101 and p201 are past pa_threshold (2 PAs), so k 20; b102 and p202 keep k 40
+    e_b102 = expected_batter(1500, 1520)
+    e_b101 = expected_batter(1500, 1480)
+    assert state.batter_elo.tolist() == pytest.approx([1500 + 20 * (0 - e_b101), 1500 + 40 * (1 - e_b102)], abs=1e-9)
+    assert state.pitcher_elo.tolist() == pytest.approx([1480 + 20 * (1 - (1 - e_b101)), 1520 + 40 * (0 - (1 - e_b102))],
+                                                       abs=1e-9)
+    assert state.batter_count.tolist() == [3, 2]
+    assert state.pitcher_count.tolist() == [3, 2]
+    assert state.batter_last_seen.tolist() == [np.datetime64('2025-04-02', 'D').astype(np.int64)] * 2
+
+
+def test_same_day_order_does_not_matter():
+    shuffled = [ROWS[2], ROWS[0], ROWS[1], ROWS[4], ROWS[3]]
+    state, other = run_elo_periods(batch(ROWS)), run_elo_periods(batch(shuffled))
+    assert state.batter_elo.tolist() == other.batter_elo.tolist()
+    assert state.pitcher_elo.tolist() == other.pitcher_elo.tolist()
+
+
+def test_expectation_clipped_at_one():
+    # 0.5 * 2.5 park factor gets clipped to 1, so the out costs the batter the full k
+    pas = batch(ROWS[1:2])
+    pas.team_park_factor = np.array([2.5])
+    state = run_elo_periods(pas)
+    assert state.clipped == 1
+    assert state.batter_elo[0] == 1500 + 40 * (0.0 - 1)
+    assert state.pitcher_elo[1] == 1500 + 40 * (1.0 - 0)
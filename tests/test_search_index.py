@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app_data import build_from_files
+from conftest import REPO
+from player_index import normalize_name
+from search_index import PlayerSearchIndex
+
+
+@pytest.fixture(scope='module')
+def batters():
+    # the Results tab's batters from the shipped results, without the names normalizing
+    # changes (accents, periods), where the index is meant to find more than str.contains
+    table = build_from_files(directory=REPO)[0]['batters']
+    plain = normalize_name(table['Name']) == table['Name'].map(lambda name: ' '.join(name.casefold().split()))
+    return table[plain.to_numpy()].reset_index(drop=True)
+
+
+def old_filter(table, query):
+    # what the app did before the index
+    return np.flatnonzero(table['Name'].str.contains(query, case=False).to_numpy())
+
+
+@pytest.mark.parametrize('query', ['a', 'Z', 'j', 'al', 'AL', 'ez', 'r ', 'jo', 'ohn', 'son', 'Rod', 'martinez',
+                                   'Judge', 'n ga', 'xqz', 'aaron j', ' j', 'aaron ', ' '])
+def test_name_matches_the_old_filter(batters, query):
+    index = PlayerSearchIndex(batters)
+    assert index.match_name(query).tolist() == old_filter(batters, query).tolist()
+
+
+def test_every_short_query_matches_the_old_filter(batters):
+    index = PlayerSearchIndex(batters)
+    queries = {name[i:i + n] for name in batters['Name'].str.lower() for n in (1, 2) for i in range(len(name) - n + 1)}
+    for query in sorted(queries):
+        assert index.match_name(query).tolist() == old_filter(batters, query).tolist(), query
+
+
+def test_accents_and_periods_dont_count():
+    table = pd.DataFrame({'Name': ['Julio Rodríguez', 'J.P. Crawford', 'Jose Ramirez'], 'TEAM': ['SEA', 'SEA', 'CLE'],
+                          'PAs': [600, 550, 650], 'is_qualified': [True, True, True]})
+    index = PlayerSearchIndex(table)
+    assert index.match_name('rodriguez').tolist() == [0]
+    assert index.match_name('jp').tolist() == [1]
+    assert index.match_name('JP Craw').tolist() == [1]
+    assert index.select('ez', 'SEA', 580).tolist() == [0]
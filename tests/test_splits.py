@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import plate_appearances, write_csv
+from elo_engine import PlateAppearances, run_elo
+from ingest import PA_COLUMNS, SPLIT_COLUMNS, ingest_statcast
+from splits import SPLITS, run_elo_splits, split_codes
+
+
+@pytest.fixture(scope='module')
+def split_season(season_files):
+    return plate_appearances(season_files, PA_COLUMNS + SPLIT_COLUMNS)
+
+
+def test_missing_hand_and_half_inning():
+    combined_df = pd.DataFrame({
+        'p_throws': pd.Categorical(['L', 'R', None]),
+        'stand': pd.Categorical(['R', None, 'L']),
+        'inning_topbot': pd.Categorical(['Top', 'Bot', None]),
+    })
+    batter_splits, pitcher_splits = split_codes(combined_df)
+    assert batter_splits.tolist() == [[0, 3], [1, 2], [-1, -1]]
+    assert pitcher_splits.tolist() == [[1, 2], [-1, 3], [0, -1]]
+
+
+def test_missing_hand_in_ingested_data(split_season):
+    # ingest reads the hands as categoricals, a blank one comes through as NaN
+    combined_df = split_season[0].copy()
+    assert isinstance(combined_df['p_throws'].dtype, pd.CategoricalDtype)
+    combined_df.loc[::50, 'p_throws'] = np.nan
+    combined_df.loc[::70, 'stand'] = np.nan
+
+    batter_splits, pitcher_splits = split_codes(combined_df)
+    missing = combined_df['p_throws'].isna().to_numpy()
+    assert (batter_splits[missing, 0] == -1).all()
+    assert set(batter_splits[~missing, 0].tolist()) == {0, 1}
+    assert (pitcher_splits[combined_df['stand'].isna().to_numpy(), 0] == -1).all()
+    assert set(batter_splits[:, 1].tolist()) == {2, 3}
+
+
+def test_overall_ratings_are_run_elo(split_season):
+    combined_df, pas = split_season
+    state = run_elo_splits(pas, *split_codes(combined_df))
+    plain = run_elo(pas)
+    assert state.batter_elo.tolist() == plain.batter_elo.tolist()
+    assert state.pitcher_elo.tolist() == plain.pitcher_elo.tolist()
+    assert state.clipped == plain.clipped
+    # every PA lands in one hand and one venue split of both players
+    assert (state.batter_split_count[:, :2].sum(axis=1) == state.batter_count).all()
+    assert (state.pitcher_split_count[:, 2:].sum(axis=1) == state.pitcher_count).all()
+
+
+def test_split_judged_against_the_overall_rating():
+    # the batter's second PA is their first against a lefty: that split starts at 1500 and
+    # is judged against the pitcher's overall rating, which the first PA moved
+    pas = PlateAppearances(
+        batter=np.zeros(2, dtype=np.int32), pitcher=np.zeros(2, dtype=np.int32), home=np.zeros(2, dtype=np.int32),
+        woba_norm=np.array([1.0, 0.0]), game_date=np.full(2, '2025-04-01', dtype='datetime64[D]'),
+        at_bat_number=np.arange(1, 3, dtype=np.int32), batter_ids=np.array([101]), pitcher_ids=np.array([201]),
+        teams=np.array(['NYY'], dtype=object), team_park_factor=np.array([1.0]))
+    batter_splits = np.array([[1, -1], [0, -1]], dtype=np.int8)
+    pitcher_splits = np.full((2, 2), -1, dtype=np.int8)
+    state = run_elo_splits(pas, batter_splits, pitcher_splits)
+
+    pitcher_after_first = 1500 + 40 * (0 - 0.5)
+    expected = 1 / (10 ** ((pitcher_after_first - 1500) / 400) + 1)
+    assert state.batter_split_elo[0].tolist() == [1500 + 40 * (0 - expected), 1500 + 40 * (1 - 0.5), 1500, 1500]
+    assert state.batter_split_count[0].tolist() == [1, 1, 0, 0]
+    assert state.pitcher_split_count[0].tolist() == [0] * len(SPLITS)
+
+
+def test_files_without_split_columns_load(pitches, tmp_path):
+    # an export without handedness is only an error when the splits ask for it
+    path = write_csv(pitches.head(2000).drop(columns=SPLIT_COLUMNS), str(tmp_path / 'april1.csv'))
+    _, report = ingest_statcast([path])
+    assert report['status'].tolist() == ['loaded']
+    _, report = ingest_statcast([path], columns=PA_COLUMNS + SPLIT_COLUMNS)
+    assert report['status'].tolist() == ['error']
@@ -0,0 +1,73 @@
+import dataclasses
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from batch_fit import scaled_ratings
+from elo_engine import DEFAULT_PARAMS, normalize_woba, run_elo
+from ingest import statcast_paths
+from pa_cache import load_plate_appearances
+
+
+# What-if reruns for the app: the season with other K factors, PA threshold, strikeout
+# penalty or park factors. The preprocessed plate appearances are loaded once (from the
+# pa_cache); only woba_norm depends on the strikeout penalty and it is recomputed from the
+# cached table with normalize_woba, so no slider position re-ingests anything. Results
+# are kept in a bounded LRU cache keyed by the (frozen, hashable) EloParams, shared by
+# every session of the app, so a slider position someone already tried comes back
+# instantly and memory stays capped at max_entries results.
+
+
+def data_available(paths=None):
+    # the what-if panel needs the raw statcast files; ingest skips the ones that are missing
+    return any(os.path.exists(p) for p in (statcast_paths() if paths is None else paths))
+
+
+class WhatIfEngine:
+    def __init__(self, player_ids, max_entries=32, paths=None):
+        # player_ids: {'batter': ids, 'pitcher': ids} to scale elo+2 over, i.e. the players
+        # of the results tables, like elo_calculations.py does
+        combined_df, self.pas = load_plate_appearances(paths, strikeout_value=DEFAULT_PARAMS.strikeout_value,
+                                                       verbose=False)
+        self.woba_value = combined_df['woba_value'].to_numpy(dtype=np.float64)
+        self.is_strikeout = (combined_df['events'] == 'strikeout').to_numpy()
+        self.player_ids = player_ids
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def woba_norm(self, strikeout_value):
+        # a few ms, cheaper to redo than to keep one array per penalty
+        return normalize_woba(self.woba_value, self.is_strikeout, strikeout_value)[0]
+
+    def ratings(self, params):
+        # {'batter': frame, 'pitcher': frame} with player_id, elo, count, elo+ and elo+2
+        with self._lock:
+            if params in self._results:
+                self._results.move_to_end(params)
+                self.hits += 1
+                return self._results[params]
+        # runs outside the lock, so sessions don't queue behind each other; two sessions
+        # asking for the same new params at once both compute it
+        state = run_elo(self.pas, params, woba_norm=self.woba_norm(params.strikeout_value))
+        result = {role: scaled_ratings(state, role, self.player_ids[role]) for role in ('batter', 'pitcher')}
+        with self._lock:
+            self.misses += 1
+            self._results[params] = result
+            self._results.move_to_end(params)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return result
+
+    def __len__(self):
+        return len(self._results)
+
+
+def what_if_params(k_high, k_low, pa_threshold, strikeout_value, use_park_factor):
+    # slider values -> EloParams, rounded so float noise can't split cache entries
+    return dataclasses.replace(DEFAULT_PARAMS, k_high=float(k_high), k_low=float(k_low), pa_threshold=int(pa_threshold),
+                               strikeout_value=round(float(strikeout_value), 3), use_park_factor=bool(use_park_factor))